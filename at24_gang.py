@@ -0,0 +1,171 @@
+import machine
+import time
+import at24_speed
+import at24_geometry
+
+# Gang programming: the same image, or one image per device, written to every
+# AT24 on the bus (A0-A2 straps give up to eight, 0x50-0x57). Page loads are
+# interleaved: while one chip runs its internal write cycle the next page goes
+# to another chip, so N chips take about as long as one.
+#
+#   at24_gang.init()
+#   at24_gang.program(image)                      # same image everywhere
+#   at24_gang.program({0x50: img_a, 0x51: img_b})  # one image per device
+
+I2C_ID = 2
+FIRST_ADDR = 0x50
+LAST_ADDR = 0x57
+WRITE_TIMEOUT_MS = 20
+
+i2c = None
+devices = {}  # device address -> at24_geometry.Geometry
+
+_page_buf = bytearray(2 + at24_geometry.MAX_PAGE)
+_page_mv = memoryview(_page_buf)
+
+
+def init():
+    """Find the AT24s on the bus, probe their geometry and pick one clock
+    (the slowest of the per-device negotiated speeds)"""
+    global i2c
+    i2c = machine.I2C(I2C_ID, freq=at24_speed.SAFE_FREQ)
+    found = [a for a in i2c.scan() if FIRST_ADDR <= a <= LAST_ADDR]
+    devices.clear()
+    covered = set()
+    for dev_addr in found:
+        if dev_addr in covered:
+            continue  # block address of a 24C04..C16 probed already
+        geometry = at24_geometry.probe(i2c, dev_addr)
+        devices[dev_addr] = geometry
+        if geometry.addr_bytes == 1:
+            for addr in range(0, geometry.size, 256):
+                covered.add(geometry.device(dev_addr, addr))
+    freqs = []
+    for dev_addr, geometry in devices.items():
+        at24_speed.open_bus(I2C_ID, dev_addr, write_test=True, geometry=geometry)
+        freqs.append(at24_speed.cached_freq(dev_addr))
+    freq = min(freqs) if freqs else at24_speed.SAFE_FREQ
+    i2c = machine.I2C(I2C_ID, freq=freq)
+    print(f"Gang: {len(devices)} AT24(s) {[hex(d) for d in devices]} at {freq} Hz")
+    return list(devices)
+
+
+def _ready(dev_addr):
+    # One ACK check, no waiting
+    try:
+        i2c.writeto(dev_addr, b'')
+        return True
+    except OSError:
+        return False
+
+
+class _Job:
+    def __init__(self, dev_addr, geometry, data, start):
+        self.dev_addr = dev_addr
+        self.geometry = geometry
+        self.data = memoryview(data)
+        self.start = start
+        self.end = start + len(data)
+        self.pos = start
+        self.busy = None  # device address of the running write cycle
+        self.since = 0
+        self.pages = 0
+
+    def send_page(self):
+        g = self.geometry
+        pos = self.pos
+        n = min(g.page_size - pos % g.page_size, self.end - pos)
+        h = g.header(_page_buf, pos)
+        _page_buf[h:h + n] = self.data[pos - self.start:pos - self.start + n]
+        dev_addr = g.device(self.dev_addr, pos)
+        i2c.writeto(dev_addr, _page_mv[:h + n])
+        self.busy = dev_addr
+        self.since = time.ticks_ms()
+        self.pos += n
+        self.pages += 1
+
+
+def program(images, start=0, verify=True, progress=None):
+    """Write images to the gang.
+
+    images is one buffer for every detected device or a dict mapping device
+    address to buffer. progress(dev_addr, addr) is called per page. Returns
+    the elapsed time in ms.
+    """
+    if i2c is None:
+        init()
+    if not isinstance(images, dict):
+        images = {dev_addr: images for dev_addr in devices}
+    jobs = []
+    for dev_addr, data in images.items():
+        geometry = devices.get(dev_addr)
+        if geometry is None:
+            raise ValueError(f"No AT24 at 0x{dev_addr:02X}")
+        if start + len(data) > geometry.size:
+            raise ValueError(f"Image for 0x{dev_addr:02X} exceeds {geometry.size} bytes")
+        jobs.append(_Job(dev_addr, geometry, data, start))
+
+    t0 = time.ticks_ms()
+    pending = len(jobs)
+    while pending:
+        pending = 0
+        for job in jobs:
+            if job.busy is not None:
+                if not _ready(job.busy):
+                    if time.ticks_diff(time.ticks_ms(), job.since) > WRITE_TIMEOUT_MS:
+                        raise RuntimeError(f"AT24 at 0x{job.busy:02X} busy for over {WRITE_TIMEOUT_MS} ms")
+                    pending += 1
+                    continue
+                job.busy = None
+            if job.pos < job.end:
+                if progress:
+                    progress(job.dev_addr, job.pos)
+                job.send_page()
+                pending += 1
+    elapsed = time.ticks_diff(time.ticks_ms(), t0)
+    print(f"Gang: {sum(job.pages for job in jobs)} pages to {len(jobs)} device(s) in {elapsed} ms")
+
+    if verify:
+        for job in jobs:
+            bad = verify_image(job.dev_addr, job.data, start)
+            if bad is not None:
+                raise Exception(f"Verify failed on 0x{job.dev_addr:02X} at {bad:04X}")
+    return elapsed
+
+
+def verify_image(dev_addr, data, start=0):
+    """First mismatching address, or None"""
+    geometry = devices[dev_addr]
+    buf = bytearray(256)
+    addr = start
+    end = start + len(data)
+    while addr < end:
+        n = min(len(buf), end - addr, geometry.block_end(addr) - addr)
+        h = geometry.header(_page_buf, addr)
+        chip = geometry.device(dev_addr, addr)
+        i2c.writeto(chip, _page_mv[:h], False)
+        mv = memoryview(buf)[:n]
+        i2c.readfrom_into(chip, mv)
+        offset = addr - start
+        if bytes(mv) != bytes(data[offset:offset + n]):
+            for i in range(n):
+                if buf[i] != data[offset + i]:
+                    return addr + i
+        addr += n
+    return None
+
+
+def write_00_to_ff():
+    """The flashWrite_at24 test pattern on every detected AT24"""
+    init()
+    # The pattern for a smaller part is a prefix of the one for the largest,
+    # so all devices share one buffer
+    size = max((g.size for g in devices.values()), default=0)
+    pattern = memoryview(bytes(range(256)) * ((size + 255) // 256))
+    images = {dev_addr: pattern[:g.size] for dev_addr, g in devices.items()}
+
+    def progress(dev_addr, addr):
+        if addr % 4096 == 0:
+            print(f"0x{dev_addr:02X}: writing {addr:04X}")
+
+    program(images, progress=progress)
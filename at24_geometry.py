@@ -0,0 +1,245 @@
+import json
+import time
+
+# AT24 geometry probing: address width, capacity and page size of the part
+# at a device address. Probing writes to the chip (every test write saves and
+# restores what it touches), so only the write paths probe (flashWrite_at24,
+# at24_gang); a part that ignores writes (WP strapped high) is refused rather
+# than guessed at. Results are cached per device address and kept in
+# GEOMETRY_FILE, where the read path picks them up with known().
+#
+#   1-byte addressing: AT24C01..C16 (128 B..2 KB); C04/C08/C16 take the
+#     high address bits from the device address and answer on 2/4/8 of them
+#   2-byte addressing: AT24C32..C512 (4 KB..64 KB)
+#
+#   at24_geometry.json: {"50": [2, 32768, 64], ...}   (address bytes, size, page)
+
+WRITE_TIMEOUT_MS = 20
+MAX_PAGE = 256
+GEOMETRY_FILE = 'at24_geometry.json'
+
+_cache = None  # device address -> Geometry, loaded from GEOMETRY_FILE
+
+
+class Geometry:
+    def __init__(self, addr_bytes, size, page_size):
+        self.addr_bytes = addr_bytes
+        self.size = size
+        self.page_size = page_size
+
+    def __repr__(self):
+        return (f"Geometry(addr_bytes={self.addr_bytes}, size={self.size}, "
+                f"page_size={self.page_size})")
+
+    def device(self, dev_addr, addr):
+        """I2C address serving addr (block bits for 1-byte parts)"""
+        if self.addr_bytes == 1:
+            return dev_addr | ((addr >> 8) & 0x07)
+        return dev_addr
+
+    def header(self, buf, addr):
+        """Store the word address of addr in buf, return its length"""
+        if self.addr_bytes == 1:
+            buf[0] = addr & 0xFF
+            return 1
+        buf[0] = (addr >> 8) & 0xFF
+        buf[1] = addr & 0xFF
+        return 2
+
+    def block_end(self, addr):
+        """End of the span one transaction may cover starting at addr"""
+        if self.addr_bytes == 1:
+            return min((addr | 0xFF) + 1, self.size)
+        return self.size
+
+
+def _wait(i2c, dev_addr):
+    start = time.ticks_ms()
+    while True:
+        try:
+            i2c.writeto(dev_addr, b'')
+            return
+        except OSError:
+            if time.ticks_diff(time.ticks_ms(), start) > WRITE_TIMEOUT_MS:
+                raise
+
+
+def _read(i2c, dev_addr, header, n):
+    i2c.writeto(dev_addr, header, False)
+    return i2c.readfrom(dev_addr, n)
+
+
+def _write(i2c, dev_addr, header, data):
+    i2c.writeto(dev_addr, bytes(header) + bytes(data))
+    _wait(i2c, dev_addr)
+
+
+def _protected(dev_addr):
+    return ValueError(f"AT24 0x{dev_addr:02X} ignores writes (write-protected?): "
+                      f"declare it with at24_geometry.define()")
+
+
+def probe_addr_bytes(i2c, dev_addr):
+    """1 or 2 address bytes.
+
+    A single address byte followed by STOP sets the pointer of a 1-byte
+    part but leaves a 2-byte part's pointer alone, so two such reads agree
+    only on a 1-byte part. Uniform data can fool that, so a match is
+    confirmed by writing [0x00, probe]: a 1-byte part stores probe at 0
+    (restored right after), a 2-byte part just moves its pointer.
+    """
+    r0 = _read(i2c, dev_addr, b'\x00', 32)
+    r1 = _read(i2c, dev_addr, b'\x10', 16)
+    if r1 != r0[16:32]:
+        return 2
+    v = r0[0]
+    probe = v ^ 0xFF
+    _write(i2c, dev_addr, bytes([0x00]), bytes([probe]))
+    if _read(i2c, dev_addr, b'\x00', 1)[0] != probe:
+        return 2
+    _write(i2c, dev_addr, bytes([0x00]), bytes([v]))
+    return 1
+
+
+def _same_chip(i2c, dev_addr, block):
+    """True if the block answering on dev_addr | block belongs to the part at
+    dev_addr (24C04..C16) rather than being a separate 24C01/C02.
+
+    A sequential read running off the end of the previous block continues
+    into this block on a multi-block part, but wraps to word 0 of the
+    previous block's own chip otherwise. Only if both word-0 bytes are equal
+    is a marker written to tell them apart (and restored).
+    """
+    prev = dev_addr | (block - 1)
+    here = dev_addr | block
+    crossed = _read(i2c, prev, b'\xff', 2)[1]
+    first = _read(i2c, here, b'\x00', 1)[0]
+    if first != _read(i2c, prev, b'\x00', 1)[0]:
+        return crossed == first
+    marker = first ^ 0xFF
+    _write(i2c, here, b'\x00', bytes([marker]))
+    try:
+        if _read(i2c, here, b'\x00', 1)[0] != marker:
+            return False  # write-protected: assume the smaller part
+        return _read(i2c, prev, b'\xff', 2)[1] == marker
+    finally:
+        _write(i2c, here, b'\x00', bytes([first]))
+
+
+def probe_size(i2c, dev_addr, addr_bytes):
+    """Capacity from address aliasing: a marker written at 0 shows up at
+    the first power of two the part wraps at"""
+    if addr_bytes == 1:
+        # Blocks of 256 bytes answer on consecutive device addresses (the
+        # low bits of an aligned base), unless those are separate parts
+        devices = i2c.scan()
+        blocks = 1
+        while (blocks < 8 and not dev_addr & blocks and (dev_addr | blocks) in devices
+               and _same_chip(i2c, dev_addr, blocks)):
+            blocks += 1
+        while blocks & (blocks - 1):
+            blocks &= blocks - 1
+        if blocks > 1:
+            return blocks * 256
+        candidates = [128]
+        limit = 256
+        header = lambda addr: bytes([addr & 0xFF])
+    else:
+        candidates = [4096, 8192, 16384, 32768]
+        limit = 65536
+        header = lambda addr: bytes([addr >> 8, addr & 0xFF])
+
+    v = _read(i2c, dev_addr, header(0), 1)[0]
+    before = [_read(i2c, dev_addr, header(n), 1)[0] for n in candidates]
+    marker = v ^ 0xFF
+    _write(i2c, dev_addr, header(0), bytes([marker]))
+    size = limit
+    try:
+        if _read(i2c, dev_addr, header(0), 1)[0] != marker:
+            raise _protected(dev_addr)
+        for n, old in zip(candidates, before):
+            if old == v and _read(i2c, dev_addr, header(n), 1)[0] == marker:
+                size = n
+                break
+    finally:
+        _write(i2c, dev_addr, header(0), bytes([v]))
+    return size
+
+
+def probe_page_size(i2c, dev_addr, addr_bytes):
+    """Page size from page-write wraparound.
+
+    Writing MAX_PAGE bytes valued 0, 1, 2, ... at address 0 wraps inside a
+    P-byte page, leaving MAX_PAGE - P at address 0. The original bytes are
+    restored with page writes of the detected size.
+    """
+    header = bytes(addr_bytes)
+    saved = _read(i2c, dev_addr, header, MAX_PAGE)
+    _write(i2c, dev_addr, header, bytes([i & 0xFF for i in range(MAX_PAGE)]))
+    first = _read(i2c, dev_addr, header, 1)[0]
+    page_size = MAX_PAGE - first if first else MAX_PAGE
+    # The page now holds the last page_size values written
+    page = _read(i2c, dev_addr, header, page_size)
+    if page != bytes([(first + i) & 0xFF for i in range(page_size)]):
+        raise _protected(dev_addr)
+    # Only the first page was overwritten
+    _write(i2c, dev_addr, header, saved[:page_size])
+    return page_size
+
+
+def _entries():
+    global _cache
+    if _cache is None:
+        try:
+            with open(GEOMETRY_FILE) as f:
+                _cache = {int(k, 16): Geometry(*v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, TypeError):
+            _cache = {}
+    return _cache
+
+
+def _save():
+    entries = {f"{k:02x}": [g.addr_bytes, g.size, g.page_size] for k, g in _entries().items()}
+    try:
+        with open(GEOMETRY_FILE, 'w') as f:
+            json.dump(entries, f)
+    except OSError:
+        pass  # read-only filesystem: the result lasts until the next reset
+
+
+def known(dev_addr):
+    """Geometry probed or declared earlier for dev_addr, or None; never
+    touches the chip"""
+    return _entries().get(dev_addr)
+
+
+def probe(i2c, dev_addr):
+    """Geometry of the AT24 at dev_addr (cached); writes to the chip"""
+    geometry = known(dev_addr)
+    if geometry is None:
+        addr_bytes = probe_addr_bytes(i2c, dev_addr)
+        size = probe_size(i2c, dev_addr, addr_bytes)
+        page_size = probe_page_size(i2c, dev_addr, addr_bytes)
+        geometry = define(dev_addr, addr_bytes, size, page_size)
+        print(f"AT24 0x{dev_addr:02X}: {size} bytes, {addr_bytes}-byte address, "
+              f"{page_size}-byte page")
+    return geometry
+
+
+def define(dev_addr, addr_bytes, size, page_size):
+    """Skip probing: declare the geometry of the part at dev_addr"""
+    geometry = Geometry(addr_bytes, size, page_size)
+    _entries()[dev_addr] = geometry
+    _save()
+    return geometry
+
+
+def forget(dev_addr=None):
+    """Drop the stored geometry (all devices when dev_addr is None), e.g.
+    after swapping a part"""
+    entries = _entries()
+    if dev_addr is None:
+        entries.clear()
+    else:
+        entries.pop(dev_addr, None)
+    _save()
@@ -0,0 +1,173 @@
+import json
+import time
+import machine
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+# AT24 bus-speed negotiation: try the fastest clock first and fall back step
+# by step until a readback check of a scratch page passes. The result is
+# cached per device address, together with whether it was verified with a
+# write test, and kept in SPEED_FILE so the scratch-page write runs once per
+# part instead of in every fresh interpreter (every mpremote exec). Call
+# forget() after swapping a part.
+#
+#   at24_speed.json: {"50": [400000, true], ...}   (device address in hex)
+
+# STM32F4 hardware I2C runs standard and fast mode only
+FREQS = [400000, 100000]
+SAFE_FREQ = 100000
+SPEED_FILE = 'at24_speed.json'
+
+# Scratch page: last 64-byte page of an AT24C256 (aliases into smaller parts)
+# unless an at24_geometry.Geometry is given, then the last page of the part
+SCRATCH_ADDR = 0x7FC0
+SCRATCH_LEN = 64
+READS = 4  # readbacks per candidate frequency
+
+_cache = None  # device address -> (freq, write tested), loaded from SPEED_FILE
+
+
+def _entries():
+    global _cache
+    if _cache is None:
+        try:
+            with open(SPEED_FILE) as f:
+                _cache = {int(k, 16): tuple(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save():
+    try:
+        with open(SPEED_FILE, 'w') as f:
+            json.dump({f"{k:02x}": list(v) for k, v in _entries().items()}, f)
+    except OSError:
+        pass  # read-only filesystem: the result lasts until the next reset
+
+
+def _scratch(geometry):
+    if geometry is None:
+        return SCRATCH_ADDR, SCRATCH_LEN
+    n = min(SCRATCH_LEN, geometry.page_size)
+    return geometry.size - n, n
+
+
+def _header(geometry, addr):
+    if geometry is not None and geometry.addr_bytes == 1:
+        return bytes([addr & 0xFF])
+    return bytes([addr >> 8, addr & 0xFF])
+
+
+def _device(geometry, dev_addr, addr):
+    return geometry.device(dev_addr, addr) if geometry is not None else dev_addr
+
+
+def _read(i2c, dev_addr, addr, buf, geometry=None):
+    dev_addr = _device(geometry, dev_addr, addr)
+    i2c.writeto(dev_addr, _header(geometry, addr), False)
+    i2c.readfrom_into(dev_addr, buf)
+
+
+def _write(i2c, dev_addr, addr, data, geometry=None):
+    dev_addr = _device(geometry, dev_addr, addr)
+    i2c.writeto(dev_addr, _header(geometry, addr) + bytes(data))
+    start = time.ticks_ms()
+    while True:
+        try:
+            i2c.writeto(dev_addr, b'')
+            return
+        except OSError:
+            if time.ticks_diff(time.ticks_ms(), start) > 20:
+                raise
+
+
+def _digest(buf):
+    return crc32(buf) if crc32 else bytes(buf)
+
+
+def _readback(i2c, dev_addr, reference, geometry=None):
+    addr, n = _scratch(geometry)
+    buf = bytearray(n)
+    for _ in range(READS):
+        _read(i2c, dev_addr, addr, buf, geometry)
+        if _digest(buf) != reference:
+            return False
+    return True
+
+
+def check(i2c, dev_addr, reference, pattern=None, geometry=None):
+    """Readback test at the bus's current frequency.
+
+    reference is the digest of the scratch page read at SAFE_FREQ. With a
+    pattern, and only once plain reads pass (so a garbled address cannot
+    hit user data), the pattern is also written and read back.
+    """
+    try:
+        if not _readback(i2c, dev_addr, reference, geometry):
+            return False
+        if pattern is not None:
+            _write(i2c, dev_addr, _scratch(geometry)[0], pattern, geometry)
+            return _readback(i2c, dev_addr, _digest(pattern), geometry)
+    except OSError:
+        return False
+    return True
+
+
+def negotiate(bus_id, dev_addr, write_test=False, geometry=None):
+    """Find the fastest frequency in FREQS that passes check()"""
+    i2c = machine.I2C(bus_id, freq=SAFE_FREQ)
+    scratch, n = _scratch(geometry)
+    saved = bytearray(n)
+    _read(i2c, dev_addr, scratch, saved, geometry)
+    reference = _digest(saved)
+    pattern = None
+    if write_test:
+        pattern = bytes([(0xA5 ^ (i * 37)) & 0xFF for i in range(n)])
+
+    chosen = SAFE_FREQ
+    for freq in FREQS:
+        if freq == SAFE_FREQ and not write_test:
+            break  # reference was taken at this speed
+        i2c = machine.I2C(bus_id, freq=freq)
+        ok = check(i2c, dev_addr, reference, pattern, geometry)
+        print(f"AT24 0x{dev_addr:02X} at {freq} Hz: {'ok' if ok else 'fail'}")
+        if ok:
+            chosen = freq
+            break
+
+    if write_test:
+        # Restore the scratch page at the safe speed
+        i2c = machine.I2C(bus_id, freq=SAFE_FREQ)
+        _write(i2c, dev_addr, scratch, saved, geometry)
+    return chosen
+
+
+def open_bus(bus_id, dev_addr, write_test=False, geometry=None):
+    """I2C bus at the fastest frequency known to work for dev_addr"""
+    entries = _entries()
+    entry = entries.get(dev_addr)
+    if entry is None or (write_test and not entry[1]):
+        entry = (negotiate(bus_id, dev_addr, write_test, geometry), write_test)
+        entries[dev_addr] = entry
+        _save()
+    return machine.I2C(bus_id, freq=entry[0])
+
+
+def cached_freq(dev_addr):
+    entry = _entries().get(dev_addr)
+    return entry[0] if entry else None
+
+
+def forget(dev_addr=None):
+    """Drop the cached speed (all devices when dev_addr is None), also from
+    SPEED_FILE"""
+    entries = _entries()
+    if dev_addr is None:
+        entries.clear()
+    else:
+        entries.pop(dev_addr, None)
+    _save()
@@ -0,0 +1,428 @@
+import time
+from array import array
+
+try:
+    import machine
+except ImportError:
+    # Host side (CPython): only PortBus on a simulated GPIO is usable
+    machine = None
+
+try:
+    sleep_us = time.sleep_us
+except AttributeError:
+    def sleep_us(us):
+        time.sleep(us / 1000000)
+
+# STM32F4 GPIO register layout (RM0383, section 8.4)
+GPIO_BASE = 0x40020000
+GPIO_STRIDE = 0x400
+GPIO_MODER = 0x00
+GPIO_IDR = 0x10
+GPIO_ODR = 0x14
+GPIO_BSRR = 0x18
+
+# Address bits are split into a low byte and the remaining high bits so the
+# lookup tables stay small (256 + 8 words per port instead of 2048)
+ADDR_LO_BITS = 8
+
+
+def parse_pin(name):
+    """Split a pin name like 'B5' into (port index, bit)"""
+    return ord(name[0]) - ord('A'), int(name[1:])
+
+
+def port_base(port):
+    """Base address of GPIO port 0=A, 1=B, ..."""
+    return GPIO_BASE + port * GPIO_STRIDE
+
+
+def bsrr_tables(names):
+    """Build per-port BSRR words for every value of a group of pins.
+
+    names[i] carries bit i of the value. Returns {port: array('I')} where
+    each table entry sets the pins whose bit is 1 and resets the others,
+    without touching any other pin of that port.
+    """
+    groups = {}
+    for i, name in enumerate(names):
+        port, bit = parse_pin(name)
+        groups.setdefault(port, []).append((i, bit))
+    tables = {}
+    for port, bits in groups.items():
+        table = array('I', [0] * (1 << len(names)))
+        for value in range(1 << len(names)):
+            word = 0
+            for i, bit in bits:
+                if (value >> i) & 1:
+                    word |= 1 << bit
+                else:
+                    word |= 1 << (bit + 16)
+            table[value] = word
+        tables[port] = table
+    return tables
+
+
+def idr_tables(names):
+    """Build per-port tables turning a raw IDR value into data bits.
+
+    Returns a list of (port, shift, mask, table): the value contributed by
+    a port is table[(IDR >> shift) & mask].
+    """
+    groups = {}
+    for i, name in enumerate(names):
+        port, bit = parse_pin(name)
+        groups.setdefault(port, []).append((i, bit))
+    tables = []
+    for port in sorted(groups):
+        bits = groups[port]
+        shift = min(b for _, b in bits)
+        span = max(b for _, b in bits) - shift + 1
+        table = bytearray(1 << span)
+        for raw in range(1 << span):
+            value = 0
+            for i, bit in bits:
+                if (raw >> (bit - shift)) & 1:
+                    value |= 1 << i
+            table[raw] = value
+        tables.append((port, shift, (1 << span) - 1, table))
+    return tables
+
+
+class Bus:
+    """Read and program cycles built on a backend's pin primitives.
+
+    Backends provide set_address, read_data, write_data, data_output,
+    data_input and set_ce/set_oe/set_we.
+    """
+
+    settle_us = 1  # Address/OE to data valid
+    pulse_us = 1  # WE low pulse width
+    direct = False  # True when the cycles drive the registers themselves
+
+    def set_timing(self, settle_ns, pulse_ns):
+        """Set the data-valid and WE pulse delays, rounded up to whole us"""
+        self.settle_us = (settle_ns + 999) // 1000
+        self.pulse_us = (pulse_ns + 999) // 1000
+
+    def update_address(self, addr, prev):
+        """Drive addr given that prev is currently on the bus"""
+        self.set_address(addr)
+
+    def read_byte(self, addr):
+        self.set_address(addr)
+        self.set_ce(0)  # CE low
+        self.set_oe(0)  # OE low
+        self.set_we(1)  # WE high
+        if self.settle_us:
+            sleep_us(self.settle_us)  # Small delay for settling
+        value = self.read_data()
+        self.set_ce(1)
+        self.set_oe(1)
+        return value
+
+    def read_block(self, buf, start, n=None):
+        """Read n bytes (default len(buf)) from start into buf"""
+        if n is None:
+            n = len(buf)
+        self.set_we(1)
+        self.set_ce(0)
+        self.set_oe(0)
+        for i in range(n):
+            self.set_address(start + i)
+            if self.settle_us:
+                sleep_us(self.settle_us)
+            buf[i] = self.read_data()
+        self.set_ce(1)
+        self.set_oe(1)
+
+    def write_strobe(self, addr, value):
+        """Latch one byte; data pins must already be outputs"""
+        self.set_address(addr)
+        self.write_data(value)
+        self.set_oe(1)  # OE high (disable output)
+        self.set_ce(0)  # CE low
+        self.set_we(0)  # WE low (write enable)
+        if self.pulse_us:
+            sleep_us(self.pulse_us)
+        self.set_we(1)  # WE high
+        self.set_ce(1)  # CE high
+
+
+class PinBus(Bus):
+    """AT28 bus driven one machine.Pin call at a time (portable fallback)"""
+
+    def __init__(self, addr_pins, io_pins, ce, oe, we):
+        self.addr_pins = addr_pins
+        self.io_pins = io_pins
+        self.ce = ce
+        self.oe = oe
+        self.we = we
+
+    def set_address(self, addr):
+        for i, pin in enumerate(self.addr_pins):
+            pin.value((addr >> i) & 1)
+
+    def update_address(self, addr, prev):
+        changed = addr ^ prev
+        for i, pin in enumerate(self.addr_pins):
+            if (changed >> i) & 1:
+                pin.value((addr >> i) & 1)
+
+    def read_data(self):
+        value = 0
+        for i, pin in enumerate(self.io_pins):
+            value |= (pin.value() << i)
+        return value
+
+    def write_data(self, value):
+        for i, pin in enumerate(self.io_pins):
+            pin.value((value >> i) & 1)
+
+    def data_output(self):
+        for pin in self.io_pins:
+            pin.init(mode=machine.Pin.OUT)
+
+    def data_input(self):
+        for pin in self.io_pins:
+            pin.init(mode=machine.Pin.IN)
+
+    def set_ce(self, level):
+        self.ce.value(level)
+
+    def set_oe(self, level):
+        self.oe.value(level)
+
+    def set_we(self, level):
+        self.we.value(level)
+
+
+class PortBus(Bus):
+    """AT28 bus driven through whole GPIO port registers.
+
+    Address and data values are scattered over ports A and B, so every
+    value is translated through precomputed BSRR/IDR tables: one register
+    write per port to drive the address or data lines, one register read
+    per port to sample the data lines.
+
+    mem defaults to machine.mem32; pass a sim_gpio.SimGPIO to run on a host.
+    The pins must already be configured as GPIO (machine.Pin does that).
+    """
+
+    def __init__(self, addr_names, io_names, ce_name, oe_name, we_name, mem=None):
+        if mem is None:
+            mem = machine.mem32
+        self.mem = mem
+
+        # Address: low byte and high bits, merged per port
+        lo = bsrr_tables(addr_names[:ADDR_LO_BITS])
+        hi = bsrr_tables(addr_names[ADDR_LO_BITS:])
+        self.hi_mask = (1 << (len(addr_names) - ADDR_LO_BITS)) - 1
+        self.addr_tables = []
+        for port in sorted(set(lo) | set(hi)):
+            lo_table = lo.get(port) or array('I', [0] * (1 << ADDR_LO_BITS))
+            hi_table = hi.get(port) or array('I', [0] * (self.hi_mask + 1))
+            self.addr_tables.append((port_base(port) + GPIO_BSRR, lo_table, hi_table))
+
+        # Data out: one BSRR word per port for each byte value
+        self.data_tables = [(port_base(port) + GPIO_BSRR, table)
+                            for port, table in sorted(bsrr_tables(io_names).items())]
+
+        # Data in: raw IDR bits back to the byte value
+        self.idr_tables = [(port_base(port) + GPIO_IDR, shift, mask, table)
+                           for port, shift, mask, table in idr_tables(io_names)]
+
+        # Data direction: MODER has two bits per pin, 00 = input, 01 = output
+        moder = {}
+        for name in io_names:
+            port, bit = parse_pin(name)
+            clear, out = moder.get(port, (0, 0))
+            moder[port] = (clear | (3 << (2 * bit)), out | (1 << (2 * bit)))
+        self.moder = [(port_base(port) + GPIO_MODER, 0xFFFFFFFF & ~clear, out)
+                      for port, (clear, out) in sorted(moder.items())]
+
+        self.ce = self._control(ce_name)
+        self.oe = self._control(oe_name)
+        self.we = self._control(we_name)
+
+    @staticmethod
+    def _control(name):
+        port, bit = parse_pin(name)
+        return port_base(port) + GPIO_BSRR, 1 << bit, 1 << (bit + 16)
+
+    def set_address(self, addr):
+        mem = self.mem
+        lo = addr & 0xFF
+        hi = (addr >> ADDR_LO_BITS) & self.hi_mask
+        for bsrr, lo_table, hi_table in self.addr_tables:
+            mem[bsrr] = lo_table[lo] | hi_table[hi]
+
+    def read_data(self):
+        mem = self.mem
+        value = 0
+        for idr, shift, mask, table in self.idr_tables:
+            value |= table[(mem[idr] >> shift) & mask]
+        return value
+
+    def write_data(self, value):
+        mem = self.mem
+        value &= 0xFF
+        for bsrr, table in self.data_tables:
+            mem[bsrr] = table[value]
+
+    def data_output(self):
+        mem = self.mem
+        for moder, keep, out in self.moder:
+            mem[moder] = (mem[moder] & keep) | out
+
+    def data_input(self):
+        mem = self.mem
+        for moder, keep, out in self.moder:
+            mem[moder] = mem[moder] & keep
+
+    def set_ce(self, level):
+        bsrr, set_word, reset_word = self.ce
+        self.mem[bsrr] = set_word if level else reset_word
+
+    def set_oe(self, level):
+        bsrr, set_word, reset_word = self.oe
+        self.mem[bsrr] = set_word if level else reset_word
+
+    def set_we(self, level):
+        bsrr, set_word, reset_word = self.we
+        self.mem[bsrr] = set_word if level else reset_word
+
+
+# BusState that touched the pins last; flashRead_at28 and flashWrite_at28
+# each keep their own, so a state drops its cache when the other one ran
+_owner = None
+
+
+class BusState(Bus):
+    """Bus-state layer over a backend.
+
+    Remembers the data-bus direction, control-line levels and the last
+    driven address, and only forwards changes to the backend. read_block
+    leaves CE/OE asserted so consecutive blocks of a sequential dump run as
+    one burst; call idle() when the burst is over.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.settle_us = backend.settle_us
+        self.pulse_us = backend.pulse_us
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the cached levels; the next access drives everything"""
+        self.addr = None
+        self.data = None
+        self.output = None
+        self.ce = None
+        self.oe = None
+        self.we = None
+
+    def set_timing(self, settle_ns, pulse_ns):
+        self.backend.set_timing(settle_ns, pulse_ns)
+        self.settle_us = self.backend.settle_us
+        self.pulse_us = self.backend.pulse_us
+
+    def claim(self):
+        global _owner
+        if _owner is not self:
+            self.invalidate()
+            _owner = self
+
+    def set_address(self, addr):
+        self.claim()
+        if addr == self.addr:
+            return
+        if self.addr is None:
+            self.backend.set_address(addr)
+        else:
+            self.backend.update_address(addr, self.addr)
+        self.addr = addr
+
+    def read_data(self):
+        return self.backend.read_data()
+
+    def write_data(self, value):
+        value &= 0xFF
+        if value != self.data:
+            self.backend.write_data(value)
+            self.data = value
+
+    def data_output(self):
+        self.claim()
+        if self.output is not True:
+            self.backend.data_output()
+            self.output = True
+
+    def data_input(self):
+        self.claim()
+        if self.output is not False:
+            self.backend.data_input()
+            self.output = False
+
+    def set_ce(self, level):
+        if level != self.ce:
+            self.backend.set_ce(level)
+            self.ce = level
+
+    def set_oe(self, level):
+        if level != self.oe:
+            self.backend.set_oe(level)
+            self.oe = level
+
+    def set_we(self, level):
+        if level != self.we:
+            self.backend.set_we(level)
+            self.we = level
+
+    def idle(self):
+        """End a burst: deassert CE and OE"""
+        self.claim()
+        self.set_ce(1)
+        self.set_oe(1)
+
+    def _after_direct(self, addr):
+        # Direct cycles leave the address on the bus and CE/OE/WE high
+        self.addr = addr
+        self.ce = 1
+        self.oe = 1
+        self.we = 1
+
+    def read_byte(self, addr):
+        self.data_input()
+        if self.backend.direct:
+            value = self.backend.read_byte(addr)
+            self._after_direct(addr)
+            return value
+        return Bus.read_byte(self, addr)
+
+    def read_block(self, buf, start, n=None):
+        if n is None:
+            n = len(buf)
+        self.data_input()
+        if self.backend.direct:
+            self.backend.read_block(buf, start, n)
+            self._after_direct(start + n - 1)
+            return
+        self.set_we(1)
+        self.set_ce(0)
+        self.set_oe(0)
+        read_data = self.backend.read_data
+        settle_us = self.settle_us
+        for i in range(n):
+            self.set_address(start + i)
+            if settle_us:
+                sleep_us(settle_us)
+            buf[i] = read_data()
+
+    def write_strobe(self, addr, value):
+        self.claim()
+        if self.backend.direct:
+            self.backend.write_strobe(addr, value)
+            self._after_direct(addr)
+            self.data = value & 0xFF
+            return
+        Bus.write_strobe(self, addr, value)
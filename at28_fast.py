@@ -0,0 +1,171 @@
+from array import array
+
+import at28_bus
+
+try:
+    import at28_viper
+except ImportError:
+    # CPython, or a firmware built without the viper emitter
+    at28_viper = None
+
+# Compiled AT28 bus cycles.
+#
+# All lookup tables of a PortBus are flattened into one array('I') "ctx" so
+# the viper functions in at28_viper.py can reach them through a single ptr32
+# argument (viper functions take at most four arguments). The functions below
+# are the pure-Python twins of at28_viper: same ctx, same register accesses,
+# same results, but going through a mem32-like object so they run on CPython
+# against sim_gpio.SimGPIO.
+#
+# ctx layout (word offsets, mirrored as const() in at28_viper.py):
+N_ADDR = 0  # number of address ports
+N_DATA = 1  # number of data-out ports
+N_IDR = 2  # number of data-in ports
+CE = 3  # BSRR address, set word, reset word
+OE = 6
+WE = 9
+SETTLE = 12  # IDR reads spent waiting for data valid
+PULSE = 13  # IDR reads spent with WE low
+HI_MASK = 14  # mask for address bits above the low byte
+DESC = 16
+# From DESC: per address port [bsrr, lo table, hi table], per data port
+# [bsrr, table], per input port [idr, shift, mask, table]; tables are given
+# as word offsets into ctx and follow the descriptors.
+
+# Delay loops: each iteration is one AHB read of IDR (~40 ns at 100 MHz),
+# comfortably above tACC (150 ns) and tWP (100 ns) of an AT28C16
+LOOP_NS = 40
+SETTLE_LOOPS = 8
+PULSE_LOOPS = 8
+
+
+def build_ctx(bus, settle=SETTLE_LOOPS, pulse=PULSE_LOOPS):
+    """Flatten the tables of a PortBus into a ctx array"""
+    header = [0] * DESC
+    header[N_ADDR] = len(bus.addr_tables)
+    header[N_DATA] = len(bus.data_tables)
+    header[N_IDR] = len(bus.idr_tables)
+    header[CE:CE + 3] = bus.ce
+    header[OE:OE + 3] = bus.oe
+    header[WE:WE + 3] = bus.we
+    header[SETTLE] = settle
+    header[PULSE] = pulse
+    header[HI_MASK] = bus.hi_mask
+
+    desc = []
+    tables = []
+    base = (DESC + 3 * len(bus.addr_tables) + 2 * len(bus.data_tables)
+            + 4 * len(bus.idr_tables))
+
+    def place(table):
+        offset = base + len(tables)
+        tables.extend(table)
+        return offset
+
+    for bsrr, lo_table, hi_table in bus.addr_tables:
+        desc.extend((bsrr, place(lo_table), place(hi_table)))
+    for bsrr, table in bus.data_tables:
+        desc.extend((bsrr, place(table)))
+    for idr, shift, mask, table in bus.idr_tables:
+        desc.extend((idr, shift, mask, place(table)))
+    return array('I', header + desc + tables)
+
+
+def _set_address(ctx, mem, addr):
+    lo = addr & 0xFF
+    hi = (addr >> 8) & ctx[HI_MASK]
+    d = DESC
+    for _ in range(ctx[N_ADDR]):
+        mem[ctx[d]] = ctx[ctx[d + 1] + lo] | ctx[ctx[d + 2] + hi]
+        d += 3
+
+
+def _read_data(ctx, mem):
+    d = DESC + 3 * ctx[N_ADDR] + 2 * ctx[N_DATA]
+    idr0 = ctx[d]
+    for _ in range(ctx[SETTLE]):
+        mem[idr0]
+    value = 0
+    for _ in range(ctx[N_IDR]):
+        raw = mem[ctx[d]]
+        value |= ctx[ctx[d + 3] + ((raw >> ctx[d + 1]) & ctx[d + 2])]
+        d += 4
+    return value
+
+
+_byte = bytearray(1)
+
+
+def read_byte(ctx, mem, addr):
+    # A one-byte read_block, as in at28_viper
+    read_block(ctx, mem, _byte, addr, 1)
+    return _byte[0]
+
+
+def read_block(ctx, mem, buf, start, n):
+    """Read n bytes from start into buf with CE/OE held low"""
+    mem[ctx[WE]] = ctx[WE + 1]
+    mem[ctx[CE]] = ctx[CE + 2]
+    mem[ctx[OE]] = ctx[OE + 2]
+    for i in range(n):
+        _set_address(ctx, mem, start + i)
+        buf[i] = _read_data(ctx, mem)
+    mem[ctx[CE]] = ctx[CE + 1]
+    mem[ctx[OE]] = ctx[OE + 1]
+
+
+def write_strobe(ctx, mem, addr, value):
+    """Latch one byte; data pins must already be outputs"""
+    _set_address(ctx, mem, addr)
+    d = DESC + 3 * ctx[N_ADDR]
+    for _ in range(ctx[N_DATA]):
+        mem[ctx[d]] = ctx[ctx[d + 1] + (value & 0xFF)]
+        d += 2
+    mem[ctx[OE]] = ctx[OE + 1]  # OE high
+    mem[ctx[CE]] = ctx[CE + 2]  # CE low
+    mem[ctx[WE]] = ctx[WE + 2]  # WE low
+    idr0 = ctx[d]
+    for _ in range(ctx[PULSE]):
+        mem[idr0]
+    mem[ctx[WE]] = ctx[WE + 1]  # WE high
+    mem[ctx[CE]] = ctx[CE + 1]  # CE high
+
+
+class FastBus(at28_bus.PortBus):
+    """PortBus whose read and program cycles run as viper-compiled code.
+
+    Falls back to the pure-Python twins when at28_viper is unavailable or
+    when a simulated mem is given.
+    """
+
+    direct = True
+
+    def __init__(self, addr_names, io_names, ce_name, oe_name, we_name, mem=None,
+                 settle=SETTLE_LOOPS, pulse=PULSE_LOOPS):
+        super().__init__(addr_names, io_names, ce_name, oe_name, we_name, mem)
+        self.ctx = build_ctx(self, settle, pulse)
+        self.compiled = at28_viper is not None and mem is None
+
+    def set_timing(self, settle_ns, pulse_ns):
+        super().set_timing(settle_ns, pulse_ns)
+        self.ctx[SETTLE] = (settle_ns + LOOP_NS - 1) // LOOP_NS
+        self.ctx[PULSE] = (pulse_ns + LOOP_NS - 1) // LOOP_NS
+
+    def read_byte(self, addr):
+        if self.compiled:
+            return at28_viper.read_byte(self.ctx, addr)
+        return read_byte(self.ctx, self.mem, addr)
+
+    def read_block(self, buf, start, n=None):
+        if n is None:
+            n = len(buf)
+        if self.compiled:
+            at28_viper.read_block(self.ctx, buf, start, n)
+        else:
+            read_block(self.ctx, self.mem, buf, start, n)
+
+    def write_strobe(self, addr, value):
+        if self.compiled:
+            at28_viper.write_strobe(self.ctx, addr, value)
+        else:
+            write_strobe(self.ctx, self.mem, addr, value)
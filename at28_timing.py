@@ -0,0 +1,85 @@
+import json
+import time
+
+
+def ticks_us():
+    # Looked up per call so sim_gpio.SimGPIO.install() can swap the clock
+    if hasattr(time, 'ticks_us'):
+        return time.ticks_us()
+    return time.perf_counter_ns() // 1000
+
+
+def ticks_diff(a, b):
+    if hasattr(time, 'ticks_diff'):
+        return time.ticks_diff(a, b)
+    return a - b
+
+
+# Per-chip AT28 timing profiles, written by flashWrite_at28.calibrate() and
+# loaded by flashRead_at28 / flashWrite_at28 at import:
+#   {"default": {"settle_ns": 200, "pulse_ns": 150}, ...}
+# poll_us is not calibrated (polling ends on the first completed read, so the
+# interval cannot make a write fail); set it by hand in the file if needed.
+PROFILE_FILE = 'at28_timing.json'
+
+# Conservative settings used until a chip has been calibrated
+DEFAULT_PROFILE = {
+    'settle_ns': 1000,  # address/OE to data valid
+    'pulse_ns': 1000,  # WE low pulse width
+    'poll_us': 0,  # delay between write-cycle completion polls
+}
+
+# Sweep candidates, slowest first
+SETTLE_NS = [1000, 500, 300, 200, 150, 120, 100, 80, 40, 0]
+PULSE_NS = [1000, 500, 300, 200, 150, 100, 80, 40]
+
+
+def load(chip='default'):
+    """Timing profile for chip, DEFAULT_PROFILE for anything not stored"""
+    profile = dict(DEFAULT_PROFILE)
+    try:
+        with open(PROFILE_FILE) as f:
+            profile.update(json.load(f).get(chip, {}))
+    except (OSError, ValueError):
+        pass
+    return profile
+
+
+def save(chip, profile):
+    try:
+        with open(PROFILE_FILE) as f:
+            profiles = json.load(f)
+    except (OSError, ValueError):
+        profiles = {}
+    profiles[chip] = profile
+    with open(PROFILE_FILE, 'w') as f:
+        json.dump(profiles, f)
+
+
+def sweep(candidates, trial, nbytes, margin=1):
+    """Run trial(value) for every candidate, slowest first.
+
+    trial returns True when the bus was reliable at that setting. Returns
+    (chosen, rows): rows is [(value, ok, bytes_per_s)] for the report, and
+    chosen is the fastest candidate that passed together with every slower
+    one, backed off by margin steps (None if even the slowest failed).
+    """
+    rows = []
+    passing = -1
+    for i, value in enumerate(candidates):
+        t0 = ticks_us()
+        ok = trial(value)
+        us = ticks_diff(ticks_us(), t0)
+        rows.append((value, ok, nbytes * 1000000 // us if us > 0 else 0))
+        if ok and passing == i - 1:
+            passing = i
+    if passing < 0:
+        return None, rows
+    return candidates[max(passing - margin, 0)], rows
+
+
+def report(name, rows, chosen):
+    print(f"{name:>10}   ok      B/s")
+    for value, ok, rate in rows:
+        mark = '<' if value == chosen else ''
+        print(f"{value:>10}  {'yes' if ok else ' no'}  {rate:>7} {mark}")
@@ -0,0 +1,106 @@
+import micropython
+from micropython import const
+
+# Viper-compiled AT28 bus cycles. ctx is built by at28_fast.build_ctx and
+# these functions must stay in step with the Python twins in at28_fast.py.
+
+_N_ADDR = const(0)
+_N_DATA = const(1)
+_N_IDR = const(2)
+_CE = const(3)
+_OE = const(6)
+_WE = const(9)
+_SETTLE = const(12)
+_PULSE = const(13)
+_HI_MASK = const(14)
+_DESC = const(16)
+
+
+@micropython.viper
+def read_block(ctx: ptr32, buf: ptr8, start: int, n: int):
+    ce = ptr32(ctx[_CE])
+    oe = ptr32(ctx[_OE])
+    we = ptr32(ctx[_WE])
+    n_addr = ctx[_N_ADDR]
+    n_idr = ctx[_N_IDR]
+    idr_desc = _DESC + 3 * n_addr + 2 * ctx[_N_DATA]
+    idr0 = ptr32(ctx[idr_desc])
+    settle = ctx[_SETTLE]
+    hi_mask = ctx[_HI_MASK]
+
+    we[0] = ctx[_WE + 1]  # WE high
+    ce[0] = ctx[_CE + 2]  # CE low
+    oe[0] = ctx[_OE + 2]  # OE low
+    i = 0
+    while i < n:
+        addr = start + i
+        lo = addr & 0xFF
+        hi = (addr >> 8) & hi_mask
+        d = _DESC
+        p = 0
+        while p < n_addr:
+            reg = ptr32(ctx[d])
+            reg[0] = ctx[ctx[d + 1] + lo] | ctx[ctx[d + 2] + hi]
+            d += 3
+            p += 1
+        s = 0
+        while s < settle:
+            idr0[0]
+            s += 1
+        value = 0
+        d = idr_desc
+        p = 0
+        while p < n_idr:
+            reg = ptr32(ctx[d])
+            value |= ctx[ctx[d + 3] + ((reg[0] >> ctx[d + 1]) & ctx[d + 2])]
+            d += 4
+            p += 1
+        buf[i] = value
+        i += 1
+    ce[0] = ctx[_CE + 1]
+    oe[0] = ctx[_OE + 1]
+
+
+_byte = bytearray(1)
+
+
+def read_byte(ctx, addr):
+    read_block(ctx, _byte, addr, 1)
+    return _byte[0]
+
+
+@micropython.viper
+def write_strobe(ctx: ptr32, addr: int, value: int):
+    ce = ptr32(ctx[_CE])
+    oe = ptr32(ctx[_OE])
+    we = ptr32(ctx[_WE])
+    n_addr = ctx[_N_ADDR]
+    n_data = ctx[_N_DATA]
+
+    lo = addr & 0xFF
+    hi = (addr >> 8) & ctx[_HI_MASK]
+    d = _DESC
+    p = 0
+    while p < n_addr:
+        reg = ptr32(ctx[d])
+        reg[0] = ctx[ctx[d + 1] + lo] | ctx[ctx[d + 2] + hi]
+        d += 3
+        p += 1
+    p = 0
+    while p < n_data:
+        reg = ptr32(ctx[d])
+        reg[0] = ctx[ctx[d + 1] + (value & 0xFF)]
+        d += 2
+        p += 1
+    idr0 = ptr32(ctx[d])
+    pulse = ctx[_PULSE]
+
+    oe[0] = ctx[_OE + 1]  # OE high
+    ce[0] = ctx[_CE + 2]  # CE low
+    we[0] = ctx[_WE + 2]  # WE low
+    s = 0
+    while s < pulse:
+        idr0[0]
+        s += 1
+    we[0] = ctx[_WE + 1]  # WE high
+    ce[0] = ctx[_CE + 1]  # CE high
@@ -0,0 +1,76 @@
+import sys
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+# Binary framed dumps over the USB VCP, shared by the three readers
+# (flashRead_*.dump_binary). After the marker line the board sends frames:
+#
+#   magic 'FD' | offset u32 | length u16 | crc32 u32 | payload  (little endian)
+#
+# one per read chunk, then an end frame with length 0, offset = start +
+# total length and the CRC32 of the whole dump. host/dump.py rebuilds and
+# checks the image.
+
+MARKER = b'BINARY DUMP\n'
+MAGIC = b'FD'
+HEADER_LEN = 12
+
+_header = bytearray(HEADER_LEN)
+_header[0:2] = MAGIC
+
+_table = None
+
+
+def _crc32_soft(data, crc=0):
+    # Table-driven CRC32 for firmware built without binascii.crc32
+    global _table
+    if _table is None:
+        _table = []
+        for i in range(256):
+            c = i
+            for _ in range(8):
+                c = (c >> 1) ^ 0xEDB88320 if c & 1 else c >> 1
+            _table.append(c)
+    crc ^= 0xFFFFFFFF
+    for b in data:
+        crc = _table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+if crc32 is None:
+    crc32 = _crc32_soft
+
+
+def _put(value, pos, n):
+    for i in range(n):
+        _header[pos + i] = (value >> (8 * i)) & 0xFF
+
+
+def send_frame(out, offset, data, crc):
+    _put(offset, 2, 4)
+    _put(len(data), 6, 2)
+    _put(crc, 8, 4)
+    out.write(_header)
+    if len(data):
+        out.write(data)
+
+
+def dump(read_stream, start, length, out=None):
+    """Send start..start+length as frames; read_stream(start, length,
+    callback(addr, data)) is the reader's chunked read. Returns the CRC32
+    of the whole dump."""
+    if out is None:
+        out = sys.stdout.buffer
+    total = [0]
+
+    def frame(addr, data):
+        total[0] = crc32(data, total[0])
+        send_frame(out, addr, data, crc32(data))
+
+    out.write(MARKER)
+    read_stream(start, length, frame)
+    send_frame(out, start + length, b'', total[0])
+    return total[0]
@@ -0,0 +1,129 @@
+import sys
+
+try:
+    import micropython
+except ImportError:
+    micropython = None
+
+try:
+    import select
+except ImportError:
+    select = None
+
+from binary_dump import crc32
+
+# Windowed binary uploads over the USB VCP, shared by the three writers
+# (flashWrite_*.upload). After "READY <max payload>" the host sends frames
+#
+#   magic 'FU' | seq u16 | offset u32 | length u16 | crc32 u32 | payload
+#
+# (little endian; the CRC covers seq, offset, length and the payload) and
+# keeps up to a window of them in flight. The board takes frames strictly in
+# sequence and answers each one:
+#
+#   'A' seq u16   frame seq was written
+#   'N' seq u16   damaged or out-of-order frame, resend from seq (go-back-N)
+#
+# and after the last byte prints "DONE <length> <crc32>". host/upload.py is
+# the sending side.
+
+MAGIC = b'FU'
+HEADER_LEN = 14
+MAX_PAYLOAD = 256
+TIMEOUT_MS = 10000  # give up when the host goes quiet for this long
+
+_frame = bytearray(HEADER_LEN + MAX_PAYLOAD)
+_frame_mv = memoryview(_frame)
+_reply = bytearray(3)
+
+
+def _get(pos, n):
+    value = 0
+    for i in range(n):
+        value |= _frame[pos + i] << (8 * i)
+    return value
+
+
+def _send(out, kind, seq):
+    _reply[0] = kind
+    _reply[1] = seq & 0xFF
+    _reply[2] = (seq >> 8) & 0xFF
+    out.write(_reply)
+
+
+def _receive(stream, mv, poller):
+    got = 0
+    n = len(mv)
+    while got < n:
+        if poller and not poller.poll(TIMEOUT_MS):
+            raise OSError(f"Upload timed out {n - got} bytes into a read")
+        k = stream.readinto(mv[got:])
+        if k == 0:
+            raise EOFError("Stream closed during upload")
+        if k:
+            got += k
+
+
+def _sync(stream, poller):
+    # Skip to the next magic; after a damaged frame the stream may be mid-payload
+    one = _frame_mv[0:1]
+    while True:
+        _receive(stream, one, poller)
+        if _frame[0] != MAGIC[0]:
+            continue
+        _receive(stream, _frame_mv[1:2], poller)
+        if _frame[1] == MAGIC[1]:
+            return
+
+
+def receive(sink, start, length, stream=None, out=None):
+    """Receive length bytes for start..start+length, calling sink(addr,
+    data) for each frame in address order. data is a memoryview valid only
+    until sink returns. Returns the CRC32 of the data."""
+    if stream is None:
+        stream = sys.stdin.buffer
+    if out is None:
+        out = sys.stdout.buffer
+    poller = None
+    if select:
+        poller = select.poll()
+        poller.register(stream, select.POLLIN)
+
+    out.write(f"READY {MAX_PAYLOAD}\n".encode())
+    # Ctrl-C (0x03) is data from here on
+    if micropython:
+        micropython.kbd_intr(-1)
+    seq = 0
+    addr = start
+    end = start + length
+    crc = 0
+    nak_sent = False
+    try:
+        while addr < end:
+            _sync(stream, poller)
+            _receive(stream, _frame_mv[2:HEADER_LEN], poller)
+            n = _get(8, 2)
+            if n > MAX_PAYLOAD:
+                n = 0  # corrupt length; the CRC check below fails
+            _receive(stream, _frame_mv[HEADER_LEN:HEADER_LEN + n], poller)
+            good = (crc32(_frame_mv[HEADER_LEN:HEADER_LEN + n], crc32(_frame_mv[2:10])) == _get(10, 4)
+                    and n > 0 and _get(2, 2) == seq & 0xFFFF and _get(4, 4) == addr
+                    and addr + n <= end)
+            if not good:
+                # One NAK per loss; frames already in flight are dropped quietly
+                if not nak_sent:
+                    _send(out, ord('N'), seq)
+                    nak_sent = True
+                continue
+            nak_sent = False
+            data = _frame_mv[HEADER_LEN:HEADER_LEN + n]
+            sink(addr, data)
+            crc = crc32(data, crc)
+            _send(out, ord('A'), seq)
+            seq += 1
+            addr += n
+    finally:
+        if micropython:
+            micropython.kbd_intr(3)
+    out.write(f"DONE {length} {crc}\n".encode())
+    return crc
@@ -4,6 +4,10 @@ import pyb
 #     time.sleep_ms(100)
 pyb.usb_mode('VCP+HID')
 
+# Start the resident job server (job_server.py) after the splash screen;
+# Ctrl-C on the VCP returns to the REPL
+JOB_SERVER = False
+
 import ssd1306
 import machine
 
@@ -104,3 +108,7 @@ for c in "V1.0":
     x += 18  # Space between characters
 
 display.show()
+
+if JOB_SERVER:
+    import job_server
+    job_server.run()
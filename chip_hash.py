@@ -0,0 +1,96 @@
+import binascii
+from binary_dump import crc32
+
+try:
+    import hashlib
+except ImportError:
+    hashlib = None
+
+# Streaming chip hashes shared by the three readers (flashRead_*.checksum and
+# verify): the chip goes through the reader's read_stream() buffer, so a 16 MB
+# W25 is hashed in one pass without holding more than one read chunk, and the
+# host compares a digest instead of the contents.
+#
+#   flashRead_w25.checksum(0, 0x1000000, 'sha256')
+#   flashRead_w25.checksum(0, 0x10000, 'crc32', sector=4096)   # + per sector
+#   flashRead_w25.checksum(0, 0x1000000, 'crc32', 4096, on_sector=print)
+#   flashRead_w25.verify('9f86d081...', 0, 0x1000000)
+#
+# Digests are lowercase hex; CRC32 is written as 8 digits (zlib.crc32 value).
+
+ALGOS = ('crc32', 'sha256')
+
+
+class _Crc32:
+    def __init__(self):
+        self.crc = 0
+
+    def update(self, data):
+        self.crc = crc32(data, self.crc)
+
+    def digest(self):
+        return bytes([(self.crc >> shift) & 0xFF for shift in (24, 16, 8, 0)])
+
+
+def new(algo):
+    if algo == 'crc32':
+        return _Crc32()
+    if algo == 'sha256':
+        if hashlib is None:
+            raise ValueError("This firmware has no hashlib")
+        return hashlib.sha256()
+    raise ValueError(f"Unknown algorithm {algo} (use {' or '.join(ALGOS)})")
+
+
+def hexdigest(h):
+    # MicroPython hash objects have no hexdigest()
+    return binascii.hexlify(h.digest()).decode()
+
+
+def checksum(read_stream, start, length, algo='crc32', sector=None, on_sector=None):
+    """Hex digest of start..start+length read through read_stream(start,
+    length, callback). With sector, returns (digest, list of the digests of
+    each sector-aligned piece). With on_sector as well, on_sector(base,
+    digest) gets each sector's digest as soon as it is complete and the
+    list is None, so a whole chip's worth is never held in RAM."""
+    whole = new(algo)
+    sectors = None if on_sector else []
+    current = [None, None]  # sector base, its hash
+
+    def finish():
+        if current[1] is None:
+            return
+        if on_sector:
+            on_sector(current[0], hexdigest(current[1]))
+        else:
+            sectors.append(hexdigest(current[1]))
+
+    def add(addr, data):
+        whole.update(data)
+        if not sector:
+            return
+        pos = 0
+        while pos < len(data):
+            a = addr + pos
+            base = a - a % sector
+            if current[0] != base:
+                finish()
+                current[0] = base
+                current[1] = new(algo)
+            n = min(base + sector - a, len(data) - pos)
+            current[1].update(data[pos:pos + n])
+            pos += n
+
+    read_stream(start, length, add)
+    if not sector:
+        return hexdigest(whole)
+    finish()
+    return hexdigest(whole), sectors
+
+
+def verify(read_stream, digest, start, length, algo=None):
+    """True if start..start+length hashes to digest; algo defaults to
+    crc32 for 8 hex digits and sha256 otherwise"""
+    if algo is None:
+        algo = 'crc32' if len(digest) == 8 else 'sha256'
+    return checksum(read_stream, start, length, algo) == digest.lower()
@@ -1,45 +1,102 @@
 import machine
 import time
 import ssd1306
+import at24_speed
+import at24_geometry
+import binary_dump
+import chip_hash
 from machine import I2C, Pin
 
 # AT24 EEPROM I2C configuration
 # Common AT24 I2C addresses: 0x50-0x57 (depending on A0-A2 pins)
 AT24_I2C_ADDR = 0x50
 
+# Bulk reads use the chip's sequential-read mode: one address write, then
+# READ_CHUNK bytes per transaction into one reused buffer
+READ_CHUNK = 4096
+_read_buf = bytearray(READ_CHUNK)
+_read_mv = memoryview(_read_buf)
+_addr_buf = bytearray(2)
+
+# From at24_geometry.known(): probed by the writer or declared with
+# at24_geometry.define(); the reader never probes, since probing writes
+geometry = None
+
 # I2C bus configuration (I2C1)
 # WeAct STM32F411 BlackPill I2C pins
+I2C_ID = 2
 i2c = None
 
+# Set by job_server: init_i2c() keeps an already initialized bus
+KEEP_INIT = False
+
 def init_i2c():
-    global i2c
+    global i2c, geometry
+    if KEEP_INIT and i2c is not None:
+        return
     # Initialize I2C bus with explicit pin configuration for WeAct BlackPill
     # Using I2C2 with SCL=PB10, SDA=PB9
-    i2c = machine.I2C(2, freq=100000)
+    i2c = machine.I2C(I2C_ID, freq=at24_speed.SAFE_FREQ)
     # Scan for devices
     devices = i2c.scan()
     print(f"I2C scan found {len(devices)} device(s): {[hex(d) for d in devices]}")
     if AT24_I2C_ADDR not in devices:
         print(f"Warning: AT24 not found at address 0x{AT24_I2C_ADDR:02X}")
+        return
+    geometry = at24_geometry.known(AT24_I2C_ADDR)
+    if geometry is None:
+        print("AT24 geometry unknown: 2-byte addresses, 32 KB assumed "
+              "(flashWrite_at24.init_i2c() probes it)")
+    # Switch to the fastest clock that passes the readback check
+    i2c = at24_speed.open_bus(I2C_ID, AT24_I2C_ADDR, geometry=geometry)
+    print(f"AT24 bus speed: {at24_speed.cached_freq(AT24_I2C_ADDR)} Hz")
 
 def read_byte(addr):
     """Read a single byte from AT24 EEPROM at given address"""
-    # For AT24C256 and similar: 2-byte addressing
-    addr_bytes = bytes([addr >> 8, addr & 0xFF])
-    i2c.writeto(AT24_I2C_ADDR, addr_bytes, False)
-    data = i2c.readfrom(AT24_I2C_ADDR, 1)
-    return data[0]
+    return read_bytes(addr, 1)[0]
 
 def read_bytes(addr, length):
-    """Read multiple bytes from AT24 EEPROM"""
-    # For AT24C256 and similar: 2-byte addressing
-    addr_bytes = bytes([addr >> 8, addr & 0xFF])
-    i2c.writeto(AT24_I2C_ADDR, addr_bytes, False)
-    return i2c.readfrom(AT24_I2C_ADDR, length)
-
-def dump_flash(start, length):
-    """Dump AT24 EEPROM contents"""
+    """Read multiple bytes from AT24 EEPROM (addressed like read_into)"""
+    buf = bytearray(length)
+    read_into(addr, buf)
+    return bytes(buf)
+
+def read_into(addr, buf):
+    """Sequential read of len(buf) bytes starting at addr into buf"""
+    if geometry:
+        n = geometry.header(_addr_buf, addr)
+        dev_addr = geometry.device(AT24_I2C_ADDR, addr)
+    else:
+        _addr_buf[0] = (addr >> 8) & 0xFF
+        _addr_buf[1] = addr & 0xFF
+        n = 2
+        dev_addr = AT24_I2C_ADDR
+    i2c.writeto(dev_addr, memoryview(_addr_buf)[:n], False)
+    i2c.readfrom_into(dev_addr, buf)
+
+def read_stream(start, length, callback):
+    """Stream start..start+length in READ_CHUNK-sized sequential reads.
+
+    callback(addr, data) gets a memoryview into the shared read buffer,
+    valid only until it returns.
+    """
+    addr = start
+    end = start + length
+    while addr < end:
+        n = min(READ_CHUNK, end - addr)
+        if geometry:
+            # 1-byte-address parts: stay inside one 256-byte block
+            n = min(n, geometry.block_end(addr) - addr)
+        chunk = _read_mv[:n]
+        read_into(addr, chunk)
+        callback(addr, chunk)
+        addr += n
+
+def dump_flash(start=0, length=None):
+    """Dump AT24 EEPROM contents (to the end of the chip by default)"""
     init_i2c()
+    if length is None:
+        length = (geometry.size if geometry else 32768) - start
     
     # Initialize display
     # i2c_display=machine.I2C(1)
@@ -48,25 +105,48 @@ def dump_flash(start, length):
     # display.text("AT28 Programmer", 5, 5, 1)
     # display.show()
     
-    for base in range(start, start+length, 16):
-        row = []
-        row.append(f"{base:04X}:")
-        for offset in range(16):
-            addr = base + offset
-            
-            # if addr % 500 == 0:
-            #     display.fill(0)
-            #     display.text("AT24 Programmer", 5, 5, 1)
-            #     display.text(f"R {addr:04X}", 5, 30, 1)
-            #     display.show()
-                
-            if addr >= start + length:
-                break
-            b = read_byte(addr)
-            row.append(f"{b:02X}")
-        print(' '.join(row))
+    def print_rows(addr, data):
+        # if addr % 4096 == 0:
+        #     display.fill(0)
+        #     display.text("AT24 Programmer", 5, 5, 1)
+        #     display.text(f"R {addr:04X}", 5, 30, 1)
+        #     display.show()
+        for offset in range(0, len(data), 16):
+            row = []
+            row.append(f"{addr + offset:04X}:")
+            for b in data[offset:offset + 16]:
+                row.append(f"{b:02X}")
+            print(' '.join(row))
+
+    read_stream(start, length, print_rows)
+
+def dump_binary(start=0, length=None):
+    """Dump as CRC-checked binary frames (see binary_dump.py, host/dump.py)"""
+    init_i2c()
+    if length is None:
+        length = (geometry.size if geometry else 32768) - start
+    binary_dump.dump(read_stream, start, length)
+
+def checksum(start=0, length=None, algo='crc32', sector=None, on_sector=None):
+    """CRC32 or SHA-256 (hex) of the range, streamed through the read buffer;
+    with sector also the digest of every sector, as a list or passed to
+    on_sector(base, digest) (see chip_hash.py)"""
+    init_i2c()
+    if length is None:
+        length = (geometry.size if geometry else 32768) - start
+    result = chip_hash.checksum(read_stream, start, length, algo, sector, on_sector)
+    print(f"{algo} {start:04X}+{length}: {result[0] if sector else result}")
+    return result
+
+def verify(image_hash, start=0, length=None, algo=None):
+    """True if the range hashes to image_hash (CRC32 or SHA-256 hex)"""
+    init_i2c()
+    if length is None:
+        length = (geometry.size if geometry else 32768) - start
+    ok = chip_hash.verify(read_stream, image_hash, start, length, algo)
+    print("Verify OK" if ok else "Verify FAILED: hash differs")
+    return ok
 
 if __name__ == "__main__":
-    # AT24C256 has 32KB (32768 bytes)
-    # Change this based on your AT24 chip size
-    dump_flash(0, 32768)
+    # Whole chip, size probed at init
+    dump_flash()
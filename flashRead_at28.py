@@ -1,6 +1,10 @@
 import machine
-import time
 import ssd1306
+import at28_bus
+import at28_fast
+import at28_timing
+import binary_dump
+import chip_hash
 
 # Pin mapping based on your comments
 IO_PINS = [
@@ -50,22 +54,80 @@ ce = get_pin(CE_PIN, machine.Pin.OUT)
 oe = get_pin(OE_PIN, machine.Pin.OUT)
 we = get_pin(WE_PIN, machine.Pin.OUT)
 
+# Bus backend: 'native' runs viper-compiled cycles on the port registers,
+# 'port' drives whole GPIO port registers from Python, 'pin' is the per-pin
+# fallback
+BUS = 'native'
+bus = None
+
+# Timing profile from flashWrite_at28.calibrate(), see at28_timing.py
+TIMING_PROFILE = 'default'
+timing = at28_timing.load(TIMING_PROFILE)
+
+def select_bus(kind):
+    global bus
+    if kind == 'native':
+        bus = at28_fast.FastBus([p[0] for p in ADDR_PINS], [p[0] for p in IO_PINS],
+                                CE_PIN, OE_PIN, WE_PIN)
+    elif kind == 'port':
+        bus = at28_bus.PortBus([p[0] for p in ADDR_PINS], [p[0] for p in IO_PINS],
+                               CE_PIN, OE_PIN, WE_PIN)
+    elif kind == 'pin':
+        bus = at28_bus.PinBus(addr_pins, io_pins, ce, oe, we)
+    else:
+        raise ValueError(f"Unknown bus backend: {kind}")
+    bus = at28_bus.BusState(bus)
+    bus.set_timing(timing['settle_ns'], timing['pulse_ns'])
+    return bus
+
+select_bus(BUS)
+
 def set_address(addr):
-    for i, pin in enumerate(addr_pins):
-        pin.value((addr >> i) & 1)
+    bus.set_address(addr)
 
 def read_byte(addr):
-    set_address(addr)
-    ce.value(0)  # CE low
-    oe.value(0)  # OE low
-    we.value(1)  # WE high
-    time.sleep_us(1)  # Small delay for settling
-    value = 0
-    for i, pin in enumerate(io_pins):
-        value |= (pin.value() << i)
-    ce.value(1)
-    oe.value(1)
-    return value
+    return bus.read_byte(addr)
+
+def read_into(buf, start):
+    """Burst-read len(buf) bytes starting at start into buf"""
+    bus.read_block(buf, start)
+    bus.idle()
+
+def read_stream(start, length, callback, chunk=256):
+    """Burst-read start..start+length in chunk-sized pieces; callback(addr,
+    data) gets a memoryview valid only until it returns"""
+    buf = bytearray(chunk)
+    mv = memoryview(buf)
+    addr = start
+    end = start + length
+    while addr < end:
+        n = min(chunk, end - addr)
+        bus.read_block(buf, addr, n)
+        bus.idle()
+        callback(addr, mv[:n])
+        addr += n
+
+def dump_binary(start=0, length=2048):
+    """Dump as CRC-checked binary frames (see binary_dump.py, host/dump.py)"""
+    binary_dump.dump(read_stream, start, min(length, 2048 - start))
+
+def checksum(start=0, length=None, algo='crc32', sector=None, on_sector=None):
+    """CRC32 or SHA-256 (hex) of the range, streamed through the read buffer;
+    with sector also the digest of every sector, as a list or passed to
+    on_sector(base, digest) (see chip_hash.py)"""
+    if length is None:
+        length = 2048 - start
+    result = chip_hash.checksum(read_stream, start, length, algo, sector, on_sector)
+    print(f"{algo} {start:04X}+{length}: {result[0] if sector else result}")
+    return result
+
+def verify(image_hash, start=0, length=None, algo=None):
+    """True if the range hashes to image_hash (CRC32 or SHA-256 hex)"""
+    if length is None:
+        length = 2048 - start
+    ok = chip_hash.verify(read_stream, image_hash, start, length, algo)
+    print("Verify OK" if ok else "Verify FAILED: hash differs")
+    return ok
 
 def dump_flash(start, len):
     i2c=machine.I2C(1)
@@ -74,23 +136,24 @@ def dump_flash(start, len):
     display.text("AT28 Programmer", 5, 5, 1)
     display.show()
     
-    for base in range(start, start+len, 16):
+    end = min(start + len, 2048)
+    row_buf = bytearray(16)
+    # CE/OE stay asserted for the whole dump, only changed address lines move
+    for base in range(start, end, 16):
+        if base % 512 == 0:
+            display.fill(0)
+            display.text("AT28 Programmer", 5, 5, 1)
+            display.text(f"R {base:04X}", 5, 30, 1)
+            display.show()
+
+        n = min(16, end - base)
+        bus.read_block(row_buf, base, n)
         row = []
         row.append(f"{base:04X}:")
-        for offset in range(16):
-            addr = base + offset
-            
-            if addr % 500 == 0:
-                display.fill(0)
-                display.text("AT28 Programmer", 5, 5, 1)
-                display.text(f"R {addr:02X} to {addr:04X}", 5, 30, 1)
-                display.show()
-                
-            if addr >= 2048:
-                break
-            b = read_byte(addr)
-            row.append(f"{b:02X}")
+        for i in range(n):
+            row.append(f"{row_buf[i]:02X}")
         print(' '.join(row))
+    bus.idle()
 
 if __name__ == "__main__":
     dump_flash(0, 2048)
@@ -1,6 +1,9 @@
 import machine
 import time
 import ssd1306
+import w25_sfdp
+import binary_dump
+import chip_hash
 from machine import SPI, Pin
 
 # W25Q128 SPI Flash Configuration
@@ -15,19 +18,42 @@ CMD_POWER_DOWN = 0xB9
 CMD_RELEASE_POWER_DOWN = 0xAB
 CMD_RESET_ENABLE = 0x66
 CMD_RESET_MEMORY = 0x99
+CMD_ENTER_4BYTE = 0xB7
+
+# Chip descriptor from SFDP (see w25_sfdp.py), read by init_spi()
+flash = dict(w25_sfdp.DEFAULT)
+
+# SPI clock: SPI1 runs off APB2 (100 MHz), so the hardware tops out at
+# 50 MHz; fast read (0x0B) is specified up to 104 MHz on the W25Q128
+BAUDRATE = 25000000
+
+# Bulk reads: one fast-read transaction per READ_WINDOW bytes, received
+# READ_CHUNK bytes at a time into one reused buffer
+READ_WINDOW = 0x10000
+READ_CHUNK = 4096
+_read_buf = bytearray(READ_CHUNK)
+_read_mv = memoryview(_read_buf)
+_cmd_buf = bytearray(6)
 
 # SPI Configuration
 spi = None
 cs = None
 
-def init_spi():
-    global spi, cs
+# Set by job_server: init_spi() keeps an already initialized bus
+KEEP_INIT = False
+
+def init_spi(baudrate=None):
+    global spi, cs, flash
+    if KEEP_INIT and spi is not None:
+        return
+    if baudrate is None:
+        baudrate = BAUDRATE
     # Initialize SPI bus (SPI1) for WeAct BlackPill
     # SCK=PA5, MISO=PA6, MOSI=PA7
     try:
         spi = machine.SPI(
             1,
-            baudrate=1000000,
+            baudrate=baudrate,
             polarity=0,
             phase=0,
             bits=8,
@@ -38,7 +64,7 @@ def init_spi():
         )
     except (ValueError, TypeError):
         try:
-            spi = machine.SPI(1, baudrate=1000000, polarity=0, phase=0)
+            spi = machine.SPI(1, baudrate=baudrate, polarity=0, phase=0)
         except Exception:
             spi = machine.SoftSPI(
                 baudrate=500000,
@@ -67,6 +93,20 @@ def init_spi():
     else:
         print(f"Warning: Unexpected device ID: {device_id:06X} (expected 0xEF4018)")
 
+    # Geometry and read command of whatever part is attached
+    flash = w25_sfdp.discover(spi, cs)
+    w25_sfdp.describe(flash)
+    if flash['addr_bytes'] == 4:
+        cs.value(0)
+        spi.write(bytes([CMD_ENTER_4BYTE]))
+        cs.value(1)
+
+def _cmd(op, addr):
+    """Command byte + 3 or 4 address bytes, per the chip descriptor"""
+    if flash['addr_bytes'] == 4:
+        return bytes([op, (addr >> 24) & 0xFF, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF])
+    return bytes([op, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF])
+
 def read_device_id():
     """Read W25Q128 manufacturer and device ID"""
     cs.value(0)
@@ -104,7 +144,7 @@ def read_status():
 def read_byte(addr):
     """Read a single byte from address"""
     cs.value(0)
-    spi.write(bytes([CMD_READ_DATA, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF]))
+    spi.write(_cmd(CMD_READ_DATA, addr))
     data = spi.read(1)[0]
     cs.value(1)
     return data
@@ -112,11 +152,52 @@ def read_byte(addr):
 def read_bytes(addr, length):
     """Read multiple bytes from address"""
     cs.value(0)
-    spi.write(bytes([CMD_READ_DATA, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF]))
+    spi.write(_cmd(CMD_READ_DATA, addr))
     data = spi.read(length)
     cs.value(1)
     return data
 
+def _fast_read_start(addr):
+    # Read command from the descriptor (FAST_READ: address + one dummy
+    # byte), CS left low
+    opcode, dummy = flash['read']
+    n = flash['addr_bytes']
+    _cmd_buf[0] = opcode
+    for i in range(n):
+        _cmd_buf[n - i] = (addr >> (8 * i)) & 0xFF
+    for i in range(dummy):
+        _cmd_buf[n + 1 + i] = 0
+    cs.value(0)
+    spi.write(memoryview(_cmd_buf)[:n + 1 + dummy])
+
+def read_into(addr, buf):
+    """Fast read of len(buf) bytes starting at addr into buf"""
+    _fast_read_start(addr)
+    spi.readinto(buf)
+    cs.value(1)
+
+def read_stream(start, length, callback):
+    """Stream start..start+length with one fast-read transaction per
+    READ_WINDOW bytes, READ_CHUNK bytes at a time.
+
+    callback(addr, data) gets a memoryview into the shared read buffer,
+    valid only until it returns.
+    """
+    addr = start
+    end = start + length
+    while addr < end:
+        window_end = min(addr + READ_WINDOW, end)
+        _fast_read_start(addr)
+        try:
+            while addr < window_end:
+                n = min(READ_CHUNK, window_end - addr)
+                chunk = _read_mv[:n]
+                spi.readinto(chunk)
+                callback(addr, chunk)
+                addr += n
+        finally:
+            cs.value(1)
+
 def dump_flash(start, length):
     """Dump W25Q128 flash contents"""
     init_spi()
@@ -128,20 +209,44 @@ def dump_flash(start, length):
     # display.text("W25Q128 Reader", 5, 5, 1)
     # display.show()
     
-    for base in range(start, start + length, 16):
-        row = [f"{base:06X}:"]
-
-        # if base % 1000 == 0:
+    def print_rows(addr, data):
+        # if addr % 0x10000 == 0:
         #     display.fill(0)
         #     display.text("W25Q128 Reader", 5, 5, 1)
-        #     display.text(f"R {base:06X}", 5, 30, 1)
+        #     display.text(f"R {addr:06X}", 5, 30, 1)
         #     display.show()
+        for offset in range(0, len(data), 16):
+            row = [f"{addr + offset:06X}:"]
+            for b in data[offset:offset + 16]:
+                row.append(f"{b:02X}")
+            print(' '.join(row))
+
+    read_stream(start, length, print_rows)
 
-        chunk_len = min(16, (start + length) - base)
-        data = read_bytes(base, chunk_len)
-        for b in data:
-            row.append(f"{b:02X}")
-        print(' '.join(row))
+def dump_binary(start, length):
+    """Dump as CRC-checked binary frames (see binary_dump.py, host/dump.py)"""
+    init_spi()
+    binary_dump.dump(read_stream, start, length)
+
+def checksum(start=0, length=None, algo='crc32', sector=None, on_sector=None):
+    """CRC32 or SHA-256 (hex) of the range, streamed through the read buffer;
+    with sector also the digest of every sector, as a list or passed to
+    on_sector(base, digest) (see chip_hash.py)"""
+    init_spi()
+    if length is None:
+        length = flash['size'] - start
+    result = chip_hash.checksum(read_stream, start, length, algo, sector, on_sector)
+    print(f"{algo} {start:06X}+{length}: {result[0] if sector else result}")
+    return result
+
+def verify(image_hash, start=0, length=None, algo=None):
+    """True if the range hashes to image_hash (CRC32 or SHA-256 hex)"""
+    init_spi()
+    if length is None:
+        length = flash['size'] - start
+    ok = chip_hash.verify(read_stream, image_hash, start, length, algo)
+    print("Verify OK" if ok else "Verify FAILED: hash differs")
+    return ok
 
 if __name__ == "__main__":
     # W25Q128 has 16MB (16777216 bytes)
@@ -1,45 +1,154 @@
 import machine
 import time
 import ssd1306
+import at24_speed
+import at24_geometry
+import binary_upload
 from machine import I2C, Pin
 
 # AT24 EEPROM I2C configuration
 # Common AT24 I2C addresses: 0x50-0x57 (depending on A0-A2 pins)
 AT24_I2C_ADDR = 0x50
 
+# Page size of the attached part: AT24C256/512 use 64/128-byte pages,
+# AT24C32/64 32-byte pages. Page writes must not cross a page boundary.
+# init_i2c() replaces these with the probed geometry (see at24_geometry.py).
+PAGE_SIZE = 64
+SIZE = 32768
+geometry = None
+
+# Write-cycle completion is detected by ACK polling: the part NACKs its
+# address until the internal write cycle is over (tWR max 5 ms)
+WRITE_TIMEOUT_MS = 20
+
+# Observed write-cycle times
+_stats = {'count': 0, 'total_us': 0, 'min_us': 0, 'max_us': 0, 'polls': 0}
+
+# Preallocated page-write buffer: 2 address bytes + up to 256 data bytes
+_page_buf = bytearray(2 + 256)
+_page_mv = memoryview(_page_buf)
+
 # I2C bus configuration (I2C1)
 # WeAct STM32F411 BlackPill I2C pins
+I2C_ID = 2
 i2c = None
 
+# Set by job_server: init_i2c() keeps an already initialized bus
+KEEP_INIT = False
+
 def init_i2c():
-    global i2c
+    global i2c, geometry, PAGE_SIZE, SIZE
+    if KEEP_INIT and i2c is not None:
+        return
     # Initialize I2C bus with explicit pin configuration for WeAct BlackPill
     # Using I2C2 with SCL=PB10, SDA=PB9
-    i2c = machine.I2C(2, freq=100000)
+    i2c = machine.I2C(I2C_ID, freq=at24_speed.SAFE_FREQ)
     # Scan for devices
     devices = i2c.scan()
     print(f"I2C scan found {len(devices)} device(s): {[hex(d) for d in devices]}")
     if AT24_I2C_ADDR not in devices:
         print(f"Warning: AT24 not found at address 0x{AT24_I2C_ADDR:02X}")
+        return
+    geometry = at24_geometry.probe(i2c, AT24_I2C_ADDR)
+    PAGE_SIZE = geometry.page_size
+    SIZE = geometry.size
+    # Switch to the fastest clock that passes the readback check (including a
+    # write/readback of the scratch page)
+    i2c = at24_speed.open_bus(I2C_ID, AT24_I2C_ADDR, write_test=True, geometry=geometry)
+    print(f"AT24 bus speed: {at24_speed.cached_freq(AT24_I2C_ADDR)} Hz")
+
+def _device(addr):
+    # 1-byte-address parts take the block bits in the device address
+    return geometry.device(AT24_I2C_ADDR, addr) if geometry else AT24_I2C_ADDR
+
+def _header(buf, addr):
+    if geometry:
+        return geometry.header(buf, addr)
+    buf[0] = (addr >> 8) & 0xFF
+    buf[1] = addr & 0xFF
+    return 2
+
+def wait_ready(dev_addr=AT24_I2C_ADDR):
+    """ACK-poll until the write cycle completes, return its duration in us"""
+    start = time.ticks_us()
+    polls = 0
+    while True:
+        polls += 1
+        try:
+            i2c.writeto(dev_addr, b'')
+            break
+        except OSError:
+            # NACK: write cycle still running
+            if time.ticks_diff(time.ticks_us(), start) > WRITE_TIMEOUT_MS * 1000:
+                raise RuntimeError(f"AT24 at 0x{dev_addr:02X} busy for over {WRITE_TIMEOUT_MS} ms")
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    if _stats['count'] == 0 or elapsed < _stats['min_us']:
+        _stats['min_us'] = elapsed
+    if elapsed > _stats['max_us']:
+        _stats['max_us'] = elapsed
+    _stats['count'] += 1
+    _stats['total_us'] += elapsed
+    _stats['polls'] += polls
+    return elapsed
+
+def cycle_stats(reset=False):
+    """Write-cycle statistics: count, min/avg/max us and ACK polls per cycle"""
+    stats = dict(_stats)
+    count = stats['count']
+    stats['avg_us'] = stats['total_us'] // count if count else 0
+    stats['polls_per_cycle'] = stats['polls'] / count if count else 0
+    if reset:
+        for key in _stats:
+            _stats[key] = 0
+    return stats
+
+def print_cycle_stats():
+    stats = cycle_stats()
+    print(f"Write cycles: {stats['count']}, min {stats['min_us']} us, "
+          f"avg {stats['avg_us']} us, max {stats['max_us']} us, "
+          f"{stats['polls_per_cycle']:.1f} polls/cycle")
 
 def write_byte(addr, value):
     """Write a single byte to AT24 EEPROM at given address"""
     value = value & 0xff
-    # For AT24C256 and similar: 2-byte addressing + data byte
-    addr_bytes = bytes([addr >> 8, addr & 0xFF, value])
-    i2c.writeto(AT24_I2C_ADDR, addr_bytes)
-    # AT24 requires 5ms write cycle time
-    time.sleep_ms(5)
-
-def write_bytes(addr, data):
-    """Write multiple bytes to AT24 EEPROM (page write)"""
-    # For AT24C256: 64-byte page write
-    # Note: writes must not cross page boundaries
-    addr_bytes = bytes([addr >> 8, addr & 0xFF]) + bytes(data)
-    i2c.writeto(AT24_I2C_ADDR, addr_bytes)
-    # AT24 requires 5ms write cycle time
-    time.sleep_ms(5)
-
+    # Word address (1 or 2 bytes) + data byte
+    n = _header(_page_buf, addr)
+    _page_buf[n] = value
+    dev_addr = _device(addr)
+    i2c.writeto(dev_addr, _page_mv[:n + 1])
+    wait_ready(dev_addr)
+
+def write_page(addr, data):
+    """Write up to one page; data must not cross a page boundary"""
+    n = len(data)
+    if n == 0:
+        return
+    if (addr % PAGE_SIZE) + n > PAGE_SIZE:
+        raise ValueError(f"Page write at {addr:04X} crosses a {PAGE_SIZE}-byte page")
+    h = _header(_page_buf, addr)
+    _page_buf[h:h + n] = data
+    dev_addr = _device(addr)
+    i2c.writeto(dev_addr, _page_mv[:h + n])
+    wait_ready(dev_addr)
+
+def write_bytes(addr, data, progress=None):
+    """Write any number of bytes, split into page-aligned page writes"""
+    mv = memoryview(data)
+    end = addr + len(data)
+    pos = addr
+    while pos < end:
+        n = min(PAGE_SIZE - pos % PAGE_SIZE, end - pos)
+        if progress:
+            progress(pos)
+        write_page(pos, mv[pos - addr:pos - addr + n])
+        pos += n
+
+
+def upload(start, length):
+    """Program length bytes sent by host/upload.py at start"""
+    init_i2c()
+    binary_upload.receive(write_bytes, start, length)
+    print_cycle_stats()
 
 def write_00_to_ff():
     init_i2c()
@@ -50,16 +159,18 @@ def write_00_to_ff():
     # display.text("AT24 Programmer", 5, 5, 1)
     # display.show()
 
-    for addr in range(32768):  # AT24C256 has 32KB
-        if addr % 500 == 0:
-            print(f"Writing 00 to {addr:04X}")
+    page = bytearray(PAGE_SIZE)
+    for page_addr in range(0, SIZE, PAGE_SIZE):
+        if page_addr % 512 == 0:
+            print(f"Writing 00 to {page_addr:04X}")
         #     display.fill(0)
         #     display.text("AT24 Programmer", 5, 5, 1)
-        #     display.text(f"W {addr:04X}", 5, 30, 1)
+        #     display.text(f"W {page_addr:04X}", 5, 30, 1)
         #     display.show()
-        #     print(f"W {addr:04X}")
-
-        write_byte(addr, addr & 0xFF)
+        for i in range(PAGE_SIZE):
+            page[i] = (page_addr + i) & 0xFF
+        write_page(page_addr, page)
+    print_cycle_stats()
 
     # display.fill(0)
     # display.text("AT24 Programmer", 5, 5, 1)
@@ -82,31 +193,43 @@ def write(str):
     # display.text("AT28 Programmer", 5, 5, 1)
     # display.show()
 
+    values = {}
     for i in range(0, len(tokens), 2):
         addr = int(tokens[i], 0)  # Support hex (0x...), decimal, etc.
         value = int(tokens[i+1], 0)
-        write_byte(addr, value)
-
-        if addr > 0 and addr % 500 == 0:
-            print(f"Wrote {value:02X} to {addr:04X}")
-            # display.fill(0)
-            # display.text("AT28 Programmer", 5, 5, 1)
-            # display.text(f"W {value:02X} to {addr:04X}", 5, 30, 1)
-            # display.show()
+        values[addr] = value & 0xFF
+
+    # Group the pairs into runs of consecutive addresses, page-written
+    addrs = sorted(values)
+    i = 0
+    while i < len(addrs):
+        j = i + 1
+        while j < len(addrs) and addrs[j] == addrs[j - 1] + 1:
+            j += 1
+        addr = addrs[i]
+        write_bytes(addr, bytes([values[a] for a in addrs[i:j]]))
+        print(f"Wrote {j - i} byte(s) at {addr:04X}")
+        # display.fill(0)
+        # display.text("AT28 Programmer", 5, 5, 1)
+        # display.text(f"W {j - i} at {addr:04X}", 5, 30, 1)
+        # display.show()
+        i = j
 
     # display.fill(0)
     # display.text("AT28 Programmer", 5, 5, 1)
-    # display.text(f"W {value:02X} to {addr:04X}", 5, 30, 1)
+    # display.text(f"W Complete", 5, 30, 1)
     # display.show()
 
 
 def erase():
     init_i2c()
     
-    for addr in range(32768):  # AT24C256 has 32KB
-        if addr % 500 == 0:
-            print(f"Erasing {addr:04X}")
-        write_byte(addr, 0xFF)  # EEPROM erase value is typically 0xFF
+    page = bytearray(b'\xff' * PAGE_SIZE)  # EEPROM erase value is typically 0xFF
+    for page_addr in range(0, SIZE, PAGE_SIZE):
+        if page_addr % 512 == 0:
+            print(f"Erasing {page_addr:04X}")
+        write_page(page_addr, page)
+    print_cycle_stats()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,10 @@
 import machine
 import time
 import ssd1306
+import at28_bus
+import at28_fast
+import at28_timing
+import binary_upload
 
 # Pin mapping based on your comments
 IO_PINS = [
@@ -54,75 +58,231 @@ oe = get_pin(OE_PIN, machine.Pin.OUT)
 we = get_pin(WE_PIN, machine.Pin.OUT)
 
 
+# Bus backend: 'native' runs viper-compiled cycles on the port registers,
+# 'port' drives whole GPIO port registers from Python, 'pin' is the per-pin
+# fallback
+BUS = 'native'
+bus = None
+
+# Timing profile from flashWrite_at28.calibrate(), see at28_timing.py
+TIMING_PROFILE = 'default'
+timing = at28_timing.load(TIMING_PROFILE)
+
+
+def select_bus(kind):
+    global bus
+    if kind == 'native':
+        bus = at28_fast.FastBus([p[0] for p in ADDR_PINS], [p[0] for p in IO_PINS],
+                                CE_PIN, OE_PIN, WE_PIN)
+    elif kind == 'port':
+        bus = at28_bus.PortBus([p[0] for p in ADDR_PINS], [p[0] for p in IO_PINS],
+                               CE_PIN, OE_PIN, WE_PIN)
+    elif kind == 'pin':
+        bus = at28_bus.PinBus(addr_pins, io_pins, ce, oe, we)
+    else:
+        raise ValueError(f"Unknown bus backend: {kind}")
+    bus = at28_bus.BusState(bus)
+    bus.set_timing(timing['settle_ns'], timing['pulse_ns'])
+    return bus
+
+
+select_bus(BUS)
+
+
 def set_address(addr):
-    for i, pin in enumerate(addr_pins):
-        pin.value((addr >> i) & 1)
+    bus.set_address(addr)
 
 
 def set_data_pins_output():
-    for pin in io_pins:
-        pin.init(mode=machine.Pin.OUT)
+    bus.data_output()
 
 
 def set_data_pins_input():
-    for pin in io_pins:
-        pin.init(mode=machine.Pin.IN)
+    bus.data_input()
 
 
 def set_data(value):
-    for i, pin in enumerate(io_pins):
-        pin.value((value >> i) & 1)
+    bus.write_data(value)
+
+
+# Page mode: AT28C64/AT28C256 latch up to 64 bytes and program them in one
+# write cycle. The board's 11 address lines take the 2 KB AT28C16, which has
+# no page buffer, so the default is one write cycle per byte; set
+# PAGE_SIZE = 64 for a part with page mode.
+PAGE_SIZE = 1
+# Write-cycle completion: 'data' polls /DATA (bit 7 reads inverted until the
+# cycle ends), 'toggle' waits for bit 6 to stop toggling
+POLL = 'data'
+POLL_US = timing['poll_us']  # delay between polls
+WRITE_TIMEOUT_MS = 10  # tWC max
+# Differential programming: read the chip first and skip unchanged bytes
+DIFF = True
+
+
+def wait_write(addr, value):
+    """Poll the last loaded byte until the write cycle ends (False on timeout)"""
+    deadline = time.ticks_add(time.ticks_ms(), WRITE_TIMEOUT_MS)
+    if POLL == 'toggle':
+        prev = bus.read_byte(addr) & 0x40
+        while True:
+            cur = bus.read_byte(addr) & 0x40
+            if cur == prev:
+                return True
+            prev = cur
+            if time.ticks_diff(time.ticks_ms(), deadline) > 0:
+                return False
+            if POLL_US:
+                time.sleep_us(POLL_US)
+    while (bus.read_byte(addr) ^ value) & 0x80:
+        if time.ticks_diff(time.ticks_ms(), deadline) > 0:
+            return False
+        if POLL_US:
+            time.sleep_us(POLL_US)
+    return True
+
+
+def write_page(addr, data, verify=True):
+    """Load up to PAGE_SIZE bytes in one page and program them in one cycle"""
+    n = len(data)
+    if n == 0:
+        return
+    if (addr % PAGE_SIZE) + n > PAGE_SIZE:
+        raise ValueError(f"Page write at {addr:04X} crosses a {PAGE_SIZE}-byte page")
+
+    bus.idle()  # Chip outputs off before driving the data lines
+    set_data_pins_output()
+    for i in range(n):
+        bus.write_strobe(addr + i, data[i])
+    set_data_pins_input()  # Restore data pins to input
+
+    last = addr + n - 1
+    if not wait_write(last, data[n - 1] & 0xFF) and verify:
+        print(f"Write cycle timeout at {last:04X}")
+    if not verify:
+        return
+
+    # Verify the written page
+    readback = bytearray(n)
+    bus.read_block(readback, addr, n)
+    bus.idle()
+    for i in range(n):
+        if readback[i] != data[i] & 0xFF:
+            print(
+                f"Verify fail at {addr + i:04X}: wrote {data[i] & 0xFF:02X}, read {readback[i]:02X}")
+            # exit program
+            raise Exception(
+                f"Verification failed at address {addr + i:04X}: wrote {data[i] & 0xFF:02X}, read {readback[i]:02X}")
 
 
 def write_byte(addr, value):
-    value = value & 0xff
-    set_address(addr)
-    set_data_pins_output()
-    set_data(value)
-    oe.value(1)  # OE high (disable output)
-    ce.value(0)  # CE low
-    we.value(0)  # WE low (write enable)
-    time.sleep_us(1)  # Write pulse width (increased)
-    we.value(1)  # WE high
-    ce.value(1)  # CE high
-    set_data_pins_input()  # Restore data pins to input
-    # time.sleep_us(10)  # Allow time for write cycle (increased)
-    # Verification step: read back and compare
-    # set_address(addr)
-    # we.value(1)
-    # ce.value(0)
-    # oe.value(0)
-    # time.sleep_us(50)  # Short delay to allow bus to settle
-
-    # Verify the written value
-    failTime = 0
-    while True:
-        # time.sleep_ms(10)
-        # set_address(addr)
-        we.value(1)
-        ce.value(0)
-        oe.value(0)
-        read_val = 0
-        time.sleep_us(1)  
-        for i, pin in enumerate(io_pins):
-            read_val |= (pin.value() << i)
-        ce.value(1)
-        oe.value(1)
-
-        if read_val == value or failTime == 100:
-            break
-        
-        if failTime > 10:
-            print(f"addr: {addr:04X}, failTime: {failTime}, read_val: {read_val:02X}, expected value: {value:02X}")
-        failTime += 1
-        time.sleep_us(100)
-
-    if read_val != value:
-        print(
-            f"Verify fail at {addr:04X}: wrote {value:02X}, read {read_val:02X}")
-        # exit program
-        raise Exception(
-            f"Verification failed at address {addr:04X}: wrote {value:02X}, read {read_val:02X}")
+    write_page(addr, bytes([value & 0xff]))
+
+
+def write_image(data, start=0, progress=None, verify=True, diff=None):
+    """Program data at start, split into page-aligned loads.
+
+    With diff (default DIFF) the current contents are read first and only
+    the bytes that differ are programmed: unchanged pages are skipped, and
+    a changed page is loaded from its first to its last differing byte.
+    Returns the number of bytes skipped.
+    """
+    if diff is None:
+        diff = DIFF
+    mv = memoryview(data)
+    end = start + len(data)
+    current = None
+    if diff:
+        current = bytearray(len(data))
+        bus.read_block(current, start)
+        bus.idle()
+
+    skipped = 0
+    addr = start
+    while addr < end:
+        n = min(PAGE_SIZE - addr % PAGE_SIZE, end - addr)
+        lo = addr - start
+        hi = lo + n
+        if current is not None:
+            # Trim the load to the span of differing bytes
+            while lo < hi and current[lo] == mv[lo]:
+                lo += 1
+            while hi > lo and current[hi - 1] == mv[hi - 1]:
+                hi -= 1
+            skipped += n - (hi - lo)
+        if lo < hi:
+            if progress:
+                progress(start + lo)
+            write_page(start + lo, mv[lo:hi], verify)
+        addr += n
+
+    if diff:
+        print(f"Programmed {len(data) - skipped} byte(s), skipped {skipped} unchanged")
+    return skipped
+
+
+def calibrate(start=0, chip=None, save=True, repeat=4):
+    """Find the fastest reliable read/write timing for the inserted chip.
+
+    64 bytes at start are used as scratch and restored afterwards. Prints
+    the throughput at every tested setting and stores the chosen values as
+    the chip's timing profile.
+    """
+    if chip is None:
+        chip = TIMING_PROFILE
+    safe = at28_timing.DEFAULT_PROFILE
+    n = 64
+
+    bus.set_timing(safe['settle_ns'], safe['pulse_ns'])
+    saved = bytearray(n)
+    bus.read_block(saved, start)
+    bus.idle()
+    patterns = [bytes([(0x55 if i & 1 else 0xAA) ^ i for i in range(n)])]
+    patterns.append(bytes([b ^ 0xFF for b in patterns[0]]))
+    write_image(patterns[0], start, diff=False)
+    readback = bytearray(n)
+
+    def read_trial(settle_ns):
+        bus.set_timing(settle_ns, safe['pulse_ns'])
+        for _ in range(repeat):
+            bus.read_block(readback, start)
+            bus.idle()
+            if readback != patterns[0]:
+                return False
+        return True
+
+    settle_ns, rows = at28_timing.sweep(at28_timing.SETTLE_NS, read_trial, n * repeat)
+    at28_timing.report('settle_ns', rows, settle_ns)
+    if settle_ns is None:
+        bus.set_timing(safe['settle_ns'], safe['pulse_ns'])
+        raise Exception("Calibration failed: no reliable read timing")
+
+    trials = [0]
+
+    def write_trial(pulse_ns):
+        bus.set_timing(settle_ns, pulse_ns)
+        # Alternate patterns so every trial really has to program the bytes
+        trials[0] += 1
+        data = patterns[trials[0] & 1]
+        write_image(data, start, verify=False, diff=False)
+        bus.read_block(readback, start)
+        bus.idle()
+        return readback == data
+
+    pulse_ns, rows = at28_timing.sweep(
+        at28_timing.PULSE_NS, write_trial, n)
+    at28_timing.report('pulse_ns', rows, pulse_ns)
+    if pulse_ns is None:
+        pulse_ns = safe['pulse_ns']
+    bus.set_timing(settle_ns, pulse_ns)
+
+    write_image(saved, start)
+
+    profile = {'settle_ns': settle_ns, 'pulse_ns': pulse_ns}
+    timing.update(profile)
+    if save:
+        at28_timing.save(chip, profile)
+    print(f"Timing for {chip}: {profile}")
+    return profile
 
 
 def write_00_to_ff():
@@ -132,19 +292,19 @@ def write_00_to_ff():
     display.text("AT28 Programmer", 5, 5, 1)
     display.show()
 
-    for addr in range(2048):
-        if addr % 500 == 0:
+    def progress(addr):
+        print(f"W {addr:04X}")
+        if addr % 512 == 0:
             display.fill(0)
             display.text("AT28 Programmer", 5, 5, 1)
-            display.text(f"W {addr:04X} to {addr:04X}", 5, 30, 1)
+            display.text(f"W {addr:04X}", 5, 30, 1)
             display.show()
 
-        print(f"W {addr:04X} to {addr:04X}")
-        write_byte(addr, addr)
+    write_image(bytes([addr & 0xFF for addr in range(2048)]), 0, progress)
 
     display.fill(0)
     display.text("AT28 Programmer", 5, 5, 1)
-    display.text(f"W {addr:04X} to {addr:04X}", 5, 30, 1)
+    display.text(f"W Complete", 5, 30, 1)
     display.show()
 
 
@@ -160,28 +320,42 @@ def write(str):
     display.text("AT28 Programmer", 5, 5, 1)
     display.show()
 
+    values = {}
     for i in range(0, len(tokens), 2):
         addr = int(tokens[i], 0)  # Support hex (0x...), decimal, etc.
         value = int(tokens[i+1], 0)
-        write_byte(addr, value)
-
-        if addr > 0 and addr % 500 == 0:
-            print(f"Wrote {value:02X} to {addr:04X}")
-            display.fill(0)
-            display.text("AT28 Programmer", 5, 5, 1)
-            display.text(f"W {value:02X} to {addr:04X}", 5, 30, 1)
-            display.show()
+        values[addr] = value & 0xFF
+
+    # Group the pairs into runs of consecutive addresses, one image each
+    addrs = sorted(values)
+    skipped = 0
+    i = 0
+    while i < len(addrs):
+        j = i + 1
+        while j < len(addrs) and addrs[j] == addrs[j - 1] + 1:
+            j += 1
+        addr = addrs[i]
+        skipped += write_image(bytes([values[a] for a in addrs[i:j]]), addr)
+        print(f"Wrote {j - i} byte(s) at {addr:04X}")
+        display.fill(0)
+        display.text("AT28 Programmer", 5, 5, 1)
+        display.text(f"W {j - i} at {addr:04X}", 5, 30, 1)
+        display.show()
+        i = j
 
     display.fill(0)
     display.text("AT28 Programmer", 5, 5, 1)
-    display.text(f"W {value:02X} to {addr:04X}", 5, 30, 1)
+    display.text(f"W Complete {skipped} skip", 5, 30, 1)
     display.show()
 
 
+def upload(start, length):
+    """Program length bytes sent by host/upload.py at start"""
+    binary_upload.receive(lambda addr, data: write_image(data, addr, diff=False), start, length)
+
+
 def erase():
-    for addr in range(2048):
-        print(f"W {addr:04X}")
-        write_byte(addr, 0x00)
+    write_image(bytes(2048), 0, lambda addr: print(f"W {addr:04X}"))
 
 
 if __name__ == "__main__":
@@ -1,6 +1,10 @@
 import machine
 import time
 import ssd1306
+import w25_erase
+import w25_sfdp
+import w25_writer
+import binary_upload
 from machine import SPI, Pin
 
 # W25Q128 SPI Flash Configuration
@@ -27,19 +31,58 @@ CMD_POWER_DOWN = 0xB9
 CMD_RELEASE_POWER_DOWN = 0xAB
 CMD_RESET_ENABLE = 0x66
 CMD_RESET_MEMORY = 0x99
+CMD_ENTER_4BYTE = 0xB7
+
+# SPI clock for commands and programming
+BAUDRATE = 1000000
+# Clock for bulk reads (image compare and verify), as in flashRead_w25
+READ_BAUDRATE = 25000000
+
+# Chip descriptor from SFDP (see w25_sfdp.py), read by init_spi()
+flash = dict(w25_sfdp.DEFAULT)
+PAGE_SIZE = 256
+
+# Command layer: commands go out of preallocated buffers, so status polls
+# and page programs allocate nothing
+_cmd_buf = bytearray(5)
+_cmd_mv = memoryview(_cmd_buf)
+_status_buf = bytearray(1)
+_RDSR = bytes([CMD_READ_STATUS])
+_WREN = bytes([CMD_WRITE_ENABLE])
+
+# Read the status register back after every write enable to check WEL
+# (one extra status read per operation; catches a held /WP)
+VERIFY_WEL = False
+
+# Busy polling: the first poll comes after POLL_FIRST percent of the
+# operation's typical time (from SFDP), then polls follow 1/2**POLL_SHIFT of
+# that time apart (back to back for page programs, ~2 ms for block erases).
+# No single sleep exceeds POLL_MAX_US, so a chip erase stays interruptible
+# and is noticed within that time of finishing
+POLL_FIRST = 90
+POLL_SHIFT = 6
+POLL_MAX_US = 2000
+
+# Status polls per program/erase operation
+_poll_stats = {'ops': 0, 'polls': 0, 'max_polls': 0, 'busy_us': 0}
 
 # SPI Configuration
 spi = None
 cs = None
 
+# Set by job_server: init_spi() keeps an already initialized bus
+KEEP_INIT = False
+
 def init_spi():
-    global spi, cs
+    global spi, cs, flash, PAGE_SIZE
+    if KEEP_INIT and spi is not None:
+        return
     # Initialize SPI bus (SPI1) for WeAct BlackPill
     # SCK=PA5, MISO=PA6, MOSI=PA7
     try:
         spi = machine.SPI(
             1,
-            baudrate=1000000,
+            baudrate=BAUDRATE,
             polarity=0,
             phase=0,
             bits=8,
@@ -50,7 +93,7 @@ def init_spi():
         )
     except (ValueError, TypeError):
         try:
-            spi = machine.SPI(1, baudrate=1000000, polarity=0, phase=0)
+            spi = machine.SPI(1, baudrate=BAUDRATE, polarity=0, phase=0)
         except Exception:
             spi = machine.SoftSPI(
                 baudrate=500000,
@@ -81,6 +124,24 @@ def init_spi():
     else:
         print(f"Warning: Unexpected device ID: {device_id:06X} (expected 0xEF4018)")
 
+    # Geometry, erase types and timings of whatever part is attached
+    flash = w25_sfdp.discover(spi, cs)
+    w25_sfdp.describe(flash)
+    PAGE_SIZE = flash['page_size']
+    if flash['addr_bytes'] == 4:
+        cs.value(0)
+        spi.write(bytes([CMD_ENTER_4BYTE]))
+        cs.value(1)
+
+def _cmd(op, addr):
+    """Command byte + 3 or 4 address bytes (per the chip descriptor) in the
+    shared command buffer"""
+    n = flash['addr_bytes']
+    _cmd_buf[0] = op
+    for i in range(n):
+        _cmd_buf[n - i] = (addr >> (8 * i)) & 0xFF
+    return _cmd_mv[:n + 1]
+
 def read_device_id():
     """Read W25Q128 manufacturer and device ID"""
     cs.value(0)
@@ -110,10 +171,10 @@ def flash_reset():
 def read_status():
     """Read status register"""
     cs.value(0)
-    spi.write(bytes([CMD_READ_STATUS]))
-    status = spi.read(1)[0]
+    spi.write(_RDSR)
+    spi.readinto(_status_buf)
     cs.value(1)
-    return status
+    return _status_buf[0]
 
 def read_status2():
     """Read status register-2"""
@@ -153,16 +214,63 @@ def disable_protection():
         sr3 = read_status3()
         print(f"Status after:  SR1={sr1:02X} SR2={sr2:02X} SR3={sr3:02X}")
 
-def wait_busy():
-    """Wait until write operation completes"""
+def wait_busy(expected_us=0, since=None):
+    """Wait until write operation completes.
+
+    With expected_us (the typical time of the operation just started) the
+    first poll is deferred to POLL_FIRST percent of it and the polls are
+    counted in poll_stats(). since is the ticks_us() at which the operation
+    started, when other work has run since then.
+    """
+    if not expected_us:
+        while read_status() & 0x01:
+            time.sleep_us(10)
+        return
+    start = time.ticks_us() if since is None else since
+    first = expected_us * POLL_FIRST // 100
+    while True:
+        left = first - time.ticks_diff(time.ticks_us(), start)
+        if left <= 0:
+            break
+        time.sleep_us(min(left, POLL_MAX_US))
+    interval = min(expected_us >> POLL_SHIFT, POLL_MAX_US)
+    polls = 1
     while read_status() & 0x01:
-        time.sleep_us(10)
+        polls += 1
+        time.sleep_us(interval)
+    _poll_stats['ops'] += 1
+    _poll_stats['polls'] += polls
+    _poll_stats['busy_us'] += time.ticks_diff(time.ticks_us(), start)
+    if polls > _poll_stats['max_polls']:
+        _poll_stats['max_polls'] = polls
+
+def poll_stats(reset=False):
+    """Status polls per program/erase operation: ops, polls, max and average"""
+    stats = dict(_poll_stats)
+    ops = stats['ops']
+    stats['polls_per_op'] = stats['polls'] / ops if ops else 0
+    stats['avg_busy_us'] = stats['busy_us'] // ops if ops else 0
+    if reset:
+        for key in _poll_stats:
+            _poll_stats[key] = 0
+    return stats
+
+def print_poll_stats():
+    stats = poll_stats()
+    print(f"Operations: {stats['ops']}, {stats['polls_per_op']:.1f} status polls/op "
+          f"(max {stats['max_polls']}), avg busy {stats['avg_busy_us']} us")
 
 def write_enable():
-    """Enable write operations"""
+    """Enable write operations (WEL checked when VERIFY_WEL is set)"""
     cs.value(0)
-    spi.write(bytes([CMD_WRITE_ENABLE]))
+    spi.write(_WREN)
     cs.value(1)
+    if VERIFY_WEL and not read_status() & 0x02:
+        cs.value(0)
+        spi.write(_WREN)
+        cs.value(1)
+        if not read_status() & 0x02:
+            raise RuntimeError("Write enable latch not set. Check /WP pin.")
 
 def write_disable():
     """Disable write operations"""
@@ -173,7 +281,7 @@ def write_disable():
 def read_byte(addr):
     """Read a single byte from address"""
     cs.value(0)
-    spi.write(bytes([CMD_READ_DATA, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF]))
+    spi.write(_cmd(CMD_READ_DATA, addr))
     data = spi.read(1)[0]
     cs.value(1)
     return data
@@ -181,62 +289,64 @@ def read_byte(addr):
 def read_bytes(addr, length):
     """Read multiple bytes from address"""
     cs.value(0)
-    spi.write(bytes([CMD_READ_DATA, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF]))
+    spi.write(_cmd(CMD_READ_DATA, addr))
     data = spi.read(length)
     cs.value(1)
     return data
 
-def write_page(addr, data):
-    """Write up to 256 bytes (one page). Address must be page-aligned."""
-    if len(data) > 256:
-        raise ValueError("Page write data must be <= 256 bytes")
-    
-    wait_busy()
-    write_enable()
+def write_page(addr, data, wait=True):
+    """Write up to one page (PAGE_SIZE bytes). Address must be page-aligned.
 
-    # Ensure write-enable latch is set (bit 1)
-    if (read_status() & 0x02) == 0:
-        write_enable()
-        if (read_status() & 0x02) == 0:
-            raise RuntimeError("Write enable latch not set. Check /WP pin.")
-    
+    Every operation here waits for its own completion, so the chip is idle
+    on entry. With wait=False the program is only started; call
+    wait_busy(flash['program_us'], since) before the next command, since
+    being the ticks_us() taken right after this call.
+    """
+    if len(data) > PAGE_SIZE:
+        raise ValueError(f"Page write data must be <= {PAGE_SIZE} bytes")
+
+    write_enable()
     cs.value(0)
-    spi.write(bytes([CMD_PAGE_PROGRAM, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF]))
+    spi.write(_cmd(CMD_PAGE_PROGRAM, addr))
     spi.write(data)
     cs.value(1)
-    
-    wait_busy()
+
+    if wait:
+        wait_busy(flash['program_us'])
 
 def write_byte(addr, value):
     """Write a single byte to address"""
     write_page(addr, bytes([value & 0xFF]))
 
+def _erase_typical_us(size):
+    for unit, _, us in flash['erase']:
+        if unit == size:
+            return us
+    return 0
+
 def sector_erase(addr):
     """Erase a 4KB sector (sector address must be sector-aligned)"""
-    wait_busy()
     write_enable()
+    cs.value(0)
+    spi.write(_cmd(CMD_SECTOR_ERASE, addr))
+    cs.value(1)
+    wait_busy(_erase_typical_us(0x1000))
 
-    if (read_status() & 0x02) == 0:
-        write_enable()
-        if (read_status() & 0x02) == 0:
-            raise RuntimeError("Write enable latch not set. Check /WP pin.")
-    
+def block_erase_32k(addr):
+    """Erase a 32KB block (address must be 32KB-aligned)"""
+    write_enable()
     cs.value(0)
-    spi.write(bytes([CMD_SECTOR_ERASE, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF]))
+    spi.write(_cmd(CMD_BLOCK_ERASE_32K, addr))
     cs.value(1)
-    
-    wait_busy()
+    wait_busy(_erase_typical_us(0x8000))
 
 def block_erase_64k(addr):
     """Erase a 64KB block (address must be block-aligned)"""
-    wait_busy()
     write_enable()
-    
     cs.value(0)
-    spi.write(bytes([CMD_BLOCK_ERASE_64K, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF]))
+    spi.write(_cmd(CMD_BLOCK_ERASE_64K, addr))
     cs.value(1)
-    
-    wait_busy()
+    wait_busy(_erase_typical_us(0x10000))
 
 def chip_erase():
     """Erase entire chip (takes several seconds)"""
@@ -248,9 +358,186 @@ def chip_erase():
     cs.value(1)
     
     print("Chip erase started (this may take 10-30 seconds)...")
-    wait_busy()
+    wait_busy(flash['chip_erase_us'])
     print("Chip erase complete")
 
+def program_range(addr, data):
+    """Program data at addr, split at page boundaries; all-0xFF pages are
+    skipped (an erased page already reads 0xFF)"""
+    mv = memoryview(data)
+    end = addr + len(data)
+    pos = addr
+    while pos < end:
+        n = min(PAGE_SIZE - pos % PAGE_SIZE, end - pos)
+        chunk = mv[pos - addr:pos - addr + n]
+        if bytes(chunk) != b'\xff' * n:
+            write_page(pos, chunk)
+        pos += n
+
+def erase_block(addr, size):
+    """Erase the size-byte unit at addr with the part's opcode for that size"""
+    for unit, opcode, us in flash['erase']:
+        if unit == size:
+            break
+    else:
+        raise ValueError(f"No {size}-byte erase on this part")
+    write_enable()
+    cs.value(0)
+    spi.write(_cmd(opcode, addr))
+    cs.value(1)
+    wait_busy(us)
+
+def _erase_us():
+    return {size: us for size, _, us in flash['erase']}
+
+def _read_us_per_kb():
+    return 8 * 1024 * 1000000 // BAUDRATE
+
+def erase_ranges(ranges, preserve=True, dry_run=False):
+    """Erase the (start, end) ranges with the cheapest 64K/32K/4K mix.
+
+    With preserve, bytes outside the ranges that share an erase unit with
+    them are read first and programmed back. dry_run only prints the plan.
+    Returns the plan (see w25_erase.py).
+    """
+    if not dry_run:
+        init_spi()
+    ops = w25_erase.plan(ranges, preserve, read_us_per_kb=_read_us_per_kb(), erase_us=_erase_us())
+    w25_erase.print_plan(ops, _read_us_per_kb(), _erase_us())
+    if dry_run:
+        return ops
+    run_erase_plan(ops)
+    return ops
+
+def run_erase_plan(ops):
+    for addr, size, keep in ops:
+        saved = [(start, read_bytes(start, end - start)) for start, end in keep]
+        print(f"E {addr:06X} ({size // 1024}K)")
+        erase_block(addr, size)
+        for start, data in saved:
+            program_range(start, data)
+
+# Image programming compares against the current contents one sector at a
+# time through these buffers
+SECTOR_SIZE = 4096
+_sector_buf = bytearray(SECTOR_SIZE)
+_image_buf = bytearray(SECTOR_SIZE)
+
+def read_into(addr, buf):
+    """Read len(buf) bytes starting at addr into buf, clocked at
+    READ_BAUDRATE"""
+    spi.init(baudrate=READ_BAUDRATE)
+    try:
+        cs.value(0)
+        spi.write(_cmd(CMD_READ_DATA, addr))
+        spi.readinto(buf)
+        cs.value(1)
+    finally:
+        spi.init(baudrate=BAUDRATE)
+
+def _image_chunk(image, offset, n):
+    # Image bytes [offset, offset + n) from a buffer or an open file
+    if hasattr(image, 'readinto'):
+        image.seek(offset)
+        mv = memoryview(_image_buf)[:n]
+        image.readinto(mv)
+        return mv
+    return memoryview(image)[offset:offset + n]
+
+def _image_length(image):
+    if hasattr(image, 'readinto'):
+        image.seek(0, 2)
+        return image.tell()
+    return len(image)
+
+# Per-sector verdicts of program_image
+SAME, PROGRAM, ERASE = 0, 1, 2
+
+def program_image(image, start=0, verify=True, progress=None):
+    """Program image (a buffer or a file opened 'rb') at start, touching
+    only what changed.
+
+    Each sector is compared with the flash: identical pages are skipped,
+    pages whose change only clears bits (1 -> 0) are programmed in place,
+    and only sectors that need a bit set back to 1 are erased (through
+    erase_ranges' planner, which keeps data around the image). Returns
+    (same, programmed, erased) sector counts.
+    """
+    init_spi()
+    length = _image_length(image)
+    end = start + length
+    first = start - start % SECTOR_SIZE
+    verdicts = bytearray((end - first + SECTOR_SIZE - 1) // SECTOR_SIZE)
+    counts = [0, 0, 0]  # per verdict
+
+    # Pass 1: classify sectors
+    dirty = []
+    for i in range(len(verdicts)):
+        lo = max(first + i * SECTOR_SIZE, start)
+        hi = min(first + (i + 1) * SECTOR_SIZE, end)
+        n = hi - lo
+        new = _image_chunk(image, lo - start, n)
+        old = memoryview(_sector_buf)[:n]
+        read_into(lo, old)
+        if bytes(old) != bytes(new):
+            verdicts[i] = PROGRAM
+            for j in range(n):
+                if new[j] & ~old[j] & 0xFF:
+                    verdicts[i] = ERASE
+                    dirty.append((lo, hi))
+                    break
+        counts[verdicts[i]] += 1
+
+    if dirty:
+        ops = w25_erase.plan(dirty, read_us_per_kb=_read_us_per_kb(), erase_us=_erase_us())
+        w25_erase.print_plan(ops, _read_us_per_kb(), _erase_us())
+        run_erase_plan(ops)
+
+    # Pass 2: program changed pages
+    for i, verdict in enumerate(verdicts):
+        if verdict == SAME:
+            continue
+        lo = max(first + i * SECTOR_SIZE, start)
+        hi = min(first + (i + 1) * SECTOR_SIZE, end)
+        if progress:
+            progress(lo)
+        new = _image_chunk(image, lo - start, hi - lo)
+        if verdict == ERASE:
+            program_range(lo, new)
+            continue
+        old = memoryview(_sector_buf)[:hi - lo]
+        read_into(lo, old)
+        pos = lo
+        while pos < hi:
+            n = min(PAGE_SIZE - pos % PAGE_SIZE, hi - pos)
+            k = pos - lo
+            if bytes(old[k:k + n]) != bytes(new[k:k + n]):
+                write_page(pos, new[k:k + n])
+            pos += n
+
+    if verify:
+        for i, verdict in enumerate(verdicts):
+            if verdict == SAME:
+                continue
+            lo = max(first + i * SECTOR_SIZE, start)
+            hi = min(first + (i + 1) * SECTOR_SIZE, end)
+            old = memoryview(_sector_buf)[:hi - lo]
+            read_into(lo, old)
+            if bytes(old) != bytes(_image_chunk(image, lo - start, hi - lo)):
+                raise Exception(f"Verify failed in sector {lo - lo % SECTOR_SIZE:06X}")
+
+    counts = tuple(counts)
+    print(f"Sectors: {counts[0]} unchanged, {counts[1]} programmed in place, {counts[2]} erased")
+    return counts
+
+def upload(start, length):
+    """Program length bytes sent by host/upload.py at start; the range is
+    erased first (data around it is kept)"""
+    init_spi()
+    erase_ranges([(start, start + length)])
+    binary_upload.receive(program_range, start, length)
+    print_poll_stats()
+
 def write_00_to_ff():
     init_spi()
     
@@ -277,6 +564,7 @@ def write_00_to_ff():
 
         page = bytes([(page_addr + i) & 0xFF for i in range(256)])
         write_page(page_addr, page)
+    print_poll_stats()
 
     # display.fill(0)
     # display.text("W25Q128 Writer", 5, 5, 1)
@@ -299,17 +587,22 @@ def write(str):
     # display.text("W25Q128 Writer", 5, 5, 1)
     # display.show()
 
-    for i in range(0, len(tokens), 2):
-        addr = int(tokens[i], 0)  # Support hex (0x...), decimal, etc.
-        value = int(tokens[i+1], 0)
-        write_byte(addr, value)
-
-        if addr > 0 and addr % 1000 == 0:
-            print(f"Wrote {value:02X} to {addr:06X}")
-            # display.fill(0)
-            # display.text("W25Q128 Writer", 5, 5, 1)
-            # display.text(f"W {value:02X} to {addr:06X}", 5, 30, 1)
-            # display.show()
+    # Bytes are merged per page and programmed in address order
+    with w25_writer.Writer(write_page, page=PAGE_SIZE) as writer:
+        for i in range(0, len(tokens), 2):
+            addr = int(tokens[i], 0)  # Support hex (0x...), decimal, etc.
+            value = int(tokens[i+1], 0)
+            writer.write(addr, value)
+
+            if addr > 0 and addr % 1000 == 0:
+                print(f"Wrote {value:02X} to {addr:06X}")
+                # display.fill(0)
+                # display.text("W25Q128 Writer", 5, 5, 1)
+                # display.text(f"W {value:02X} to {addr:06X}", 5, 30, 1)
+                # display.show()
+    stats = writer.stats()
+    print(f"Wrote {stats['bytes']} byte(s) in {stats['programs']} page program(s)")
+    print_poll_stats()
 
     # display.fill(0)
     # display.text("W25Q128 Writer", 5, 5, 1)
@@ -0,0 +1,2 @@
+# Host-side tools (CPython + pyserial) that drive the board over the USB VCP
+# through the MicroPython raw REPL.
@@ -0,0 +1,117 @@
+import time
+
+import serial
+
+# Minimal raw-REPL client: run a statement on the board and talk to it over
+# the same serial line while it runs (stdin/stdout of the running code).
+#
+#   with Board('/dev/ttyACM0') as board:
+#       board.start("import w25_pipeline; w25_pipeline.program_stream(0, 4096)")
+#       board.read_until(b'READY\n')
+#       board.write(data)
+#       out, err = board.finish()
+
+CTRL_A = b'\x01'  # enter raw REPL
+CTRL_B = b'\x02'  # leave raw REPL
+CTRL_C = b'\x03'
+CTRL_D = b'\x04'  # execute / end of output
+
+
+class BoardError(Exception):
+    pass
+
+
+class Board:
+    def __init__(self, port, baudrate=115200, timeout=10):
+        self.port = port
+        self.serial = serial.Serial(port, baudrate, timeout=timeout)
+
+    def __enter__(self):
+        self.enter_raw()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_until(self, marker, timeout=None):
+        """Read up to and including marker"""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.serial.timeout)
+        data = b''
+        while not data.endswith(marker):
+            chunk = self.serial.read(1)
+            if chunk:
+                data += chunk
+            elif time.monotonic() > deadline:
+                raise BoardError(f"{self.port}: timed out waiting for {marker!r} (got {data[-80:]!r})")
+        return data
+
+    def expect(self, marker, timeout=None):
+        """read_until(marker) for text output of running code; raises
+        BoardError with the board's traceback if the code ends first"""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.serial.timeout)
+        data = b''
+        while not data.endswith(marker):
+            chunk = self.serial.read(1)
+            if chunk == CTRL_D:
+                err = self.read_until(CTRL_D)[:-1]
+                self.read_until(b'>')
+                raise BoardError(err.decode(errors='replace').strip()
+                                 or f"{self.port}: ended before {marker!r}: {data[-200:]!r}")
+            if chunk:
+                data += chunk
+            elif time.monotonic() > deadline:
+                raise BoardError(f"{self.port}: timed out waiting for {marker!r} (got {data[-80:]!r})")
+        return data
+
+    def enter_raw(self):
+        self.serial.write(CTRL_C + CTRL_C)  # stop whatever is running
+        time.sleep(0.1)
+        self.serial.reset_input_buffer()
+        self.serial.write(b'\r' + CTRL_A)
+        self.read_until(b'raw REPL; CTRL-B to exit\r\n>')
+
+    def start(self, code):
+        """Send code and start it; its output can then be read while it runs"""
+        if isinstance(code, str):
+            code = code.encode()
+        self.serial.write(code + CTRL_D)
+        if self.serial.read(2) != b'OK':
+            raise BoardError(f"{self.port}: raw REPL did not accept the code")
+
+    def write(self, data):
+        self.serial.write(data)
+
+    def read(self, n):
+        return self.serial.read(n)
+
+    def read_exact(self, n, timeout=None):
+        """Exactly n bytes (binary output may contain any byte value)"""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.serial.timeout)
+        data = b''
+        while len(data) < n:
+            chunk = self.serial.read(n - len(data))
+            if chunk:
+                data += chunk
+            elif time.monotonic() > deadline:
+                raise BoardError(f"{self.port}: timed out after {len(data)} of {n} bytes")
+        return data
+
+    def finish(self, timeout=None):
+        """Wait for the running code to end; returns (stdout, stderr) and
+        raises BoardError if it raised"""
+        out = self.read_until(CTRL_D, timeout)[:-1]
+        err = self.read_until(CTRL_D, timeout)[:-1]
+        self.read_until(b'>', timeout)
+        if err:
+            raise BoardError(err.decode(errors='replace').strip())
+        return out, err
+
+    def exec(self, code, timeout=None):
+        self.start(code)
+        return self.finish(timeout)[0]
+
+    def close(self):
+        try:
+            self.serial.write(CTRL_B)
+        finally:
+            self.serial.close()
@@ -0,0 +1,186 @@
+import hashlib
+import time
+import zlib
+
+from host import dump, upload
+from host.board import Board, BoardError
+
+# Client for the resident job server (job_server.py): commands go straight to
+# the server over the serial port, without a raw REPL session per command.
+#
+#   with Programmer('/dev/ttyACM0') as p:
+#       p.write_image('w25', image, start=0x10000)
+#       p.verify_hash('w25', 0x10000, len(image), hashlib.sha256(image).hexdigest())
+
+JOB_TIMEOUT = 600  # W25 chip erase or a 16 MB image
+
+
+class Programmer(Board):
+    def __enter__(self):
+        self.sync()
+        return self
+
+    def sync(self):
+        """Drop stale output and check that the server answers"""
+        self.serial.reset_input_buffer()
+        self.write(b'\n')
+        return self.status()
+
+    def close(self):
+        self.serial.close()
+
+    def readline(self, timeout=None):
+        return self.expect(b'\n', timeout).decode(errors='replace').strip()
+
+    def status(self):
+        """{'queued': ..., 'running': ..., 'drivers': ...} from 'status'"""
+        self.write(b'status\n')
+        while True:
+            line = self.readline()
+            if line.startswith('STATUS '):
+                return dict(word.split('=', 1) for word in line.split()[1:])
+
+    def submit(self, command):
+        """Queue command; returns its job id"""
+        self.write(command.encode() + b'\n')
+        while True:
+            line = self.readline()
+            if line.startswith('QUEUED '):
+                return int(line.split()[1])
+            if line.startswith('ERR '):
+                raise BoardError(f"{self.port}: {line[4:]}")
+
+    def wait(self, job, timeout=JOB_TIMEOUT, on_line=None):
+        """Wait for job to end; returns its result text, raises BoardError on
+        ERR. on_line gets every other line the job prints."""
+        prefix = f"END {job} "
+        while True:
+            line = self.readline(timeout)
+            if not line.startswith(prefix):
+                if on_line:
+                    on_line(line)
+                continue
+            status, _, result = line[len(prefix):].partition(' ')
+            if status != 'OK':
+                raise BoardError(f"{self.port}: job {job}: {result}")
+            return result
+
+    def run(self, command, timeout=JOB_TIMEOUT):
+        return self.wait(self.submit(command), timeout)
+
+    def checksum(self, chip, start, length, algo='crc32', sector=None, on_sector=None):
+        """Hex digest of the range (see chip_hash.py); with sector,
+        (digest, list of per-sector digests), or (digest, None) with each
+        sector's (base, digest) passed to on_sector as its line arrives"""
+        if sector is None:
+            return self.run(f"checksum {chip} {start} {length} {algo}")
+        sectors = None if on_sector else []
+
+        def sector_line(line):
+            words = line.split()
+            if len(words) != 3 or words[0] != 'SECTOR':
+                return
+            if on_sector:
+                on_sector(int(words[1], 16), words[2])
+            else:
+                sectors.append(words[2])
+
+        job = self.submit(f"checksum {chip} {start} {length} {algo} {sector}")
+        return self.wait(job, on_line=sector_line), sectors
+
+    def verify_hash(self, chip, start, length, digest, algo=None):
+        """Check the range against digest on the board; raises BoardError
+        on a mismatch"""
+        command = f"verify_hash {chip} {start} {length} {digest}"
+        self.run(command + (f" {algo}" if algo else ""))
+
+    def diff_sectors(self, chip, image, start=0, sector=4096, algo='crc32'):
+        """Addresses of the sectors where the chip differs from image,
+        found by comparing per-sector digests"""
+        expected = dict(zip(*sector_digests(image, start, sector, algo)))
+        differ = []
+
+        def compare(base, chip_digest):
+            if expected.get(base) != chip_digest:
+                differ.append(base)
+        self.checksum(chip, start, len(image), algo, sector, compare)
+        return differ
+
+    def erase(self, chip, start=None, length=None):
+        if start is None:
+            return self.run(f"erase {chip}")
+        return self.run(f"erase {chip} {start} {length}")
+
+    def _send(self, command, chip, image, start, window, progress):
+        job = self.submit(f"{command} {chip} {start} {len(image)}")
+        resent = upload.send(self, image, start, window, progress)
+        text = self.expect(f"END {job} ".encode(), JOB_TIMEOUT).decode(errors='replace')
+        result = self.readline()
+        if not result.startswith('OK'):
+            raise BoardError(f"{self.port}: {command} failed: {result[4:]}")
+        if f"DONE {len(image)} {zlib.crc32(image)}" not in text:
+            raise BoardError(f"{self.port}: CRC mismatch or incomplete transfer")
+        return resent
+
+    def write_image(self, chip, image, start=0, window=upload.WINDOW, progress=False):
+        """Program image at start; returns the number of resent frames"""
+        return self._send('write', chip, image, start, window, progress)
+
+    def verify_image(self, chip, image, start=0, window=upload.WINDOW, progress=False):
+        """Compare the chip with image on the board; raises BoardError on a mismatch"""
+        return self._send('verify', chip, image, start, window, progress)
+
+    def read_image(self, chip, start, length, progress=False):
+        """length bytes at start; damaged frames are read again"""
+        image = bytearray(length)
+        bad = [(0, length)]
+        for attempt in range(dump.RETRIES + 1):
+            if not bad:
+                break
+            still_bad = []
+            for b_start, b_end in bad:
+                part = bytearray(b_end - b_start)
+                job = self.submit(f"read {chip} {start + b_start} {len(part)}")
+                part_bad, part_crc = dump.receive_frames(self, start + b_start, len(part), part, progress)
+                self.wait(job)
+                if not part_bad and zlib.crc32(part) != part_crc:
+                    part_bad = [(0, len(part))]
+                image[b_start:b_end] = part
+                still_bad += [(b_start + s, b_start + e) for s, e in part_bad]
+            bad = still_bad
+        if bad:
+            raise BoardError(f"{self.port}: ranges still bad: {bad}")
+        return bytes(image)
+
+
+def digest(data, algo='crc32'):
+    """Host-side digest in the format of chip_hash.checksum()"""
+    if algo == 'crc32':
+        return f"{zlib.crc32(data):08x}"
+    return hashlib.new(algo, data).hexdigest()
+
+
+def sector_digests(image, start, sector, algo='crc32'):
+    """(sector addresses, digests) of image at start, split at sector
+    boundaries like chip_hash.checksum(..., sector)"""
+    bases = []
+    digests = []
+    pos = 0
+    while pos < len(image):
+        addr = start + pos
+        n = min(sector - addr % sector, len(image) - pos)
+        bases.append(addr - addr % sector)
+        digests.append(digest(image[pos:pos + n], algo))
+        pos += n
+    return bases, digests
+
+
+def launch(port, baudrate=115200):
+    """Start job_server.run() on a board sitting at the REPL. The raw REPL
+    session stays open underneath the server until it is stopped."""
+    board = Board(port, baudrate)
+    board.enter_raw()
+    board.start("import job_server; job_server.run()")
+    board.expect(b'Job server ready')
+    board.serial.close()
+    time.sleep(0.1)
@@ -0,0 +1,126 @@
+import argparse
+import struct
+import sys
+import time
+import zlib
+
+from host.board import Board, BoardError
+
+# Binary chip dump through flashRead_<chip>.dump_binary() (see binary_dump.py):
+#
+#   python -m host.dump /dev/ttyACM0 w25 0 0x1000000 w25.bin
+#
+# Every frame is checked against its CRC32; ranges that arrive damaged or not
+# at all are requested again (up to RETRIES times), and the end frame's CRC
+# of the whole dump is checked for single-pass dumps.
+
+MARKER = b'BINARY DUMP\n'
+MAGIC = b'FD'
+HEADER = struct.Struct('<2sIHI')  # magic, offset, length, crc32
+RETRIES = 3
+
+READERS = {'at28': 'flashRead_at28', 'at24': 'flashRead_at24', 'w25': 'flashRead_w25'}
+
+
+def print_progress(done, total, rate):
+    print(f"\r{done}/{total} ({rate:.0f} KB/s)", end='', file=sys.stderr)
+    if done == total:
+        print(file=sys.stderr)
+
+
+def receive_frames(board, start, length, image, progress=True):
+    """Receive one dump into image (a bytearray for start..start+length).
+    progress is True (print), False or progress(done, total, kb_per_s).
+    Returns (list of bad (start, end) ranges, whole-dump CRC from the board)."""
+    if progress is True:
+        progress = print_progress
+    board.expect(MARKER, timeout=30)
+    good = []
+    t0 = time.monotonic()
+    received = 0
+    while True:
+        magic, offset, n, crc = HEADER.unpack(board.read_exact(HEADER.size))
+        if magic != MAGIC:
+            raise BoardError(f"{board.port}: lost frame sync at {received} bytes")
+        if n == 0:
+            total_crc = crc
+            break
+        data = board.read_exact(n)
+        received += n
+        pos = offset - start
+        if 0 <= pos and pos + n <= length and zlib.crc32(data) == crc:
+            image[pos:pos + n] = data
+            good.append((pos, pos + n))
+        if progress:
+            elapsed = time.monotonic() - t0
+            rate = received / elapsed / 1024 if elapsed else 0
+            progress(received, length, rate)
+    return missing(good, length), total_crc
+
+
+def read_frames(board, start, length, image, progress=True):
+    """receive_frames() for a dump_binary() call run through the raw REPL"""
+    result = receive_frames(board, start, length, image, progress)
+    board.finish(timeout=10)
+    return result
+
+
+def missing(good, length):
+    """Ranges of [0, length) not covered by good"""
+    bad = []
+    pos = 0
+    for g_start, g_end in sorted(good):
+        if g_start > pos:
+            bad.append((pos, g_start))
+        pos = max(pos, g_end)
+    if pos < length:
+        bad.append((pos, length))
+    return bad
+
+
+def dump(port, chip, start, length, progress=True):
+    """Dump length bytes at start from chip ('at28', 'at24' or 'w25')"""
+    module = READERS[chip]
+    image = bytearray(length)
+    t0 = time.monotonic()
+    with Board(port) as board:
+        board.start(f"import {module}; {module}.dump_binary({start}, {length})")
+        bad, total_crc = read_frames(board, start, length, image, progress)
+        if not bad and zlib.crc32(image) != total_crc:
+            raise SystemExit(f"Whole-dump CRC mismatch ({zlib.crc32(image):08X} != {total_crc:08X})")
+        for attempt in range(RETRIES):
+            if not bad:
+                break
+            print(f"Retry {attempt + 1}: {len(bad)} bad range(s)", file=sys.stderr)
+            still_bad = []
+            for b_start, b_end in bad:
+                part = bytearray(b_end - b_start)
+                board.start(f"{module}.dump_binary({start + b_start}, {b_end - b_start})")
+                part_bad, part_crc = read_frames(board, start + b_start, len(part), part, False)
+                image[b_start:b_end] = part
+                if not part_bad and zlib.crc32(part) != part_crc:
+                    part_bad = [(0, len(part))]
+                still_bad += [(b_start + s, b_start + e) for s, e in part_bad]
+            bad = still_bad
+    if bad:
+        raise SystemExit(f"Giving up, ranges still bad: {[(start + s, start + e) for s, e in bad]}")
+    elapsed = time.monotonic() - t0
+    print(f"{length} bytes in {elapsed:.1f} s ({length / elapsed / 1024:.1f} KB/s), CRC32 {zlib.crc32(image):08X}")
+    return bytes(image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary dump of a chip over USB")
+    parser.add_argument('port')
+    parser.add_argument('chip', choices=sorted(READERS))
+    parser.add_argument('start', type=lambda s: int(s, 0))
+    parser.add_argument('length', type=lambda s: int(s, 0))
+    parser.add_argument('out')
+    args = parser.parse_args()
+    image = dump(args.port, args.chip, args.start, args.length)
+    with open(args.out, 'wb') as f:
+        f.write(image)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import io
+import multiprocessing
+import os
+import pty
+import time
+import tty
+
+import binary_dump
+import binary_upload
+import chip_hash
+
+# Stand-in for a programmer board running job_server.py on a pseudo
+# terminal: same commands and replies, same frames (the board's own
+# binary_dump/binary_upload modules), with chips held in memory. For
+# trying the host tools without hardware:
+#
+#   python -m host.fake_board --boards 3           # prints the ports
+#   python -m host.fleet w25 rom.bin --port /dev/pts/4 --port /dev/pts/5
+#
+# or from Python: board = FakeBoard(); with Programmer(board.port) as p: ...
+# Each board runs in its own process, as the frame buffers of the board
+# modules are module globals.
+
+SIZES = {'at28': 2048, 'at24': 32768, 'w25': 16 * 1024 * 1024}
+PAGE = 256
+
+
+class FakeBoard:
+    def __init__(self, sizes=None, page_us=0):
+        """page_us is the simulated programming time per 256 bytes"""
+        self.chips = {chip: bytearray(b'\xff' * size) for chip, size in (sizes or SIZES).items()}
+        self.page_us = page_us
+        self.next_id = 1
+        master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave  # held open so the pty stays up between clients
+        self.io = io.FileIO(master, 'r+b')
+        self.process = multiprocessing.get_context('fork').Process(target=self._serve, daemon=True)
+        self.process.start()
+        self.io.close()
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
+        os.close(self._slave)
+
+    def _print(self, text):
+        self.io.write(text.encode() + b'\n')
+
+    def _readline(self):
+        line = b''
+        while not line.endswith(b'\n'):
+            c = self.io.read(1)
+            if not c:
+                raise EOFError
+            line += c
+        return line.decode(errors='replace')
+
+    def _serve(self):
+        try:
+            while True:
+                self._command(self._readline().split())
+        except (EOFError, OSError):
+            pass  # pty closed
+
+    def _command(self, words):
+        if not words:
+            return
+        if words[0] == 'status':
+            self._print(f"STATUS queued=0 running=- drivers={','.join(sorted(self.chips))}")
+            return
+        if words[0] == 'reset':
+            self._print("RESET")
+            return
+        job = getattr(self, 'job_' + words[0], None)
+        if job is None or len(words) < 2 or words[1] not in self.chips:
+            self._print(f"ERR Unknown command {' '.join(words)}")
+            return
+        id = self.next_id
+        self.next_id += 1
+        self._print(f"QUEUED {id}")
+        self._print(f"BEGIN {id}")
+        try:
+            mem = self.chips[words[1]]
+            args = [int(w, 0) for w in words[2:4]] + words[4:]
+            if len(args) >= 2 and args[0] + args[1] > len(mem):
+                raise ValueError(f"Range ends past the {len(mem)}-byte chip")
+            result = job(mem, *args)
+            self._print(f"END {id} OK" + (f" {result}" if result else ""))
+        except (ValueError, TypeError, OSError) as e:
+            self._print(f"END {id} ERR {e}")
+
+    @staticmethod
+    def _read_stream(mem):
+        def read_stream(start, length, callback):
+            for addr in range(start, start + length, 4096):
+                callback(addr, memoryview(mem)[addr:min(addr + 4096, start + length)])
+        return read_stream
+
+    def job_read(self, mem, start, length):
+        binary_dump.dump(self._read_stream(mem), start, length, self.io)
+
+    def job_write(self, mem, start, length):
+        def sink(addr, data):
+            mem[addr:addr + len(data)] = data
+            time.sleep(self.page_us * len(data) / PAGE / 1e6)
+        binary_upload.receive(sink, start, length, self.io, self.io)
+
+    def job_verify(self, mem, start, length):
+        bad = []
+
+        def compare(addr, data):
+            if bytes(mem[addr:addr + len(data)]) != bytes(data):
+                bad.append(addr)
+        binary_upload.receive(compare, start, length, self.io, self.io)
+        if bad:
+            raise ValueError(f"Mismatch in {len(bad)} chunk(s), first at {bad[0]:06X}")
+
+    def job_erase(self, mem, start=0, length=None):
+        if length is None:
+            length = len(mem) - start
+        mem[start:start + length] = b'\xff' * length
+
+    def job_checksum(self, mem, start, length, algo='crc32', sector=None):
+        if sector is None:
+            return chip_hash.checksum(self._read_stream(mem), start, length, algo)
+        digest, _ = chip_hash.checksum(self._read_stream(mem), start, length, algo, int(sector, 0),
+                                       lambda base, d: self._print(f"SECTOR {base:x} {d}"))
+        return digest
+
+    def job_verify_hash(self, mem, start, length, digest, algo=None):
+        if not chip_hash.verify(self._read_stream(mem), digest, start, length, algo):
+            raise ValueError("Hash mismatch")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake job-server boards on pseudo terminals")
+    parser.add_argument('--boards', type=int, default=1)
+    parser.add_argument('--page-us', type=int, default=0, help="simulated program time per 256 bytes")
+    args = parser.parse_args()
+    boards = [FakeBoard(page_us=args.page_us) for _ in range(args.boards)]
+    for board in boards:
+        print(board.port, flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import argparse
+import hashlib
+import sys
+import threading
+import time
+
+from host.board import BoardError
+from host.client import Programmer, launch
+
+# Program the same image on every attached programmer board at once, one
+# thread per serial port, each board running job_server.py:
+#
+#   python -m host.fleet w25 rom.bin --start 0x10000            # all boards found
+#   python -m host.fleet at24 eeprom.bin --port /dev/ttyACM0 --port /dev/ttyACM1
+#
+# Every board writes the image and then checks it by SHA-256 on the board;
+# a per-board progress line is refreshed while they run, and a throughput
+# report follows.
+
+MICROPYTHON_VID = 0xF055
+REPORT_S = 0.5
+
+
+def candidate_ports():
+    """Serial ports that look like MicroPython boards (all USB ACM ports if
+    none carries the MicroPython vendor id)"""
+    from serial.tools import list_ports
+    ports = list(list_ports.comports())
+    found = [p.device for p in ports if p.vid == MICROPYTHON_VID]
+    if not found:
+        found = [p.device for p in ports if 'ACM' in p.device or 'usbmodem' in p.device]
+    return sorted(found)
+
+
+def probe(port, timeout=2, start=False):
+    """True if a job server answers on port; with start, boards sitting at
+    the REPL get the server started first"""
+    try:
+        with Programmer(port, timeout=timeout):
+            return True
+    except (BoardError, OSError, ValueError):
+        pass
+    if not start:
+        return False
+    try:
+        launch(port)
+        with Programmer(port, timeout=timeout):
+            return True
+    except (BoardError, OSError, ValueError):
+        return False
+
+
+def discover(ports=None, timeout=2, start=False):
+    """Ports (default: candidate_ports()) with a job server, probed in parallel"""
+    if ports is None:
+        ports = candidate_ports()
+    found = {}
+    threads = [threading.Thread(target=lambda p=p: found.__setitem__(p, probe(p, timeout, start)))
+               for p in ports]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return [p for p in ports if found.get(p)]
+
+
+class Job:
+    """One board's share of a dispatch"""
+
+    def __init__(self, port):
+        self.port = port
+        self.done = 0
+        self.state = 'waiting'
+        self.error = None
+        self.seconds = 0
+        self.resent = 0
+
+    def progress(self, done, total, rate):
+        self.done = done
+
+
+def _program(job, chip, image, start, verify):
+    t0 = time.monotonic()
+    try:
+        with Programmer(job.port) as p:
+            job.state = 'writing'
+            job.resent = p.write_image(chip, image, start, progress=job.progress)
+            if verify:
+                job.state = 'verifying'
+                p.verify_hash(chip, start, len(image), hashlib.sha256(image).hexdigest(), 'sha256')
+        job.state = 'ok'
+    except Exception as e:  # reported per board; the other boards carry on
+        job.state = 'failed'
+        job.error = str(e)
+    job.seconds = time.monotonic() - t0
+
+
+def _line(jobs, total):
+    parts = []
+    for job in jobs:
+        name = job.port.rsplit('/', 1)[-1]
+        parts.append(f"{name} {job.done * 100 // total if total else 100:3d}% {job.state}")
+    return ' | '.join(parts)
+
+
+def program_all(ports, chip, image, start=0, verify=True, progress=True):
+    """Write image on chip of every board in ports in parallel; returns the
+    Job of each board"""
+    jobs = [Job(port) for port in ports]
+    threads = [threading.Thread(target=_program, args=(job, chip, image, start, verify))
+               for job in jobs]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    while True:
+        alive = [t for t in threads if t.is_alive()]
+        if not alive:
+            break
+        if progress:
+            print(f"\r{_line(jobs, len(image))}", end='', file=sys.stderr)
+        alive[0].join(REPORT_S)
+    elapsed = time.monotonic() - t0
+    if progress:
+        print(f"\r{_line(jobs, len(image))}", file=sys.stderr)
+        report(jobs, len(image), elapsed)
+    return jobs
+
+
+def report(jobs, size, elapsed):
+    for job in jobs:
+        rate = size / job.seconds / 1024 if job.seconds else 0
+        line = f"{job.port}: {job.state}, {job.seconds:.1f} s, {rate:.1f} KB/s"
+        if job.resent:
+            line += f", {job.resent} frame(s) resent"
+        if job.error:
+            line += f" ({job.error})"
+        print(line)
+    ok = sum(1 for job in jobs if job.state == 'ok')
+    total = ok * size
+    print(f"{ok}/{len(jobs)} board(s) ok, {total} bytes in {elapsed:.1f} s "
+          f"({total / elapsed / 1024 if elapsed else 0:.1f} KB/s aggregate)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Program an image on every attached board")
+    parser.add_argument('chip', choices=['at24', 'at28', 'w25'])
+    parser.add_argument('image')
+    parser.add_argument('--start', type=lambda s: int(s, 0), default=0)
+    parser.add_argument('--port', action='append', help="board port (repeatable); default: discover")
+    parser.add_argument('--launch', action='store_true', help="start the job server on boards at the REPL")
+    parser.add_argument('--no-verify', dest='verify', action='store_false')
+    args = parser.parse_args()
+    with open(args.image, 'rb') as f:
+        image = f.read()
+    ports = discover(args.port, start=args.launch)
+    if not ports:
+        raise SystemExit("No programmer boards found")
+    print(f"Programming {len(image)} bytes on {len(ports)} board(s): {' '.join(ports)}")
+    jobs = program_all(ports, args.chip, image, args.start, args.verify)
+    if any(job.state != 'ok' for job in jobs):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import argparse
+import struct
+import sys
+import time
+import zlib
+
+from host.board import Board, BoardError
+
+# Binary image upload through flashWrite_<chip>.upload() (see
+# binary_upload.py): frames with a CRC32 each, up to WINDOW of them in
+# flight, go-back-N retransmit on a NAK or when acknowledgements stop.
+#
+#   python -m host.upload /dev/ttyACM0 w25 rom.bin --start 0x10000
+
+MAGIC = b'FU'
+HEADER = struct.Struct('<2sHIHI')  # magic, seq, offset, length, crc32
+WINDOW = 8
+RESEND_S = 3  # no acknowledgement for this long: resend from the oldest frame
+
+WRITERS = {'at28': 'flashWrite_at28', 'at24': 'flashWrite_at24', 'w25': 'flashWrite_w25'}
+
+
+def frames(image, start, payload):
+    """(offset, data) pieces of at most payload bytes, aligned to payload"""
+    out = []
+    pos = 0
+    while pos < len(image):
+        addr = start + pos
+        n = min(payload - addr % payload, len(image) - pos)
+        out.append((addr, image[pos:pos + n]))
+        pos += n
+    return out
+
+
+def pack(seq, offset, data):
+    header = bytearray(HEADER.pack(MAGIC, seq & 0xFFFF, offset, len(data), 0))
+    crc = zlib.crc32(data, zlib.crc32(header[2:10]))
+    struct.pack_into('<I', header, 10, crc)
+    return bytes(header) + data
+
+
+def _reply(board):
+    first = board.read(1)
+    if not first:
+        return None, None
+    if first not in b'AN':
+        # Not a protocol reply: the board printed something (a traceback)
+        raise BoardError(f"{board.port}: unexpected output {first + board.read(200)!r}")
+    rest = board.read_exact(2)
+    return first, rest[0] | (rest[1] << 8)
+
+
+def print_progress(done, total, rate):
+    print(f"\r{done}/{total} ({rate:.1f} KB/s)", end='', file=sys.stderr)
+    if done == total:
+        print(file=sys.stderr)
+
+
+def send(board, image, start, window=WINDOW, progress=True):
+    """Run the sending side after upload() was started on the board.
+    progress is True (print), False or progress(done, total, kb_per_s).
+    Returns the number of retransmitted frames."""
+    if progress is True:
+        progress = print_progress
+    board.expect(b'READY ', timeout=600)  # W25 erases before this
+    payload = int(board.read_until(b'\n'))
+    pieces = frames(image, start, payload)
+    base = 0
+    next_seq = 0
+    resent = 0
+    saved_timeout = board.serial.timeout
+    board.serial.timeout = RESEND_S
+    t0 = time.monotonic()
+    try:
+        while base < len(pieces):
+            while next_seq < len(pieces) and next_seq < base + window:
+                board.write(pack(next_seq, *pieces[next_seq]))
+                next_seq += 1
+            kind, seq = _reply(board)
+            if kind is None:
+                resent += next_seq - base
+                next_seq = base
+                continue
+            # Replies carry the low 16 bits of the sequence number
+            delta = (seq - base) & 0xFFFF
+            if delta >= 0x8000:
+                continue  # about a frame already acknowledged
+            full = base + delta
+            if kind == b'A':
+                base = max(base, full + 1)
+            else:
+                resent += next_seq - full
+                base = max(base, full)
+                next_seq = base
+            if progress:
+                done = sum(len(data) for _, data in pieces[:base])
+                elapsed = time.monotonic() - t0
+                rate = done / elapsed / 1024 if elapsed else 0
+                progress(done, len(image), rate)
+    finally:
+        board.serial.timeout = saved_timeout
+    return resent
+
+
+def upload(port, chip, image, start=0, window=WINDOW, progress=True):
+    """Write image at start on chip ('at28', 'at24' or 'w25')"""
+    module = WRITERS[chip]
+    t0 = time.monotonic()
+    with Board(port) as board:
+        board.start(f"import {module}; {module}.upload({start}, {len(image)})")
+        resent = send(board, image, start, window, progress)
+        out, _ = board.finish(timeout=60)
+    elapsed = time.monotonic() - t0
+    text = out.decode(errors='replace')
+    if f"DONE {len(image)} {zlib.crc32(image)}" not in text:
+        raise SystemExit(f"CRC mismatch or incomplete upload:\n{text}")
+    print(f"{len(image)} bytes in {elapsed:.1f} s ({len(image) / elapsed / 1024:.1f} KB/s), "
+          f"{resent} frame(s) resent")
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload an image to a chip over USB")
+    parser.add_argument('port')
+    parser.add_argument('chip', choices=sorted(WRITERS))
+    parser.add_argument('image')
+    parser.add_argument('--start', type=lambda s: int(s, 0), default=0)
+    parser.add_argument('--window', type=int, default=WINDOW)
+    args = parser.parse_args()
+    with open(args.image, 'rb') as f:
+        image = f.read()
+    upload(args.port, args.chip, image, args.start, args.window)
+
+
+if __name__ == '__main__':
+    main()
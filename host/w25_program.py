@@ -0,0 +1,51 @@
+import argparse
+import sys
+import time
+import zlib
+
+from host.board import Board
+
+# Stream an image into the W25 through w25_pipeline.program_stream():
+#
+#   python -m host.w25_program /dev/ttyACM0 image.bin --start 0x10000
+
+CHUNK = 4096
+
+
+def program(port, image, start=0, erase=True, progress=True):
+    with Board(port) as board:
+        board.start(f"import w25_pipeline; w25_pipeline.program_stream({start}, {len(image)}, {erase})")
+        # Erasing comes first and can take a while on large images
+        board.expect(b'READY', timeout=600)
+        board.read_until(b'\n')
+        t0 = time.monotonic()
+        for offset in range(0, len(image), CHUNK):
+            board.write(image[offset:offset + CHUNK])
+            if progress:
+                print(f"\r{offset + min(CHUNK, len(image) - offset)}/{len(image)}", end='', file=sys.stderr)
+        out, _ = board.finish(timeout=60)
+        elapsed = time.monotonic() - t0
+    if progress:
+        print(file=sys.stderr)
+    text = out.decode(errors='replace')
+    expected = f"DONE {len(image)} {zlib.crc32(image)}"
+    if expected not in text:
+        raise SystemExit(f"CRC mismatch or incomplete transfer:\n{text}")
+    print(f"{len(image)} bytes in {elapsed:.1f} s ({len(image) / elapsed / 1024:.1f} KB/s)")
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Program a W25 image over USB")
+    parser.add_argument('port')
+    parser.add_argument('image')
+    parser.add_argument('--start', type=lambda s: int(s, 0), default=0)
+    parser.add_argument('--no-erase', dest='erase', action='store_false')
+    args = parser.parse_args()
+    with open(args.image, 'rb') as f:
+        image = f.read()
+    print(program(args.port, image, args.start, args.erase))
+
+
+if __name__ == '__main__':
+    main()
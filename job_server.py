@@ -0,0 +1,246 @@
+import sys
+import binary_upload
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# Resident job server on the USB VCP. Drivers are imported and initialized
+# once (SPI/I2C setup, SFDP and AT24 probing) and kept between jobs, so
+# back-to-back operations start without the mpremote/import/probe overhead.
+#
+#   import job_server; job_server.run()    (or JOB_SERVER = True in boot.py)
+#
+# One command per line, chip is at28, at24 or w25:
+#
+#   read <chip> <start> <length>        binary frames (binary_dump.py)
+#   write <chip> <start> <length>       upload frames (binary_upload.py)
+#   verify <chip> <start> <length>      upload frames, compared instead of written
+#   erase <chip> [<start> <length>]     whole chip without a range
+#   checksum <chip> <start> <length> [crc32|sha256 [<sector size>]]
+#                                       with a sector size, "SECTOR <base> <digest>"
+#                                       lines before the END line
+#   verify_hash <chip> <start> <length> <hex digest> [crc32|sha256]
+#   status                              queue length and initialized drivers
+#   reset                               re-initialize drivers on the next job
+#
+# Queued commands are answered "QUEUED <id>", then "BEGIN <id>" when they
+# start and "END <id> OK [result]" or "END <id> ERR <message>". The drivers
+# are synchronous, so a job holds the board until it ends: commands sent
+# meanwhile (status too) wait in the USB buffer and are read between jobs.
+# write and verify take their data from the same line, so no further commands
+# are read until they end. Ctrl-C stops the server and returns to the REPL.
+
+# chip -> (reader module, writer module, bus init function)
+CHIPS = {
+    'at28': ('flashRead_at28', 'flashWrite_at28', None),
+    'at24': ('flashRead_at24', 'flashWrite_at24', 'init_i2c'),
+    'w25': ('flashRead_w25', 'flashWrite_w25', 'init_spi'),
+}
+
+# Erase value per chip, as the writers' full erase() leaves it (AT28: 0x00)
+FILL = {'at28': bytes(256), 'at24': b'\xff' * 256}
+
+_modules = {}
+_owners = {}  # bus init function -> module that last initialized the bus
+
+
+def _driver(name, init):
+    module = _modules.get(name)
+    if module is None:
+        module = __import__(name)
+        _modules[name] = module
+    # Reader and writer share a bus; whichever used it last set it up
+    if init and _owners.get(init) is not module:
+        module.KEEP_INIT = False
+        getattr(module, init)()
+        module.KEEP_INIT = True
+        _owners[init] = module
+    return module
+
+
+def reader(chip):
+    name, _, init = CHIPS[chip]
+    return _driver(name, init)
+
+
+def writer(chip):
+    _, name, init = CHIPS[chip]
+    return _driver(name, init)
+
+
+def reset():
+    """Initialize every bus again on its next use (e.g. after a chip swap)"""
+    _owners.clear()
+    if 'flashWrite_at24' in _modules or 'flashRead_at24' in _modules:
+        import at24_geometry
+        import at24_speed
+        at24_geometry.forget()
+        at24_speed.forget()
+
+
+def job_read(chip, start, length):
+    reader(chip).dump_binary(start, length)
+
+
+def job_write(chip, start, length):
+    writer(chip).upload(start, length)
+
+
+def job_verify(chip, start, length):
+    read_stream = reader(chip).read_stream
+    bad = []
+
+    def compare(addr, data):
+        def check(a, chunk):
+            k = a - addr
+            if bytes(chunk) != bytes(data[k:k + len(chunk)]):
+                bad.append(a)
+        read_stream(addr, len(data), check)
+
+    binary_upload.receive(compare, start, length)
+    if bad:
+        raise ValueError(f"Mismatch in {len(bad)} chunk(s), first at {bad[0]:06X}")
+
+
+def job_erase(chip, start=None, length=None):
+    module = writer(chip)
+    if start is None:
+        module.erase()
+    elif chip == 'w25':
+        module.erase_ranges([(start, start + length)])
+    else:
+        fill = FILL[chip]
+        for addr in range(start, start + length, len(fill)):
+            n = min(len(fill), start + length - addr)
+            if chip == 'at28':
+                module.write_image(fill[:n], addr)
+            else:
+                module.write_bytes(addr, fill[:n])
+
+
+def _print_sector(base, digest):
+    print(f"SECTOR {base:x} {digest}")
+
+
+def job_checksum(chip, start, length, algo='crc32', sector=None):
+    # Result: the digest; per-sector digests go out one line each as they
+    # are computed, so a 16 MB chip's list is never built
+    if sector is None:
+        return reader(chip).checksum(start, length, algo)
+    digest, _ = reader(chip).checksum(start, length, algo, int(sector, 0), _print_sector)
+    return digest
+
+
+def job_verify_hash(chip, start, length, digest, algo=None):
+    if not reader(chip).verify(digest, start, length, algo):
+        raise ValueError("Hash mismatch")
+
+
+JOBS = {
+    'read': job_read,
+    'write': job_write,
+    'verify': job_verify,
+    'erase': job_erase,
+    'checksum': job_checksum,
+    'verify_hash': job_verify_hash,
+}
+
+# Jobs that read their data from the command stream
+STREAMING = ('write', 'verify')
+
+
+class Job:
+    def __init__(self, id, name, args):
+        self.id = id
+        self.name = name
+        self.args = args
+        self.done = asyncio.Event()
+
+
+_queue = []
+_running = [None]
+
+
+def _status():
+    running = _running[0]
+    drivers = ','.join(sorted(m.__name__ for m in _owners.values())) or '-'
+    return (f"STATUS queued={len(_queue)} running={running.id if running else '-'} "
+            f"drivers={drivers}")
+
+
+def _parse(words):
+    name = words[0]
+    if name not in JOBS:
+        raise ValueError(f"Unknown command {name}")
+    if len(words) < 2 or words[1] not in CHIPS:
+        raise ValueError(f"Expected a chip: {' '.join(sorted(CHIPS))}")
+    # start and length are numbers, further arguments are left to the job
+    return [words[1]] + [int(w, 0) for w in words[2:4]] + words[4:]
+
+
+async def _commands(wake):
+    stream = asyncio.StreamReader(sys.stdin)
+    next_id = 1
+    while True:
+        line = await stream.readline()
+        if isinstance(line, bytes):
+            line = line.decode()
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == 'status':
+            print(_status())
+            continue
+        if words[0] == 'reset':
+            reset()
+            print("RESET")
+            continue
+        try:
+            args = _parse(words)
+        except ValueError as e:
+            print(f"ERR {e}")
+            continue
+        job = Job(next_id, words[0], args)
+        next_id += 1
+        _queue.append(job)
+        print(f"QUEUED {job.id}")
+        wake.set()
+        if job.name in STREAMING:
+            await job.done.wait()
+
+
+async def _worker(wake):
+    while True:
+        if not _queue:
+            wake.clear()
+            await wake.wait()
+            continue
+        job = _queue.pop(0)
+        _running[0] = job
+        print(f"BEGIN {job.id}")
+        try:
+            result = JOBS[job.name](*job.args)
+            print(f"END {job.id} OK" + (f" {result}" if result else ""))
+        except Exception as e:
+            print(f"END {job.id} ERR {e}")
+        _running[0] = None
+        job.done.set()
+        await asyncio.sleep(0)
+
+
+async def _main():
+    wake = asyncio.Event()
+    asyncio.create_task(_worker(wake))
+    await _commands(wake)
+
+
+def run():
+    print("Job server ready (Ctrl-C for the REPL)")
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        print("Job server stopped")
+    finally:
+        asyncio.new_event_loop()  # clear the loop state for the next run()
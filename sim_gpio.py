@@ -0,0 +1,232 @@
+import time
+
+import at28_bus
+
+# Simulated STM32 GPIO ports, addressed like machine.mem32 so PortBus can run
+# unchanged on a Linux host:
+#
+#   gpio = sim_gpio.SimGPIO()
+#   gpio.set_output(addr_names + ['A2', 'A4', 'A5'])
+#   bus = at28_bus.PortBus(addr_names, io_names, 'A2', 'A4', 'A5', mem=gpio)
+#   bus.set_address(0x5A5)
+#   gpio.pin('A7')  # -> level driven on A7 (address bit A8)
+
+
+class SimGPIO:
+    """Register-level model of GPIO ports A.. (MODER, IDR, ODR, BSRR).
+
+    Time is virtual: now_ns advances by access_ns on every register access
+    and by sleep_us(); install() puts the firmware's delays and tick
+    counters on that clock.
+    """
+
+    def __init__(self, ports=3, access_ns=40):
+        self.access_ns = access_ns
+        self.now_ns = 0
+        self.moder = [0] * ports
+        self.odr = [0] * ports
+        # Levels driven onto input pins from outside (e.g. a simulated chip)
+        self.external = [0] * ports
+        self.devices = []
+        self.reads = 0
+        self.writes = 0
+
+    def sleep_us(self, us):
+        self.now_ns += us * 1000
+
+    def install(self, patch=setattr):
+        """Run at28_bus delays and the MicroPython time.ticks_*/sleep_*
+        functions on the virtual clock (host only). patch(module, name,
+        value) does the replacing; tests pass one that is undone afterwards
+        (monkeypatch.setattr)."""
+        patch(at28_bus, 'sleep_us', self.sleep_us)
+        patch(time, 'sleep_us', self.sleep_us)
+        patch(time, 'sleep_ms', lambda ms: self.sleep_us(ms * 1000))
+        patch(time, 'ticks_us', lambda: self.now_ns // 1000)
+        patch(time, 'ticks_ms', lambda: self.now_ns // 1000000)
+        patch(time, 'ticks_add', lambda ticks, delta: ticks + delta)
+        patch(time, 'ticks_diff', lambda a, b: a - b)
+
+    def attach(self, device):
+        """Attach a device; device.update(gpio) runs after every register
+        write and before every IDR read"""
+        self.devices.append(device)
+
+    def _decode(self, addr):
+        offset = addr - at28_bus.GPIO_BASE
+        port, reg = divmod(offset, at28_bus.GPIO_STRIDE)
+        if offset < 0 or port >= len(self.odr):
+            raise ValueError(f"Address 0x{addr:08X} outside simulated GPIO")
+        return port, reg
+
+    def output_mask(self, port):
+        """Bit mask of pins configured as outputs"""
+        moder = self.moder[port]
+        mask = 0
+        for bit in range(16):
+            if (moder >> (2 * bit)) & 3 == 1:
+                mask |= 1 << bit
+        return mask
+
+    def _idr(self, port):
+        out = self.output_mask(port)
+        return (self.odr[port] & out) | (self.external[port] & ~out & 0xFFFF)
+
+    def __getitem__(self, addr):
+        port, reg = self._decode(addr)
+        self.reads += 1
+        self.now_ns += self.access_ns
+        if reg == at28_bus.GPIO_IDR:
+            for device in self.devices:
+                device.update(self)
+            return self._idr(port)
+        if reg == at28_bus.GPIO_ODR:
+            return self.odr[port]
+        if reg == at28_bus.GPIO_MODER:
+            return self.moder[port]
+        return 0
+
+    def __setitem__(self, addr, value):
+        port, reg = self._decode(addr)
+        value &= 0xFFFFFFFF
+        self.writes += 1
+        self.now_ns += self.access_ns
+        if reg == at28_bus.GPIO_BSRR:
+            # Set bits win over reset bits, as on the real peripheral
+            self.odr[port] = ((self.odr[port] & ~(value >> 16)) | value) & 0xFFFF
+        elif reg == at28_bus.GPIO_ODR:
+            self.odr[port] = value & 0xFFFF
+        elif reg == at28_bus.GPIO_MODER:
+            self.moder[port] = value
+        for device in self.devices:
+            device.update(self)
+
+    def set_output(self, names):
+        """Configure pins as outputs, as machine.Pin(name, Pin.OUT) would"""
+        for name in names:
+            port, bit = at28_bus.parse_pin(name)
+            moder = self.moder[port] & ~(3 << (2 * bit))
+            self.moder[port] = moder | (1 << (2 * bit))
+
+    def pin(self, name):
+        """Level currently seen on a pin"""
+        port, bit = at28_bus.parse_pin(name)
+        return (self._idr(port) >> bit) & 1
+
+    def is_output(self, name):
+        port, bit = at28_bus.parse_pin(name)
+        return (self.output_mask(port) >> bit) & 1 == 1
+
+    def drive(self, name, level):
+        """Drive an input pin from outside"""
+        port, bit = at28_bus.parse_pin(name)
+        if level:
+            self.external[port] |= 1 << bit
+        else:
+            self.external[port] &= ~(1 << bit)
+
+    def read_value(self, names):
+        """Assemble a value from pins, names[i] being bit i"""
+        value = 0
+        for i, name in enumerate(names):
+            value |= self.pin(name) << i
+        return value
+
+    def drive_value(self, names, value):
+        for i, name in enumerate(names):
+            self.drive(name, (value >> i) & 1)
+
+
+class SimAT28:
+    """AT28-style EEPROM attached to a SimGPIO.
+
+    Data is only valid access_ns after the address, CE or OE last changed
+    (earlier reads return the inverted byte), WE pulses shorter than
+    pulse_ns or with OE low are ignored, and loaded bytes are programmed write_us after
+    the last load. While the write cycle runs, reads show /DATA (bit 7
+    inverted) and bit 6 toggles on every OE cycle. page_size=1 models the
+    AT28C16.
+    """
+
+    BLC_NS = 150000  # byte load window of a page write
+
+    def __init__(self, addr_names, io_names, ce_name, oe_name, we_name,
+                 size=2048, access_ns=150, pulse_ns=100, write_us=1000, page_size=64):
+        self.addr_names = addr_names
+        self.io_names = io_names
+        self.ce_name = ce_name
+        self.oe_name = oe_name
+        self.we_name = we_name
+        self.size = size
+        self.access_ns = access_ns
+        self.pulse_ns = pulse_ns
+        self.write_ns = write_us * 1000
+        self.page_size = page_size
+        self.mem = bytearray(b'\xff' * size)
+
+        self.addr = None
+        self.ce = 1
+        self.oe = 1
+        self.we_low = False
+        self.we_fall = 0
+        self.valid_at = 0
+        self.pending = {}
+        self.last_load = 0
+        self.last_value = 0
+        self.toggle = 0
+        self.cycles = 0
+
+    def busy(self, now):
+        return bool(self.pending) and now < self.last_load + self.write_ns
+
+    def _commit(self, now):
+        if self.pending and now >= self.last_load + self.write_ns:
+            for addr, value in self.pending.items():
+                self.mem[addr] = value
+            self.pending = {}
+            self.cycles += 1
+
+    def _latch(self, addr, value, now):
+        if self.pending:
+            page = addr // self.page_size
+            first = next(iter(self.pending)) // self.page_size
+            if (self.page_size == 1 or page != first
+                    or now - self.last_load >= self.BLC_NS):
+                return  # write cycle already running, load ignored
+        self.pending[addr] = value
+        self.last_load = now
+        self.last_value = value
+
+    def update(self, gpio):
+        now = gpio.now_ns
+        self._commit(now)
+        ce = gpio.pin(self.ce_name)
+        oe = gpio.pin(self.oe_name)
+        we = gpio.pin(self.we_name)
+        addr = gpio.read_value(self.addr_names) % self.size
+
+        if addr != self.addr or (ce == 0 and self.ce) or (oe == 0 and self.oe):
+            self.valid_at = now + self.access_ns
+        if oe == 0 and self.oe and self.busy(now):
+            self.toggle ^= 1  # bit 6 toggles on every read during a write cycle
+
+        we_low = ce == 0 and we == 0 and oe == 1  # OE low inhibits writes
+        if we_low and not self.we_low:
+            self.we_fall = now
+        elif self.we_low and not we_low and now - self.we_fall >= self.pulse_ns:
+            self._latch(addr, gpio.read_value(self.io_names), now)
+        self.we_low = we_low
+
+        read = ce == 0 and oe == 0 and we == 1 and not gpio.is_output(self.io_names[0])
+        self.addr = addr
+        self.ce = ce
+        self.oe = oe
+        if not read:
+            return
+        if self.busy(now):
+            value = ((~self.last_value) & 0x80) | (self.toggle << 6)
+        elif now < self.valid_at:
+            value = ~self.mem[addr] & 0xFF
+        else:
+            value = self.mem[addr]
+        gpio.drive_value(self.io_names, value)
@@ -0,0 +1,152 @@
+import time
+
+# Simulated I2C bus with AT24-style EEPROMs, a stand-in for machine.I2C so
+# the AT24 modules can run with CPython on a host:
+#
+#   bus = sim_i2c.SimI2C()
+#   chip = bus.attach(sim_i2c.SimAT24(0x50, busy_us=3000))
+#   bus.install()
+#   flashWrite_at24.i2c = bus
+
+ENODEV = 19  # MicroPython raises OSError(ENODEV) on an address NACK
+
+
+class SimAT24:
+    """AT24 EEPROM model.
+
+    A write with data starts a write cycle of busy_us during which the part
+    NACKs its address. Page writes wrap inside the page, sequential reads
+    wrap at the end of the array. Above max_freq, data bytes get bit
+    errors in both directions. With addr_bytes=1 and more than 256 bytes
+    (AT24C04..C16), each 256-byte block answers on its own device address.
+    With write_protect (WP pin high), data bytes are acknowledged but not
+    stored and no write cycle starts.
+    """
+
+    def __init__(self, addr=0x50, size=32768, page_size=64, addr_bytes=2, busy_us=5000,
+                 max_freq=400000, write_protect=False):
+        self.addr = addr
+        self.write_protect = write_protect
+        self.max_freq = max_freq
+        self.size = size
+        self.page_size = page_size
+        self.addr_bytes = addr_bytes
+        self.busy_us = busy_us
+        self.mem = bytearray(b'\xff' * size)
+        self.pointer = 0
+        self.busy_until = 0
+        self.cycles = 0
+        self.block = 0
+
+    def addresses(self):
+        if self.addr_bytes == 1 and self.size > 256:
+            return [self.addr | b for b in range(self.size // 256)]
+        return [self.addr]
+
+    def select(self, addr):
+        self.block = (addr - self.addr) << 8 if self.addr_bytes == 1 else 0
+
+    def busy(self, now):
+        return now < self.busy_until
+
+    def write(self, buf, now):
+        n = self.addr_bytes
+        if len(buf) < n:
+            return  # address incomplete: nothing happens
+        pointer = 0
+        for b in buf[:n]:
+            pointer = (pointer << 8) | b
+        pointer = (self.block | pointer) % self.size
+        data = buf[n:]
+        if not data:
+            self.pointer = pointer  # dummy write sets the address counter
+            return
+        if self.write_protect:
+            self.pointer = (pointer + len(data)) % self.size
+            return
+        page = pointer - pointer % self.page_size
+        offset = pointer - page
+        for b in data:
+            self.mem[page + offset] = b
+            offset = (offset + 1) % self.page_size
+        self.pointer = page + offset
+        self.busy_until = now + self.busy_us
+        self.cycles += 1
+
+    def read(self, buf):
+        for i in range(len(buf)):
+            buf[i] = self.mem[self.pointer]
+            self.pointer = (self.pointer + 1) % self.size
+
+
+class SimI2C:
+    """machine.I2C stand-in; time is virtual and advances with every
+    transaction at the bus frequency (install() puts time.ticks_* and
+    sleep_* on that clock)"""
+
+    def __init__(self, freq=100000):
+        self.freq = freq
+        self.devices = {}
+        self.now_us = 0
+        self.transactions = 0
+
+    def attach(self, device):
+        for addr in device.addresses():
+            self.devices[addr] = device
+        return device
+
+    def install(self, patch=setattr):
+        # patch(module, name, value): monkeypatch.setattr in tests
+        patch(time, 'sleep_us', self.sleep_us)
+        patch(time, 'sleep_ms', lambda ms: self.sleep_us(ms * 1000))
+        patch(time, 'ticks_us', lambda: self.now_us)
+        patch(time, 'ticks_ms', lambda: self.now_us // 1000)
+        patch(time, 'ticks_add', lambda ticks, delta: ticks + delta)
+        patch(time, 'ticks_diff', lambda a, b: a - b)
+
+    def sleep_us(self, us):
+        self.now_us += us
+
+    def _transfer(self, addr, nbytes):
+        # START + address byte + data bytes, 9 clocks each, + STOP
+        self.transactions += 1
+        self.now_us += (9 * (nbytes + 1) + 2) * 1000000 // self.freq + 1
+        device = self.devices.get(addr)
+        if device is None or device.busy(self.now_us):
+            raise OSError(ENODEV)
+        device.select(addr)
+        return device
+
+    def scan(self):
+        found = []
+        for addr in range(0x08, 0x78):
+            try:
+                self._transfer(addr, 0)
+            except OSError:
+                continue
+            found.append(addr)
+        return found
+
+    @staticmethod
+    def _garble(buf, start):
+        for i in range(start, len(buf), 5):
+            buf[i] ^= 0x01
+
+    def writeto(self, addr, buf, stop=True):
+        device = self._transfer(addr, len(buf))
+        buf = bytearray(buf)
+        if self.freq > device.max_freq:
+            self._garble(buf, device.addr_bytes)
+        device.write(bytes(buf), self.now_us)
+        return len(buf)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        device = self._transfer(addr, len(buf))
+        device.read(buf)
+        if self.freq > device.max_freq:
+            self._garble(buf, 0)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        buf = bytearray(nbytes)
+        self.readfrom_into(addr, buf, stop)
+        return bytes(buf)
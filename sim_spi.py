@@ -0,0 +1,254 @@
+import time
+
+# Simulated SPI bus with a W25Q-style serial flash, a stand-in for
+# machine.SPI and the CS pin so the W25 modules can run with CPython on a
+# host:
+#
+#   bus = sim_spi.SimSPI()
+#   flash = bus.attach(sim_spi.SimW25())
+#   bus.install()
+#   flashRead_w25.spi, flashRead_w25.cs = bus, bus.cs
+
+JEDEC_ID = 0xEF4018  # W25Q128
+
+# SFDP area of a W25Q128JV (header, one parameter header, BFPT rev 1.5
+# at 0x80, 16 DWORDs)
+SFDP_W25Q128JV = (
+    bytes.fromhex('53464450 050100ff 00050110 800000ff'.replace(' ', ''))
+    + b'\xff' * (0x80 - 16)
+    + bytes.fromhex((
+        'e520f9ff ffffff07 44eb086b 083b42bb feffffff ffff0000 ffff40eb 0c200f52'
+        '10d80000 3602a600 82ea14c9 e9637633 7a757a75 f7a2d55c 19f74dff e930f880'
+    ).replace(' ', ''))
+)
+
+
+def make_sfdp(size, page_size=256, erase=((4096, 0x20), (65536, 0xD8)), addr_mode=0):
+    """SFDP area for a generic part (BFPT rev 1.0, 9 DWORDs: no typical times)"""
+    dw = [0] * 9
+    dw[0] = 0xFF0000E1 | (0x20 << 8) | (addr_mode << 17)
+    bits = size * 8
+    dw[1] = bits - 1 if bits <= 1 << 31 else 0x80000000 | (bits.bit_length() - 1)
+    dw[2:7] = [0, 0, 0xFFFFFFFE, 0xFFFF, 0xFFFF]
+    types = list(erase) + [(0, 0)] * (4 - len(erase))
+    fields = [(sz.bit_length() - 1 if sz else 0) | (op << 8) for sz, op in types]
+    dw[7] = fields[0] | (fields[1] << 16)
+    dw[8] = fields[2] | (fields[3] << 16)
+    bfpt = b''.join(bytes([w & 0xFF, (w >> 8) & 0xFF, (w >> 16) & 0xFF, (w >> 24) & 0xFF]) for w in dw)
+    header = b'SFDP' + bytes([0, 1, 0, 0xFF]) + bytes([0, 0, 1, 9, 0x80, 0, 0, 0xFF])
+    return header + b'\xff' * (0x80 - 16) + bfpt
+
+
+# Typical timings from the W25Q128JV datasheet
+PAGE_PROGRAM_US = 700
+ERASE_US = {0x20: 45000, 0x52: 120000, 0xD8: 150000, 0xC7: 40000000}
+ERASE_SIZE = {0x20: 4096, 0x52: 32768, 0xD8: 65536}
+
+
+class SimW25:
+    """W25Q flash model.
+
+    Programming can only clear bits and wraps inside the 256-byte page;
+    erases set whole sectors/blocks to 0xFF. Program and erase need the
+    write-enable latch, run for their typical time with BUSY set, and are
+    ignored while a previous operation is still running.
+    """
+
+    def __init__(self, size=16 * 1024 * 1024, jedec_id=JEDEC_ID, sfdp=SFDP_W25Q128JV):
+        self.size = size
+        self.jedec_id = jedec_id
+        self.sfdp = sfdp or b''
+        self.addr4 = False  # 4-byte address mode (B7h / E9h)
+        self.mem = bytearray(b'\xff' * size)
+        self.sr = [0, 0, 0]
+        self.busy_until = 0
+        self.now_us = 0
+        self.counts = {'program': 0, 'erase': 0, 'status': 0}
+        self._cmd = None
+
+    def busy(self):
+        return self.now_us < self.busy_until
+
+    def status(self, n):
+        value = self.sr[n]
+        if n == 0:
+            value = (value & ~0x01) | (1 if self.busy() else 0)
+        return value
+
+    def select(self, now_us):
+        self.now_us = now_us
+        self._cmd = bytearray()
+
+    def _address(self, cmd, n=None):
+        if n is None:
+            n = 4 if self.addr4 else 3
+        addr = 0
+        for b in cmd[1:1 + n]:
+            addr = (addr << 8) | b
+        return addr % self.size
+
+    def exchange(self, byte):
+        """One byte in both directions while CS is low"""
+        cmd = self._cmd
+        cmd.append(byte)
+        op = cmd[0]
+        n = len(cmd)
+        if op == 0x9F:
+            return (self.jedec_id >> (8 * (4 - n))) & 0xFF if 1 < n <= 4 else 0xFF
+        if op in (0x05, 0x35, 0x15):
+            if op == 0x05 and n == 2:
+                self.counts['status'] += 1
+            return self.status((0x05, 0x35, 0x15).index(op)) if n > 1 else 0xFF
+        if self.busy():
+            return 0xFF  # everything else is ignored while busy
+        if op == 0x5A:
+            if n <= 5:
+                return 0xFF
+            pos = self._address(cmd, 3) + n - 6
+            return self.sfdp[pos] if pos < len(self.sfdp) else 0xFF
+        if op in (0x03, 0x0B):
+            header = (5 if self.addr4 else 4) + (op == 0x0B)
+            if n <= header:
+                return 0xFF
+            return self.mem[(self._address(cmd) + n - header - 1) % self.size]
+        return 0xFF
+
+    def deselect(self, now_us):
+        self.now_us = now_us
+        cmd = self._cmd
+        self._cmd = None
+        if not cmd or (self.busy() and cmd[0] not in (0x05, 0x35, 0x15, 0x9F)):
+            return
+        op = cmd[0]
+        if op == 0x06:
+            self.sr[0] |= 0x02
+        elif op == 0x04:
+            self.sr[0] &= ~0x02
+        elif op == 0x99 and len(cmd) == 1:
+            self.sr[0] &= ~0x02
+            self.addr4 = False
+        elif op == 0xB7:
+            self.addr4 = True
+        elif op == 0xE9:
+            self.addr4 = False
+        elif not self.sr[0] & 0x02:
+            return  # writes below need WEL
+        elif op == 0x01 and len(cmd) >= 2:
+            self.sr[0] = cmd[1] & 0xFC
+            if len(cmd) >= 3:
+                self.sr[1] = cmd[2]
+            self._finish(10000)
+        elif op == 0x02 and len(cmd) > 4 + self.addr4:
+            addr = self._address(cmd)
+            page = addr & ~0xFF
+            offset = addr & 0xFF
+            for b in cmd[4 + self.addr4:]:
+                self.mem[page + offset] &= b
+                offset = (offset + 1) & 0xFF
+            self.counts['program'] += 1
+            self._finish(PAGE_PROGRAM_US)
+        elif op in ERASE_SIZE and len(cmd) == 4 + self.addr4:
+            size = ERASE_SIZE[op]
+            addr = self._address(cmd) & ~(size - 1)
+            self.mem[addr:addr + size] = b'\xff' * size
+            self.counts['erase'] += 1
+            self._finish(ERASE_US[op])
+        elif op in (0xC7, 0x60) and len(cmd) == 1:
+            self.mem[:] = b'\xff' * self.size
+            self.counts['erase'] += 1
+            self._finish(ERASE_US[0xC7])
+
+    def _finish(self, us):
+        self.sr[0] &= ~0x02
+        self.busy_until = self.now_us + us
+
+
+class SimCS:
+    """machine.Pin stand-in for the chip-select line"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.level = 1
+
+    def value(self, v=None):
+        if v is None:
+            return self.level
+        v = 1 if v else 0
+        if v != self.level:
+            self.level = v
+            if v:
+                self.bus.flash.deselect(self.bus.now_us)
+            else:
+                self.bus.flash.select(self.bus.now_us)
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+class SimSPI:
+    """machine.SPI stand-in; time is virtual and advances with every byte
+    at the bus baudrate (install() puts time.ticks_* and sleep_* on that
+    clock)"""
+
+    def __init__(self, baudrate=1000000):
+        self.baudrate = baudrate
+        self.flash = None
+        self.cs = SimCS(self)
+        self.now_us = 0
+        self.bytes = 0
+
+    def attach(self, flash):
+        self.flash = flash
+        return flash
+
+    def init(self, baudrate=None, **kw):
+        if baudrate:
+            self.baudrate = baudrate
+
+    def install(self, patch=setattr):
+        # patch(module, name, value): monkeypatch.setattr in tests
+        patch(time, 'sleep_us', self.sleep_us)
+        patch(time, 'sleep_ms', lambda ms: self.sleep_us(ms * 1000))
+        patch(time, 'ticks_us', lambda: self.now_us)
+        patch(time, 'ticks_ms', lambda: self.now_us // 1000)
+        patch(time, 'ticks_add', lambda ticks, delta: ticks + delta)
+        patch(time, 'ticks_diff', lambda a, b: a - b)
+
+    def sleep_us(self, us):
+        self.now_us += us
+        self.flash.now_us = self.now_us
+
+    def _clock(self, n):
+        self.bytes += n
+        self.now_us += (8 * n * 1000000 + self.baudrate - 1) // self.baudrate
+        self.flash.now_us = self.now_us
+
+    def _exchange(self, byte):
+        if self.cs.level:
+            return 0xFF  # not selected
+        return self.flash.exchange(byte)
+
+    def write(self, buf):
+        for b in buf:
+            self._exchange(b)
+        self._clock(len(buf))
+
+    def readinto(self, buf, write=0):
+        for i in range(len(buf)):
+            buf[i] = self._exchange(write)
+        self._clock(len(buf))
+
+    def read(self, nbytes, write=0):
+        buf = bytearray(nbytes)
+        self.readinto(buf, write)
+        return bytes(buf)
+
+    def write_readinto(self, write_buf, read_buf):
+        for i in range(len(write_buf)):
+            read_buf[i] = self._exchange(write_buf[i])
+        self._clock(len(write_buf))
@@ -0,0 +1,159 @@
+import functools
+import os
+import sys
+import types
+
+import pytest
+
+# Host tests: the board modules run under CPython against the simulated
+# GPIO ports, I2C bus and SPI flash (sim_gpio, sim_i2c, sim_spi). A small
+# machine module routes Pin/I2C/SPI to whichever simulation a fixture set up.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+machine = types.ModuleType('machine')
+sys.modules['machine'] = machine
+
+import at28_bus  # noqa: E402
+import sim_gpio  # noqa: E402
+import sim_i2c  # noqa: E402
+import sim_spi  # noqa: E402
+
+machine.mem32 = sim_gpio.SimGPIO()
+machine.i2c_bus = sim_i2c.SimI2C()
+machine.spi_bus = None
+
+
+class Pin:
+    OUT = 1
+    IN = 0
+
+    def __new__(cls, name, *args, **kwargs):
+        # With an SPI flash attached, A4 is its chip select
+        if name == 'A4' and machine.spi_bus is not None:
+            machine.spi_bus.cs.value(kwargs.get('value', 1))
+            return machine.spi_bus.cs
+        return object.__new__(cls)
+
+    def __init__(self, name, mode=IN, pull=None, value=None):
+        self.name = name
+        self.init(mode)
+        if value is not None:
+            self.value(value)
+
+    def init(self, mode=IN, pull=None):
+        port, bit = at28_bus.parse_pin(self.name)
+        gpio = machine.mem32
+        gpio.moder[port] = (gpio.moder[port] & ~(3 << (2 * bit))) | ((1 if mode == Pin.OUT else 0) << (2 * bit))
+
+    def value(self, v=None):
+        port, bit = at28_bus.parse_pin(self.name)
+        if v is None:
+            return (machine.mem32[at28_bus.port_base(port) + at28_bus.GPIO_IDR] >> bit) & 1
+        word = (1 << bit) if v else (1 << (bit + 16))
+        machine.mem32[at28_bus.port_base(port) + at28_bus.GPIO_BSRR] = word
+
+
+def I2C(bus_id, freq=100000, **kwargs):
+    machine.i2c_bus.freq = freq
+    return machine.i2c_bus
+
+
+def SPI(bus_id=1, baudrate=1000000, **kwargs):
+    machine.spi_bus.init(baudrate=baudrate)
+    return machine.spi_bus
+
+
+SPI.MSB = 0
+machine.Pin = Pin
+machine.I2C = I2C
+machine.SPI = SPI
+machine.SoftSPI = SPI
+
+# The OLED on the programmer board is not simulated
+ssd1306 = types.ModuleType('ssd1306')
+
+
+class SSD1306_I2C:
+    def __init__(self, *args):
+        pass
+
+    def fill(self, *args):
+        pass
+
+    def text(self, *args):
+        pass
+
+    def show(self):
+        pass
+
+
+ssd1306.SSD1306_I2C = SSD1306_I2C
+sys.modules['ssd1306'] = ssd1306
+
+import flashWrite_at28  # noqa: E402
+
+AT28_ADDR = [p[0] for p in flashWrite_at28.ADDR_PINS]
+AT28_IO = [p[0] for p in flashWrite_at28.IO_PINS]
+AT28_CONTROL = [flashWrite_at28.CE_PIN, flashWrite_at28.OE_PIN, flashWrite_at28.WE_PIN]
+
+
+@pytest.fixture
+def patch(monkeypatch):
+    """setattr for the sims' install(): undone after the test, and allowed
+    to add the MicroPython-only time functions"""
+    return functools.partial(monkeypatch.setattr, raising=False)
+
+
+@pytest.fixture
+def gpio(patch, monkeypatch):
+    """Fresh simulated GPIO ports with the AT28 address and control lines
+    as outputs, CE/OE/WE high"""
+    monkeypatch.setattr(machine, 'spi_bus', None)
+    g = sim_gpio.SimGPIO()
+    monkeypatch.setattr(machine, 'mem32', g)
+    g.install(patch)
+    g.set_output(AT28_ADDR + AT28_CONTROL)
+    for name in AT28_CONTROL:
+        port, bit = at28_bus.parse_pin(name)
+        g[at28_bus.port_base(port) + at28_bus.GPIO_BSRR] = 1 << bit
+    return g
+
+
+@pytest.fixture
+def at28(gpio):
+    """Factory: attach a SimAT28 and point both AT28 modules at it"""
+    import flashRead_at28
+
+    def make(bus='native', **kwargs):
+        chip = sim_gpio.SimAT28(AT28_ADDR, AT28_IO, *AT28_CONTROL, **kwargs)
+        gpio.attach(chip)
+        flashWrite_at28.select_bus(bus)
+        flashRead_at28.select_bus(bus)
+        return chip
+    return make
+
+
+@pytest.fixture
+def i2c(tmp_path, monkeypatch, patch):
+    """Fresh simulated I2C bus; attach SimAT24 parts to it"""
+    import at24_geometry
+    import at24_speed
+    monkeypatch.setattr(at24_speed, 'SPEED_FILE', str(tmp_path / 'at24_speed.json'))
+    monkeypatch.setattr(at24_geometry, 'GEOMETRY_FILE', str(tmp_path / 'at24_geometry.json'))
+    bus = sim_i2c.SimI2C()
+    monkeypatch.setattr(machine, 'i2c_bus', bus)
+    bus.install(patch)
+    at24_geometry.forget()
+    at24_speed.forget()
+    return bus
+
+
+@pytest.fixture
+def spi(monkeypatch, patch):
+    """Fresh simulated SPI bus; attach a SimW25 to it"""
+    bus = sim_spi.SimSPI()
+    monkeypatch.setattr(machine, 'spi_bus', bus)
+    bus.install(patch)
+    return bus
@@ -0,0 +1,25 @@
+import at24_gang
+import sim_i2c
+
+
+def test_test_pattern_on_mixed_parts(i2c, monkeypatch):
+    big = i2c.attach(sim_i2c.SimAT24(0x50, size=4096, page_size=32, busy_us=3000))
+    small = i2c.attach(sim_i2c.SimAT24(0x52, size=512, page_size=16, addr_bytes=1,
+                                       busy_us=3000))
+    monkeypatch.setattr(at24_gang, 'i2c', None)
+    at24_gang.write_00_to_ff()
+    assert sorted(at24_gang.devices) == [0x50, 0x52]
+    assert big.mem == bytes(range(256)) * 16
+    assert small.mem == bytes(range(256)) * 2
+
+
+def test_write_cycles_overlap(i2c, monkeypatch):
+    chips = [i2c.attach(sim_i2c.SimAT24(0x50 + n, size=4096, busy_us=3000)) for n in range(4)]
+    monkeypatch.setattr(at24_gang, 'i2c', None)
+    at24_gang.init()
+    image = bytes(range(256)) * 4
+    t0 = i2c.now_us
+    at24_gang.program(image, verify=False)
+    # 16 pages per chip: less than the 64 write cycles back to back
+    assert i2c.now_us - t0 < 64 * 3000
+    assert all(chip.mem[:1024] == image for chip in chips)
@@ -0,0 +1,73 @@
+import pytest
+
+import at24_geometry
+import flashRead_at24
+import flashWrite_at24
+import sim_i2c
+
+
+@pytest.mark.parametrize('size, page_size, addr_bytes', [
+    (32768, 64, 2),
+    (4096, 32, 2),
+    (256, 8, 1),
+    (512, 16, 1),
+    (2048, 16, 1),
+])
+def test_probe_finds_the_geometry_and_restores_the_data(i2c, size, page_size, addr_bytes):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, size=size, page_size=page_size,
+                                      addr_bytes=addr_bytes))
+    chip.mem[:] = bytes(i * 7 & 0xFF for i in range(size))
+    image = bytes(chip.mem)
+    geometry = at24_geometry.probe(i2c, 0x50)
+    assert (geometry.addr_bytes, geometry.size, geometry.page_size) == (addr_bytes, size, page_size)
+    assert chip.mem == image
+
+
+def test_two_24c02s_are_not_one_24c04(i2c):
+    first = i2c.attach(sim_i2c.SimAT24(0x50, size=256, page_size=8, addr_bytes=1))
+    second = i2c.attach(sim_i2c.SimAT24(0x51, size=256, page_size=8, addr_bytes=1))
+    first.mem[:] = bytes(range(256))
+    second.mem[:] = bytes(range(256))  # same contents: needs the marker write
+    assert at24_geometry.probe(i2c, 0x50).size == 256
+    assert at24_geometry.probe(i2c, 0x51).size == 256
+    assert first.mem == second.mem == bytes(range(256))
+
+
+def test_write_protected_part_is_refused(i2c):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, write_protect=True))
+    with pytest.raises(ValueError):
+        at24_geometry.probe(i2c, 0x50)
+    assert at24_geometry.known(0x50) is None
+
+
+def test_geometry_is_kept_for_the_reader(i2c, monkeypatch):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, size=4096, page_size=32))
+    monkeypatch.setattr(flashWrite_at24, 'KEEP_INIT', False)
+    flashWrite_at24.init_i2c()
+    assert chip.cycles > 0
+
+    at24_geometry._cache = None  # a fresh interpreter
+    cycles = chip.cycles
+    monkeypatch.setattr(flashRead_at24, 'KEEP_INIT', False)
+    flashRead_at24.init_i2c()
+    geometry = flashRead_at24.geometry
+    assert (geometry.addr_bytes, geometry.size, geometry.page_size) == (2, 4096, 32)
+    assert chip.cycles == cycles
+
+
+def test_reader_never_writes(i2c, monkeypatch):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, write_protect=True))
+    monkeypatch.setattr(flashRead_at24, 'KEEP_INIT', False)
+    flashRead_at24.init_i2c()
+    assert flashRead_at24.geometry is None
+    assert chip.cycles == 0
+
+
+def test_reader_follows_a_1_byte_address_part(i2c, monkeypatch):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, size=2048, page_size=16, addr_bytes=1))
+    chip.mem[:] = bytes(i * 5 & 0xFF for i in range(2048))
+    at24_geometry.define(0x50, 1, 2048, 16)
+    monkeypatch.setattr(flashRead_at24, 'KEEP_INIT', False)
+    flashRead_at24.init_i2c()
+    assert flashRead_at24.read_byte(0x3A5) == chip.mem[0x3A5]
+    assert flashRead_at24.read_bytes(0x1F0, 32) == bytes(chip.mem[0x1F0:0x210])
@@ -0,0 +1,42 @@
+import pytest
+
+import at24_geometry
+import flashRead_at24
+import sim_i2c
+
+
+@pytest.fixture
+def reader(i2c, monkeypatch):
+    def make(**kwargs):
+        chip = i2c.attach(sim_i2c.SimAT24(0x50, **kwargs))
+        chip.mem[:] = bytes((i * 7 + (i >> 8)) & 0xFF for i in range(chip.size))
+        at24_geometry.define(0x50, chip.addr_bytes, chip.size, chip.page_size)
+        monkeypatch.setattr(flashRead_at24, 'KEEP_INIT', False)
+        flashRead_at24.init_i2c()
+        return chip
+    return make
+
+
+def stream(start, length):
+    chunks = []
+    flashRead_at24.read_stream(start, length, lambda addr, data: chunks.append((addr, bytes(data))))
+    return chunks
+
+
+def test_chunks_split_at_read_chunk(reader, monkeypatch):
+    chip = reader(size=32768, page_size=64)
+    monkeypatch.setattr(flashRead_at24, 'READ_CHUNK', 100)
+    chunks = stream(0x123, 450)
+    assert [(addr, len(data)) for addr, data in chunks] == [
+        (0x123, 100), (0x187, 100), (0x1EB, 100), (0x24F, 100), (0x2B3, 50)]
+    assert b''.join(data for _, data in chunks) == chip.mem[0x123:0x123 + 450]
+
+
+def test_chunks_stay_inside_a_block(reader):
+    # 24C16: 256-byte blocks on 0x50..0x57, 1-byte word address
+    chip = reader(size=2048, page_size=16, addr_bytes=1)
+    chunks = stream(0x0F0, 0x220)
+    assert [addr for addr, _ in chunks] == [0x0F0, 0x100, 0x200, 0x300]
+    for addr, data in chunks:
+        assert addr // 256 == (addr + len(data) - 1) // 256
+    assert b''.join(data for _, data in chunks) == chip.mem[0x0F0:0x310]
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+import at24_geometry
+import at24_speed
+import sim_i2c
+
+
+@pytest.fixture
+def geometry():
+    return at24_geometry.define(0x50, 2, 32768, 64)
+
+
+def test_frequencies_stay_within_fast_mode():
+    assert max(at24_speed.FREQS) <= 400000
+    assert at24_speed.SAFE_FREQ in at24_speed.FREQS
+
+
+@pytest.mark.parametrize('max_freq', [400000, 100000])
+def test_negotiate_picks_the_fastest_clean_frequency(i2c, geometry, max_freq):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, max_freq=max_freq))
+    chip.mem[-64:] = bytes(range(64))
+    assert at24_speed.negotiate(2, 0x50, write_test=True, geometry=geometry) == max_freq
+    assert chip.mem[-64:] == bytes(range(64))  # scratch page restored
+
+
+def test_write_test_runs_once_per_part(i2c, geometry):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50))
+    bus = at24_speed.open_bus(2, 0x50, write_test=True, geometry=geometry)
+    assert bus.freq == 400000
+    cycles = chip.cycles
+    assert cycles > 0
+    with open(at24_speed.SPEED_FILE) as f:
+        assert json.load(f) == {'50': [400000, True]}
+
+    at24_speed._cache = None  # a fresh interpreter, e.g. the next mpremote exec
+    bus = at24_speed.open_bus(2, 0x50, write_test=True, geometry=geometry)
+    assert bus.freq == 400000
+    assert chip.cycles == cycles
+
+    at24_speed.forget(0x50)
+    at24_speed._cache = None
+    assert at24_speed.cached_freq(0x50) is None
+
+
+def test_read_only_check_never_writes(i2c, geometry):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, max_freq=100000))
+    assert at24_speed.open_bus(2, 0x50, geometry=geometry).freq == 100000
+    assert chip.cycles == 0
@@ -0,0 +1,59 @@
+import pytest
+
+import at24_geometry
+import flashWrite_at24
+import sim_i2c
+
+
+@pytest.fixture
+def at24(i2c, monkeypatch):
+    """A 32 KB part with 64-byte pages and a 3 ms write cycle, set up in
+    flashWrite_at24 without probing"""
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, busy_us=3000))
+    monkeypatch.setattr(flashWrite_at24, 'i2c', i2c)
+    monkeypatch.setattr(flashWrite_at24, 'geometry', at24_geometry.define(0x50, 2, 32768, 64))
+    monkeypatch.setattr(flashWrite_at24, 'PAGE_SIZE', 64)
+    flashWrite_at24.cycle_stats(reset=True)
+    return chip
+
+
+def test_part_nacks_during_the_write_cycle(i2c):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, busy_us=3000))
+    i2c.writeto(0x50, b'\x00\x10\xAB')
+    with pytest.raises(OSError):
+        i2c.writeto(0x50, b'')
+    i2c.sleep_us(3000)
+    i2c.writeto(0x50, b'')
+    assert chip.mem[0x10] == 0xAB
+
+
+def transfer_us(i2c, nbytes):
+    # Bus time of one SimI2C transaction carrying nbytes
+    return (9 * (nbytes + 1) + 2) * 1000000 // i2c.freq + 1
+
+
+def test_ack_polling_ends_with_the_write_cycle(i2c, at24):
+    flashWrite_at24.write_page(0x40, bytes(range(64)))
+    stats = flashWrite_at24.cycle_stats()
+    assert stats['count'] == 1
+    # Done within one poll of the 3 ms cycle, not after a fixed tWR wait
+    assert 3000 <= stats['max_us'] <= 3000 + 2 * transfer_us(i2c, 0)
+    assert stats['polls'] > 1
+    assert at24.mem[0x40:0x80] == bytes(range(64))
+
+
+def test_next_write_starts_right_after_the_cycle(i2c, at24):
+    t0 = i2c.now_us
+    pages = [32, 64, 64, 40]
+    flashWrite_at24.write_bytes(0x20, bytes(sum(pages)))
+    assert at24.cycles == len(pages)
+    # Each page: its transfer, the write cycle and at most one extra poll
+    budget = sum(transfer_us(i2c, 2 + n) + 3000 + transfer_us(i2c, 0) for n in pages)
+    assert i2c.now_us - t0 <= budget
+    assert at24.mem[0x20:0xE8] == bytes(200)
+
+
+def test_stuck_part_times_out(i2c, at24):
+    at24.busy_us = 1000000
+    with pytest.raises(RuntimeError):
+        flashWrite_at24.write_byte(0, 0x55)
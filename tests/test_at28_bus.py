@@ -0,0 +1,84 @@
+import random
+
+import at28_bus
+from conftest import AT28_ADDR, AT28_CONTROL, AT28_IO
+
+
+def test_bsrr_tables_set_and_reset_only_the_group():
+    names = AT28_IO
+    tables = at28_bus.bsrr_tables(names)
+    assert sorted(tables) == sorted({at28_bus.parse_pin(n)[0] for n in names})
+    for port, table in tables.items():
+        bits = {i: bit for i, (p, bit) in enumerate(map(at28_bus.parse_pin, names)) if p == port}
+        group = sum(1 << bit for bit in bits.values())
+        for value in range(1 << len(names)):
+            word = table[value]
+            set_bits = word & 0xFFFF
+            reset_bits = word >> 16
+            assert set_bits | reset_bits == group
+            assert set_bits & reset_bits == 0
+            for i, bit in bits.items():
+                assert (set_bits >> bit) & 1 == (value >> i) & 1
+
+
+def test_idr_tables_unscramble_every_value():
+    tables = at28_bus.idr_tables(AT28_IO)
+    group = {}
+    for name in AT28_IO:
+        port, bit = at28_bus.parse_pin(name)
+        group[port] = group.get(port, 0) | (1 << bit)
+    for value in range(256):
+        raw = {}
+        for i, name in enumerate(AT28_IO):
+            port, bit = at28_bus.parse_pin(name)
+            raw[port] = raw.get(port, 0) | (((value >> i) & 1) << bit)
+        decoded = 0
+        for port, shift, mask, table in tables:
+            # Every other pin of the port high: they must not leak in
+            idr = raw.get(port, 0) | (0xFFFF & ~group[port])
+            decoded |= table[(idr >> shift) & mask]
+        assert decoded == value
+
+
+def test_port_bus_drives_scrambled_address_and_data(gpio):
+    bus = at28_bus.PortBus(AT28_ADDR, AT28_IO, *AT28_CONTROL, mem=gpio)
+    for addr in range(2048):
+        bus.set_address(addr)
+        assert gpio.read_value(AT28_ADDR) == addr
+    bus.data_output()
+    assert all(gpio.is_output(name) for name in AT28_IO)
+    for value in range(256):
+        bus.write_data(value)
+        assert gpio.read_value(AT28_IO) == value
+        assert bus.read_data() == value
+    # Driving address and data leaves CE/OE/WE alone
+    assert [gpio.pin(name) for name in AT28_CONTROL] == [1, 1, 1]
+
+
+def test_port_bus_samples_external_data(gpio):
+    bus = at28_bus.PortBus(AT28_ADDR, AT28_IO, *AT28_CONTROL, mem=gpio)
+    bus.data_input()
+    assert not any(gpio.is_output(name) for name in AT28_IO)
+    for value in random.Random(1).sample(range(256), 64):
+        gpio.drive_value(AT28_IO, value)
+        assert bus.read_data() == value
+
+
+def test_port_bus_control_lines(gpio):
+    bus = at28_bus.PortBus(AT28_ADDR, AT28_IO, *AT28_CONTROL, mem=gpio)
+    bus.set_address(0x7FF)
+    for level in (0, 1):
+        bus.set_ce(level)
+        bus.set_oe(level)
+        bus.set_we(level)
+        assert [gpio.pin(name) for name in AT28_CONTROL] == [level] * 3
+    assert gpio.read_value(AT28_ADDR) == 0x7FF
+
+
+def test_virtual_clock_ends_with_the_test(gpio, monkeypatch):
+    import time
+    gpio.sleep_us(5)
+    assert time.ticks_us() == 5
+    monkeypatch.undo()  # what pytest does after the test
+    assert not hasattr(time, 'ticks_us')
+    assert getattr(at28_bus.sleep_us, '__self__', None) is not gpio
@@ -0,0 +1,69 @@
+import collections
+
+import flashRead_at28
+import flashWrite_at28
+
+
+class Counting:
+    """Backend proxy that counts the calls reaching the real backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.calls = collections.Counter()
+
+    def __getattr__(self, name):
+        value = getattr(self.backend, name)
+        if not callable(value):
+            return value
+
+        def call(*args):
+            self.calls[name] += 1
+            return value(*args)
+        return call
+
+
+def counted(module):
+    module.bus.backend = Counting(module.bus.backend)
+    return module.bus.backend.calls
+
+
+def test_burst_forwards_only_changes(at28):
+    chip = at28('port')
+    chip.mem[:64] = bytes(range(64))
+    calls = counted(flashRead_at28)
+    buf = bytearray(64)
+    flashRead_at28.read_into(buf, 0)
+    assert buf == bytes(range(64))
+    # One direction switch and one CE/OE assertion for the whole burst, the
+    # address updated in place
+    assert calls['data_input'] == 1
+    assert calls['set_address'] == 1 and calls['update_address'] == 63
+    assert calls['set_ce'] == 2 and calls['set_oe'] == 2  # assert, then idle()
+
+    calls.clear()
+    flashRead_at28.read_into(buf, 0)
+    # Same owner: direction and WE are still known, not driven again
+    assert calls['data_input'] == 0 and calls['set_we'] == 0
+    assert calls['set_address'] == 0
+
+
+def test_reader_and_writer_hand_the_bus_over(at28):
+    chip = at28('port', page_size=1, write_us=2)
+    chip.mem[:16] = bytes(16)
+    reads = counted(flashRead_at28)
+    writes = counted(flashWrite_at28)
+    buf = bytearray(16)
+    expected = bytes(16)
+    for round in range(3):
+        flashRead_at28.read_into(buf, 0)
+        assert buf == expected
+        # The new owner drives direction and the full address once, then
+        # only changes
+        assert reads['data_input'] == round + 1
+        assert reads['set_address'] == round + 1
+        expected = bytes(range((round + 1) * 16, (round + 2) * 16))
+        flashWrite_at28.write_image(expected, 0)
+        assert writes['set_address'] == round + 1
+        # Out for each byte, back in for its completion poll
+        assert writes['data_output'] == 16 * (round + 1)
+    assert chip.mem[:16] == expected
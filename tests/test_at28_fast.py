@@ -0,0 +1,136 @@
+import builtins
+import importlib.util
+import os
+import random
+import re
+import sys
+import types
+
+import pytest
+
+import at28_bus
+import at28_fast
+import sim_gpio
+from conftest import AT28_ADDR, AT28_CONTROL, AT28_IO, ROOT
+
+
+class TracedGPIO(sim_gpio.SimGPIO):
+    """SimGPIO recording every register access"""
+
+    def __init__(self):
+        super().__init__()
+        self.trace = []
+
+    def __getitem__(self, addr):
+        value = super().__getitem__(addr)
+        self.trace.append(('r', addr, value))
+        return value
+
+    def __setitem__(self, addr, value):
+        self.trace.append(('w', addr, value & 0xFFFFFFFF))
+        super().__setitem__(addr, value)
+
+
+class Register:
+    """What ptr32(address) is in viper code: index 0 is the register"""
+
+    def __init__(self, mem, addr):
+        self.mem = mem
+        self.addr = addr
+
+    def __getitem__(self, i):
+        return self.mem[self.addr + 4 * i]
+
+    def __setitem__(self, i, value):
+        self.mem[self.addr + 4 * i] = value
+
+
+@pytest.fixture
+def viper(monkeypatch):
+    """Load at28_viper.py under CPython: the viper decorator becomes a
+    no-op and ptr32() a register of the simulated GPIO in viper.mem"""
+    micropython = types.ModuleType('micropython')
+    micropython.viper = lambda f: f
+    micropython.const = lambda x: x
+    monkeypatch.setitem(sys.modules, 'micropython', micropython)
+    state = types.SimpleNamespace(mem=None)
+    monkeypatch.setattr(builtins, 'ptr32', lambda addr: Register(state.mem, addr), raising=False)
+    monkeypatch.setattr(builtins, 'ptr8', lambda buf: buf, raising=False)
+    spec = importlib.util.spec_from_file_location('at28_viper_host', os.path.join(ROOT, 'at28_viper.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.state = state
+    return module
+
+
+def board(patch, seed=0):
+    gpio = TracedGPIO()
+    gpio.install(patch)
+    gpio.set_output(AT28_ADDR + AT28_CONTROL)
+    for name in AT28_CONTROL:
+        port, bit = at28_bus.parse_pin(name)
+        gpio[at28_bus.port_base(port) + at28_bus.GPIO_BSRR] = 1 << bit
+    chip = sim_gpio.SimAT28(AT28_ADDR, AT28_IO, *AT28_CONTROL, page_size=1)
+    rng = random.Random(seed)
+    chip.mem[:] = bytes(rng.getrandbits(8) for _ in range(chip.size))
+    gpio.attach(chip)
+    bus = at28_fast.FastBus(AT28_ADDR, AT28_IO, *AT28_CONTROL, mem=gpio)
+    gpio.trace.clear()
+    return gpio, chip, bus
+
+
+def test_ctx_layout_matches_viper_constants():
+    with open(os.path.join(ROOT, 'at28_viper.py')) as f:
+        consts = dict(re.findall(r'^_(\w+) = const\((\d+)\)', f.read(), re.M))
+    assert consts
+    for name, value in consts.items():
+        assert getattr(at28_fast, name) == int(value), name
+
+
+def test_viper_and_twin_read_the_same(viper, patch):
+    twin_gpio, chip, twin = board(patch)
+    viper_gpio, _, bus = board(patch)
+    viper.state.mem = viper_gpio
+
+    for addr in (0, 1, 0xFF, 0x100, 0x5A5, 0x7FF):
+        assert at28_fast.read_byte(twin.ctx, twin_gpio, addr) == chip.mem[addr]
+        assert viper.read_byte(bus.ctx, addr) == chip.mem[addr]
+    a = bytearray(0x100)
+    b = bytearray(0x100)
+    at28_fast.read_block(twin.ctx, twin_gpio, a, 0x6F0, len(a))
+    viper.read_block(bus.ctx, b, 0x6F0, len(b))
+    assert a == b == chip.mem[0x6F0:0x7F0]
+    assert twin_gpio.trace == viper_gpio.trace
+
+
+def test_viper_and_twin_program_the_same(viper, patch):
+    twin_gpio, twin_chip, twin = board(patch)
+    viper_gpio, viper_chip, bus = board(patch)
+    viper.state.mem = viper_gpio
+
+    for addr, value in ((0, 0x00), (0x3C3, 0xA5), (0x7FF, 0x5A)):
+        twin.data_output()
+        at28_fast.write_strobe(twin.ctx, twin_gpio, addr, value)
+        twin.data_input()
+        twin_gpio.sleep_us(2000)  # let the write cycle finish
+        twin.set_ce(1)
+        bus.data_output()
+        viper.write_strobe(bus.ctx, addr, value)
+        bus.data_input()
+        viper_gpio.sleep_us(2000)
+        bus.set_ce(1)
+    assert twin_gpio.trace == viper_gpio.trace
+    assert twin_chip.mem == viper_chip.mem
+    assert [twin_chip.mem[a] for a in (0, 0x3C3, 0x7FF)] == [0x00, 0xA5, 0x5A]
+
+
+def test_fast_bus_matches_port_bus(patch):
+    gpio, chip, fast = board(patch)
+    port = at28_bus.PortBus(AT28_ADDR, AT28_IO, *AT28_CONTROL, mem=gpio)
+    a = bytearray(256)
+    b = bytearray(256)
+    fast.read_block(a, 0x380)
+    port.read_block(b, 0x380)
+    assert a == b == chip.mem[0x380:0x480]
+    for addr in range(0, 2048, 97):
+        assert fast.read_byte(addr) == port.read_byte(addr) == chip.mem[addr]
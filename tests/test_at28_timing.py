@@ -0,0 +1,48 @@
+import pytest
+
+import at28_fast
+import at28_timing
+import flashRead_at28
+import flashWrite_at28
+
+
+def test_sweep_backs_off_from_the_fastest_passing_value():
+    candidates = [1000, 500, 300, 200, 150, 120, 100]
+    chosen, rows = at28_timing.sweep(candidates, lambda v: v >= 150, 64)
+    assert chosen == 200
+    assert [ok for _, ok, _ in rows] == [True] * 5 + [False] * 2
+    chosen, _ = at28_timing.sweep(candidates, lambda v: v >= 150, 64, margin=0)
+    assert chosen == 150
+
+
+def test_sweep_needs_every_slower_value_to_pass():
+    # A lucky pass below a failure does not count
+    chosen, _ = at28_timing.sweep([1000, 500, 300, 200], lambda v: v != 500, 64, margin=0)
+    assert chosen == 1000
+
+
+def test_sweep_fails_when_the_slowest_value_fails():
+    chosen, _ = at28_timing.sweep([1000, 500], lambda v: False, 64)
+    assert chosen is None
+
+
+@pytest.mark.parametrize('access_ns', [150, 450])
+def test_calibrate_follows_the_access_time(at28, access_ns):
+    # A quick WE pulse and short write cycles: no write trial fails and
+    # waits out the timeout, which is slow on the simulated clock
+    chip = at28(page_size=1, access_ns=access_ns, pulse_ns=40, write_us=2)
+    chip.mem[:64] = bytes(range(0x40, 0x80))
+    profile = flashWrite_at28.calibrate(save=False)
+    assert set(profile) == {'settle_ns', 'pulse_ns'}
+    # Covers the access time (the sampling IDR read adds one bus access),
+    # but is not stuck at the slowest setting
+    assert access_ns <= profile['settle_ns'] + at28_fast.LOOP_NS
+    assert profile['settle_ns'] <= 3 * access_ns
+    assert profile['pulse_ns'] >= chip.pulse_ns
+    # Scratch area restored, and the chosen timing reads correctly
+    assert chip.mem[:64] == bytes(range(0x40, 0x80))
+    buf = bytearray(64)
+    flashRead_at28.bus.set_timing(profile['settle_ns'], profile['pulse_ns'])
+    flashRead_at28.read_into(buf, 0)
+    assert buf == bytes(range(0x40, 0x80))
+
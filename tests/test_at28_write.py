@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+import flashRead_at28
+import flashWrite_at28
+
+# Short write cycles keep the simulated polling affordable
+WRITE_US = 10
+
+
+@pytest.mark.parametrize('bus', ['native', 'port', 'pin'])
+def test_byte_mode_part(at28, bus):
+    chip = at28(bus, page_size=1, write_us=WRITE_US)
+    image = bytes(range(100))
+    flashWrite_at28.write_image(image, 0x3F0)  # across 64-byte boundaries
+    assert chip.mem[0x3F0:0x454] == image
+    assert chip.cycles == 100
+    buf = bytearray(100)
+    flashRead_at28.read_into(buf, 0x3F0)
+    assert buf == image
+
+
+def test_page_mode_part(at28, monkeypatch):
+    monkeypatch.setattr(flashWrite_at28, 'PAGE_SIZE', 64)
+    chip = at28(page_size=64, write_us=WRITE_US)
+    image = os.urandom(256)
+    flashWrite_at28.write_image(image, 0x100, diff=False)
+    assert chip.mem[0x100:0x200] == image
+    assert chip.cycles == 256 // 64
+
+
+def test_page_write_must_stay_in_its_page(at28, monkeypatch):
+    monkeypatch.setattr(flashWrite_at28, 'PAGE_SIZE', 64)
+    at28(page_size=64)
+    with pytest.raises(ValueError):
+        flashWrite_at28.write_page(60, b'\x00' * 8)
@@ -0,0 +1,123 @@
+import threading
+import time
+import zlib
+
+import pytest
+
+import binary_upload
+from host import upload
+from host.board import Board
+
+
+class Pipe:
+    """One direction of an in-memory serial link"""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.cond = threading.Condition()
+
+    def write(self, data):
+        with self.cond:
+            self.buf += data
+            self.cond.notify_all()
+        return len(data)
+
+    def read(self, n, timeout=5):
+        with self.cond:
+            self.cond.wait_for(lambda: self.buf, timeout)
+            data = bytes(self.buf[:n])
+            del self.buf[:n]
+            return data
+
+    def readinto(self, mv):
+        data = self.read(len(mv))
+        mv[:len(data)] = data
+        return len(data)
+
+
+class Link:
+    """Host end of the link: each write() is one frame, which damage(index,
+    frame) may alter or drop (None)"""
+
+    def __init__(self, damage):
+        self.to_board = Pipe()
+        self.to_host = Pipe()
+        self.damage = damage
+        self.frames = 0
+        self.timeout = 1
+
+    def write(self, data):
+        data = self.damage(self.frames, data)
+        self.frames += 1
+        if data is not None:
+            self.to_board.write(data)
+
+    def read(self, n):
+        return self.to_host.read(n, self.timeout)
+
+
+def run(image, damage, start=0x1000):
+    link = Link(damage)
+    board = Board.__new__(Board)
+    board.port = 'link'
+    board.serial = link
+    written = bytearray(len(image))
+
+    def sink(addr, data):
+        written[addr - start:addr - start + len(data)] = data
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault(
+        'crc', binary_upload.receive(sink, start, len(image), link.to_board, link.to_host)))
+    thread.start()
+    resent = upload.send(board, image, start, progress=False)
+    thread.join(5)
+    return written, resent, result.get('crc'), link
+
+
+@pytest.fixture(autouse=True)
+def quick(monkeypatch):
+    monkeypatch.setattr(binary_upload, 'select', None)  # no poll() on the pipes
+    monkeypatch.setattr(upload, 'RESEND_S', 0.2)
+
+
+IMAGE = bytes((i * 7 + (i >> 8)) & 0xFF for i in range(20 * 256 + 100))
+
+
+def test_clean_link():
+    written, resent, crc, link = run(IMAGE, lambda i, frame: frame)
+    assert written == IMAGE and resent == 0
+    assert crc == zlib.crc32(IMAGE)
+    assert link.frames == 21
+
+
+def test_damaged_frame_is_nacked_and_resent():
+    def damage(i, frame):
+        if i == 3:
+            frame = bytearray(frame)
+            frame[20] ^= 0xFF
+        return frame
+    written, resent, crc, link = run(IMAGE, damage)
+    assert written == IMAGE
+    # Go-back-N: frame 3 and whatever the window had sent after it
+    assert 1 <= resent <= upload.WINDOW
+    assert link.frames == 21 + resent
+    assert crc == zlib.crc32(IMAGE)
+
+
+def test_lost_frame_is_resent_after_a_gap():
+    written, resent, crc, link = run(IMAGE, lambda i, frame: None if i == 5 else frame)
+    assert written == IMAGE and resent >= 1
+
+
+def test_lost_last_frame_is_resent_after_the_timeout():
+    t0 = time.monotonic()
+    written, resent, crc, link = run(IMAGE, lambda i, frame: None if i == 20 else frame)
+    assert written == IMAGE and resent == 1
+    assert time.monotonic() - t0 >= upload.RESEND_S
+
+
+def test_several_losses():
+    lost = {2, 9, 10, 17, 25}
+    written, resent, crc, link = run(IMAGE, lambda i, frame: None if i in lost else frame)
+    assert written == IMAGE
+    assert resent >= 3
@@ -0,0 +1,26 @@
+import zlib
+
+import chip_hash
+
+
+def read_stream_of(mem):
+    def read_stream(start, length, callback):
+        for addr in range(start, start + length, 1000):  # not sector-aligned
+            callback(addr, memoryview(mem)[addr:min(addr + 1000, start + length)])
+    return read_stream
+
+
+def test_sector_digests_as_list_or_streamed():
+    mem = bytes(i * 13 & 0xFF for i in range(20000))
+    start, length = 0x300, 15000
+    digest, sectors = chip_hash.checksum(read_stream_of(mem), start, length, 'crc32', 4096)
+    assert digest == f"{zlib.crc32(mem[start:start + length]):08x}"
+    bases = [0, 4096, 8192, 12288]
+    assert sectors == [f"{zlib.crc32(mem[max(b, start):min(b + 4096, start + length)]):08x}"
+                       for b in bases]
+
+    streamed = []
+    result = chip_hash.checksum(read_stream_of(mem), start, length, 'crc32', 4096,
+                                lambda base, d: streamed.append((base, d)))
+    assert result == (digest, None)
+    assert streamed == list(zip(bases, sectors))
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import pty
+
+import pytest
+
+from host import fleet
+from host.board import BoardError
+from host.client import Programmer, digest, sector_digests
+from host.fake_board import FakeBoard
+
+SIZES = {'at24': 32768, 'w25': 256 * 1024}
+
+
+@pytest.fixture
+def boards():
+    started = []
+
+    def make():
+        board = FakeBoard(SIZES)
+        started.append(board)
+        return board
+    yield make
+    for board in started:
+        board.close()
+
+
+def image_of(length, seed=1):
+    return bytes((i * 7 + seed) & 0xFF for i in range(length))
+
+
+def test_round_trip(boards):
+    board = boards()
+    image = image_of(10000)
+    with Programmer(board.port) as p:
+        assert p.write_image('at24', image, 0x100) == 0
+        assert p.read_image('at24', 0x100, len(image)) == image
+        p.verify_image('at24', image, 0x100)
+        assert p.checksum('at24', 0x100, len(image)) == digest(image)
+        sha = hashlib.sha256(image).hexdigest()
+        assert p.checksum('at24', 0x100, len(image), 'sha256') == sha
+        p.verify_hash('at24', 0x100, len(image), sha, 'sha256')
+        total, sectors = p.checksum('at24', 0x100, len(image), 'crc32', 4096)
+        assert total == digest(image)
+        assert sectors == sector_digests(image, 0x100, 4096)[1]
+        assert p.status()['queued'] == '0'
+
+
+def test_mismatch_is_reported(boards):
+    board = boards()
+    image = image_of(5000)
+    changed = bytearray(image)
+    changed[4500] ^= 0xFF
+    with Programmer(board.port) as p:
+        p.write_image('w25', image, 0x2000)
+        with pytest.raises(BoardError):
+            p.verify_image('w25', changed, 0x2000)
+        with pytest.raises(BoardError):
+            p.verify_hash('w25', 0x2000, len(image), digest(changed))
+        assert p.diff_sectors('w25', bytes(changed), 0x2000) == [0x3000]
+        # The job server keeps going after a failed job
+        p.verify_hash('w25', 0x2000, len(image), digest(image))
+
+
+def test_out_of_range_job_fails(boards):
+    board = boards()
+    with Programmer(board.port) as p:
+        with pytest.raises(BoardError):
+            p.checksum('at24', 32000, 4096)
+
+
+def test_discover_skips_silent_ports(boards):
+    board = boards()
+    master, slave = pty.openpty()  # a serial port nobody answers on
+    try:
+        silent = os.ttyname(slave)
+        assert fleet.discover([board.port, silent], timeout=0.5) == [board.port]
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def test_program_all(boards, capsys):
+    ports = [boards().port for _ in range(3)]
+    image = image_of(20000, seed=3)
+    jobs = fleet.program_all(ports, 'w25', image, start=0x10000, progress=False)
+    assert [job.state for job in jobs] == ['ok'] * 3
+    assert all(job.done == len(image) for job in jobs)
+    for port in ports:
+        with Programmer(port) as p:
+            assert p.checksum('w25', 0x10000, len(image)) == digest(image)
+
+
+def test_sector_digests_arrive_one_line_each(boards):
+    board = boards()
+    image = image_of(SIZES['w25'])
+    with Programmer(board.port) as p:
+        p.write_image('w25', image)
+        seen = []
+        total, sectors = p.checksum('w25', 0, len(image), 'crc32', 4096,
+                                    lambda base, d: seen.append((base, d)))
+        assert total == digest(image) and sectors is None
+        assert seen == list(zip(*sector_digests(image, 0, 4096)))
+        assert p.diff_sectors('w25', image) == []
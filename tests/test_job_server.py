@@ -0,0 +1,208 @@
+import asyncio
+import io
+import zlib
+
+import pytest
+
+import at24_geometry
+import binary_upload
+import flashRead_at24
+import flashRead_w25
+import flashWrite_at24
+import flashWrite_w25
+import job_server
+import sim_i2c
+import sim_spi
+from host import dump, upload
+from host.board import Board
+
+
+class Console:
+    """The USB VCP as job_server sees it: command lines and upload frames
+    in, text and binary frames out, one byte stream each way"""
+
+    def __init__(self, data):
+        self.input = io.BytesIO(data)
+        self.output = bytearray()
+        self.buffer = self
+
+    def write(self, data):
+        self.output += data.encode() if isinstance(data, str) else data
+        return len(data)
+
+    def readinto(self, mv):
+        return self.input.readinto(mv)
+
+    def flush(self):
+        pass
+
+
+class Lines:
+    """asyncio.StreamReader stand-in; at the end of the input it lets the
+    queue drain and stops the server as Ctrl-C would"""
+
+    def __init__(self, stdin):
+        self.stdin = stdin
+
+    async def readline(self):
+        line = self.stdin.input.readline()
+        if line:
+            return line
+        while job_server._queue or job_server._running[0]:
+            await asyncio.sleep(0)
+        raise KeyboardInterrupt
+
+
+class Wire:
+    """Serial stand-in replaying what the server sent"""
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+        self.timeout = 0.1
+
+    def read(self, n):
+        return self.stream.read(n)
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Run job_server.run() over a list of command lines (bytes for upload
+    frames); returns a Board reading back what the server printed"""
+    monkeypatch.setattr(job_server, '_modules', {})
+    monkeypatch.setattr(job_server, '_owners', {})
+    monkeypatch.setattr(job_server, '_queue', [])
+    monkeypatch.setattr(job_server, '_running', [None])
+    monkeypatch.setattr(job_server.asyncio, 'StreamReader', Lines)
+    monkeypatch.setattr(binary_upload, 'select', None)
+    # The server leaves its drivers initialized; undo that after the test
+    for module in (flashRead_at24, flashWrite_at24, flashRead_w25, flashWrite_w25):
+        monkeypatch.setattr(module, 'KEEP_INIT', False)
+
+    def run(*commands):
+        data = b''.join(c if isinstance(c, bytes) else c.encode() + b'\n' for c in commands)
+        console = Console(data)
+        with monkeypatch.context() as m:
+            m.setattr('sys.stdin', console)
+            m.setattr('sys.stdout', console)
+            job_server.run()
+        board = Board.__new__(Board)
+        board.port = 'console'
+        board.serial = Wire(bytes(console.output))
+        board.expect(b'Job server ready (Ctrl-C for the REPL)\n')
+        return board
+    return run
+
+
+def rest(board):
+    return board.serial.stream.read().decode().splitlines()
+
+
+def frames_of(image, start):
+    return b''.join(upload.pack(seq, *piece)
+                    for seq, piece in enumerate(upload.frames(image, start, binary_upload.MAX_PAYLOAD)))
+
+
+def pattern(n, seed=1):
+    return bytes((i * 7 + seed) & 0xFF for i in range(n))
+
+
+@pytest.fixture
+def at24(i2c):
+    chip = i2c.attach(sim_i2c.SimAT24(0x50, size=4096, page_size=32, busy_us=100))
+    at24_geometry.define(0x50, 2, 4096, 32)
+    return chip
+
+
+@pytest.fixture
+def w25(spi):
+    return spi.attach(sim_spi.SimW25(size=1 << 20))
+
+
+def test_read(serve, w25):
+    w25.mem[:0x3000] = pattern(0x3000)
+    board = serve('read w25 0x1100 0x1234')
+    board.expect(b'QUEUED 1\nBEGIN 1\n')
+    image = bytearray(0x1234)
+    bad, crc = dump.receive_frames(board, 0x1100, 0x1234, image, False)
+    assert bad == [] and crc == zlib.crc32(image)
+    assert image == w25.mem[0x1100:0x2334]
+    assert rest(board)[-2:] == ['END 1 OK', 'Job server stopped']
+
+
+def test_write(serve, at24):
+    image = pattern(1000, seed=3)
+    board = serve('write at24 0x100 1000', frames_of(image, 0x100), 'status',
+                  'read at24 0x100 1000')
+    board.expect(b'QUEUED 1\nBEGIN 1\n')
+    board.expect(b'READY 256\n')
+    # One acknowledgement per frame, in order
+    replies = board.read_exact(3 * 4)
+    assert [(replies[i], replies[i + 1]) for i in range(0, 12, 3)] == [(ord('A'), seq) for seq in range(4)]
+    board.expect(f"DONE 1000 {zlib.crc32(image)}\n".encode())
+    # The write held the command stream until it ended
+    board.expect(b'END 1 OK\nSTATUS queued=0 running=- drivers=flashWrite_at24\n'
+                 b'QUEUED 2\nBEGIN 2\n')
+    readback = bytearray(1000)
+    bad, _ = dump.receive_frames(board, 0x100, 1000, readback, False)
+    assert bad == [] and readback == image == at24.mem[0x100:0x100 + 1000]
+    assert 'END 2 OK' in rest(board)
+
+
+def test_erase_range(serve, at24):
+    at24.mem[:] = pattern(4096)
+    board = serve('erase at24 0x7F0 0x220')
+    board.expect(b'QUEUED 1\nBEGIN 1\n')
+    assert 'END 1 OK' in rest(board)
+    assert at24.mem[0x7F0:0xA10] == b'\xff' * 0x220
+    assert at24.mem[:0x7F0] == pattern(4096)[:0x7F0]
+    assert at24.mem[0xA10:] == pattern(4096)[0xA10:]
+
+
+def test_erase_range_at28_fills_like_a_full_erase(serve, at28):
+    chip = at28(page_size=1, write_us=10)
+    chip.mem[:] = b'\xa5' * 2048
+    board = serve('erase at28 0x100 0x20')
+    board.expect(b'QUEUED 1\nBEGIN 1\n')
+    assert 'END 1 OK' in rest(board)
+    # flashWrite_at28.erase() leaves 0x00, so a ranged erase does too
+    assert chip.mem[0x100:0x120] == bytes(0x20)
+    assert chip.mem[:0x100] == chip.mem[0x120:0x220] == b'\xa5' * 0x100
+
+
+def test_erase_range_w25_keeps_the_rest_of_the_sector(serve, w25):
+    w25.mem[:0x2000] = pattern(0x2000)
+    board = serve('erase w25 0x1100 0x200')
+    board.expect(b'QUEUED 1\nBEGIN 1\n')
+    assert 'END 1 OK' in rest(board)
+    assert w25.mem[0x1100:0x1300] == b'\xff' * 0x200
+    assert w25.mem[:0x1100] == pattern(0x2000)[:0x1100]
+    assert w25.mem[0x1300:0x2000] == pattern(0x2000)[0x1300:]
+
+
+def test_erase_whole_chip(serve, w25):
+    w25.mem[:] = pattern(1 << 20)
+    board = serve('erase w25')
+    board.expect(b'QUEUED 1\nBEGIN 1\n')
+    assert 'END 1 OK' in rest(board)
+    assert w25.mem == b'\xff' * (1 << 20)
+
+
+def test_status_and_reset(serve, w25):
+    board = serve('status', 'checksum w25 0 0x100', 'status', 'reset', 'status')
+    lines = rest(board)
+    assert lines[0] == 'STATUS queued=0 running=- drivers=-'
+    assert lines[1:3] == ['QUEUED 1', 'STATUS queued=1 running=- drivers=-']
+    # The worker only gets to the job once the command reader waits for input
+    assert lines[3:5] == ['RESET', 'STATUS queued=1 running=- drivers=-']
+    assert lines[5] == 'BEGIN 1'
+    crc = zlib.crc32(b'\xff' * 0x100)
+    assert lines[-2] == f"END 1 OK {crc:08x}"
+
+
+def test_unknown_command_and_missing_chip(serve, w25):
+    board = serve('format w25', 'read', 'read eprom 0 16', 'status')
+    assert rest(board) == ['ERR Unknown command format',
+                           'ERR Expected a chip: at24 at28 w25',
+                           'ERR Expected a chip: at24 at28 w25',
+                           'STATUS queued=0 running=- drivers=-',
+                           'Job server stopped']
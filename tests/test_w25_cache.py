@@ -0,0 +1,70 @@
+import pytest
+
+import flashWrite_w25
+import sim_spi
+import w25_cache
+
+
+@pytest.fixture
+def w25(spi, monkeypatch):
+    chip = spi.attach(sim_spi.SimW25(size=1 << 20))
+    monkeypatch.setattr(flashWrite_w25, 'KEEP_INIT', False)
+    flashWrite_w25.init_spi()
+    chip.mem[:0x10000] = bytes((i * 7 + (i >> 8)) & 0xFF for i in range(0x10000))
+    return chip
+
+
+def test_least_recently_used_sector_is_evicted(w25):
+    cache = w25_cache.SectorCache(flashWrite_w25, slots=2)
+    assert cache.read(0x1010, 4) == w25.mem[0x1010:0x1014]
+    cache.read_byte(0x2000)
+    cache.read_byte(0x1FFF)  # 0x1000 is the most recent again
+    cache.read_byte(0x3000)
+    assert cache.lru == [0x1000, 0x3000]
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 3, 1)
+
+
+def test_writes_stay_in_ram_until_written_back(w25):
+    cache = w25_cache.SectorCache(flashWrite_w25, slots=1)
+    w25.mem[0x4000:0x5000] = b'\xff' * 0x1000
+    cache.write(0x40FE, b'\x12\x34\x56')  # two pages of the sector
+    assert cache.read(0x40FE, 3) == b'\x12\x34\x56'
+    assert w25.mem[0x40FE:0x4101] == b'\xff' * 3
+    cache.read_byte(0x5000)  # evicts 0x4000
+    assert w25.mem[0x40FE:0x4101] == b'\x12\x34\x56'
+    stats = cache.stats()
+    assert (stats['writebacks'], stats['erases'], stats['programs']) == (1, 0, 2)
+    assert w25.counts['erase'] == 0
+
+
+def test_erase_only_when_a_bit_goes_back_to_1(w25):
+    w25.mem[0x2010] = 0xF3
+    w25.mem[0x2020] = 0x0F
+    before = bytes(w25.mem[:0x3000])
+    cache = w25_cache.SectorCache(flashWrite_w25)
+    # Clearing bits only: programmed in place
+    cache.write_byte(0x2010, 0x03)
+    cache.flush()
+    assert cache.stats()['erases'] == 0 and w25.counts['erase'] == 0
+    assert w25.mem[0x2010] == 0x03
+
+    # A bit set back: the sector is erased and every non-blank page
+    # programmed again
+    cache.write_byte(0x2020, 0xF0)
+    cache.flush()
+    assert cache.stats()['erases'] == 1 and w25.counts['erase'] == 1
+    expected = bytearray(before)
+    expected[0x2010] = 0x03
+    expected[0x2020] = 0xF0
+    assert w25.mem[:0x3000] == expected
+
+
+def test_page_size_comes_from_the_part(w25, monkeypatch):
+    monkeypatch.setattr(flashWrite_w25, 'PAGE_SIZE', 128)
+    cache = w25_cache.SectorCache(flashWrite_w25)
+    w25.mem[0x6000:0x7000] = b'\xff' * 0x1000
+    cache.write(0x607E, b'\x00' * 4)  # straddles two 128-byte pages
+    cache.flush()
+    assert cache.stats()['programs'] == 2
+    assert w25.mem[0x607E:0x6082] == bytes(4)
@@ -0,0 +1,75 @@
+import pytest
+
+import flashWrite_w25
+import sim_spi
+import w25_erase
+
+K = 1024
+
+
+def test_aligned_spans_use_one_erase_each():
+    assert w25_erase.plan([(0x10000, 0x30000)]) == [(0x10000, 64 * K, []), (0x20000, 64 * K, [])]
+    assert w25_erase.plan([(0x8000, 0x10000)]) == [(0x8000, 32 * K, [])]
+    assert w25_erase.plan([(0x3000, 0x4000)]) == [(0x3000, 4 * K, [])]
+
+
+def test_mostly_dirty_block_is_erased_whole_with_kept_data():
+    # 48K of a 64K block: one 64K erase keeping 16K beats a 32K erase and
+    # four 4K erases
+    ops = w25_erase.plan([(0x0, 0xC000)])
+    assert ops == [(0x0, 64 * K, [(0xC000, 0x10000)])]
+    other = [(0x0, 32 * K, [])] + [(a, 4 * K, []) for a in range(0x8000, 0xC000, 0x1000)]
+    assert w25_erase.estimate_us(ops) < w25_erase.estimate_us(other)
+
+
+def test_kept_data_stays_within_the_budget():
+    # With slow sector erases, one 64K erase keeping 24K would be cheapest,
+    # but 24K exceeds RMW_BUDGET
+    erase_us = {4 * K: 100000, 32 * K: 120000, 64 * K: 150000}
+    ops = w25_erase.plan([(0x0, 0xA000)], erase_us=erase_us)
+    assert ops == [(0x0, 32 * K, []), (0x8000, 4 * K, []), (0x9000, 4 * K, [])]
+    ops = w25_erase.plan([(0x0, 0xA000)], budget=32 * K, erase_us=erase_us)
+    assert ops == [(0x0, 64 * K, [(0xA000, 0x10000)])]
+
+
+def test_unaligned_head_and_tail_keep_their_neighbours():
+    ops = w25_erase.plan([(0x1800, 0x2400)])
+    assert ops == [(0x1000, 4 * K, [(0x1000, 0x1800)]), (0x2000, 4 * K, [(0x2400, 0x3000)])]
+    assert w25_erase.plan([(0x1800, 0x2400)], preserve=False) == [(0x1000, 4 * K, []), (0x2000, 4 * K, [])]
+
+
+def test_ranges_are_merged_before_planning():
+    assert w25_erase.normalize([(0x3000, 0x4000), (0x1000, 0x2000), (0x2000, 0x3000), (5, 5)]) == [(0x1000, 0x4000)]
+    assert w25_erase.plan([(0x1000, 0x2000), (0x2000, 0x3000)]) == [(0x1000, 4 * K, []), (0x2000, 4 * K, [])]
+
+
+def test_estimate_counts_erases_and_restores():
+    ops = [(0x1000, 4 * K, [(0x1000, 0x1100)])]
+    assert w25_erase.estimate_us(ops, read_us_per_kb=1024) == 45000 + 700 + 256
+    # Times from the part (SFDP) replace the defaults
+    assert w25_erase.estimate_us([(0, 4 * K, [])], erase_us={4 * K: 64000}) == 64000
+
+
+@pytest.fixture
+def w25(spi, monkeypatch):
+    chip = spi.attach(sim_spi.SimW25(size=1 << 20))
+    monkeypatch.setattr(flashWrite_w25, 'KEEP_INIT', False)
+    flashWrite_w25.init_spi()
+    chip.mem[:0x20000] = bytes((i * 7 + (i >> 8)) & 0x7F for i in range(0x20000))
+    return chip
+
+
+@pytest.mark.parametrize('start, end', [(0x1800, 0x2400), (0x0, 0xC000), (0xFF00, 0x10100)])
+def test_erase_keeps_the_bytes_around_the_range(w25, start, end):
+    before = bytes(w25.mem[:0x20000])
+    flashWrite_w25.erase_ranges([(start, end)])
+    assert w25.mem[start:end] == b'\xff' * (end - start)
+    assert w25.mem[:start] == before[:start]
+    assert w25.mem[end:0x20000] == before[end:]
+
+
+def test_dry_run_erases_nothing(w25):
+    before = bytes(w25.mem)
+    ops = flashWrite_w25.erase_ranges([(0x1800, 0x2400)], dry_run=True)
+    assert len(ops) == 2
+    assert w25.mem == before and w25.counts['erase'] == 0
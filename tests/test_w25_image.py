@@ -0,0 +1,44 @@
+import pytest
+
+import flashWrite_w25
+import sim_spi
+
+
+@pytest.fixture
+def w25(spi, monkeypatch):
+    chip = spi.attach(sim_spi.SimW25())
+    monkeypatch.setattr(flashWrite_w25, 'KEEP_INIT', False)
+    flashWrite_w25.init_spi()
+    return chip
+
+
+def test_only_changed_sectors_are_touched(spi, w25):
+    w25.mem[:0x4000] = bytes(range(256)) * 64
+    image = bytearray(w25.mem[:0x4000])
+    image[0x1010] = 0x00          # bits cleared: programmed in place
+    image[0x2020] = 0xFF          # a bit set back: erased
+    counts = flashWrite_w25.program_image(image, 0)
+    assert counts == (2, 1, 1)
+    assert w25.mem[:0x4000] == image
+    assert w25.counts['erase'] == 1
+    assert spi.baudrate == flashWrite_w25.BAUDRATE
+
+
+def test_compare_reads_at_the_read_clock(spi, w25):
+    image = bytes(w25.mem[:0x10000])
+    t0 = spi.now_us
+    assert flashWrite_w25.program_image(image, 0) == (16, 0, 0)
+    # 64 KB compared once: about 21 ms at 25 MHz, 524 ms at the 1 MHz
+    # programming clock
+    assert spi.now_us - t0 < 8 * 0x10000 * 1000000 // flashWrite_w25.BAUDRATE // 10
+
+
+def test_long_operations_sleep_in_short_slices(spi, w25, monkeypatch):
+    sleeps = []
+    sleep_us = spi.sleep_us
+    monkeypatch.setattr(flashWrite_w25.time, 'sleep_us', lambda us: sleeps.append(us) or sleep_us(us))
+    t0 = spi.now_us
+    flashWrite_w25.chip_erase()
+    assert max(sleeps) <= flashWrite_w25.POLL_MAX_US
+    # Ends within one slice (plus a status read) of the 40 s erase
+    assert spi.now_us - t0 <= sim_spi.ERASE_US[0xC7] + flashWrite_w25.POLL_MAX_US + 100
@@ -0,0 +1,40 @@
+import flashWrite_w25
+import sim_spi
+import w25_pipeline
+
+RECEIVE_US = 1000  # USB time per page
+
+
+class SlowStream:
+    """Image source that takes RECEIVE_US of bus time per page"""
+
+    def __init__(self, spi, data):
+        self.spi = spi
+        self.data = data
+        self.pos = 0
+
+    def readinto(self, mv):
+        self.spi.sleep_us(RECEIVE_US * len(mv) // 256)
+        n = len(mv)
+        mv[:] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def test_program_time_overlaps_the_receive(spi, monkeypatch):
+    chip = spi.attach(sim_spi.SimW25())
+    monkeypatch.setattr(flashWrite_w25, 'KEEP_INIT', False)
+    image = bytes(range(256)) * 32
+    flashWrite_w25.init_spi()
+    monkeypatch.setattr(flashWrite_w25, 'KEEP_INIT', True)
+    flashWrite_w25.poll_stats(reset=True)
+    t0 = spi.now_us
+    w25_pipeline.program_stream(0, len(image), erase=False, stream=SlowStream(spi, image))
+    assert chip.mem[:len(image)] == image
+    # The 704 us program runs during the 1 ms receive plus the page transfer,
+    # so each page costs only those two and a status read
+    page_us = RECEIVE_US + 8 * (256 + 8) * 1000000 // flashWrite_w25.BAUDRATE
+    assert spi.now_us - t0 <= 32 * (page_us + 100)
+    # One status read per page, except for the last (nothing to receive)
+    stats = flashWrite_w25.poll_stats()
+    assert stats['polls'] - stats['max_polls'] == stats['ops'] - 1
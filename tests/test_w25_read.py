@@ -0,0 +1,27 @@
+import flashRead_w25
+import sim_spi
+
+
+def test_stream_splits_at_window_and_chunk(spi, monkeypatch):
+    chip = spi.attach(sim_spi.SimW25(size=1 << 20))
+    chip.mem[:0x10000] = bytes((i * 7 + (i >> 8)) & 0xFF for i in range(0x10000))
+    monkeypatch.setattr(flashRead_w25, 'KEEP_INIT', False)
+    flashRead_w25.init_spi()
+    monkeypatch.setattr(flashRead_w25, 'READ_WINDOW', 0x300)
+    monkeypatch.setattr(flashRead_w25, 'READ_CHUNK', 0x100)
+
+    commands = []
+    select = chip.select
+
+    def counting_select(now_us):
+        select(now_us)
+        commands.append(chip._cmd)
+    monkeypatch.setattr(chip, 'select', counting_select)
+
+    chunks = []
+    flashRead_w25.read_stream(0x2F0, 0x4F8, lambda addr, data: chunks.append((addr, bytes(data))))
+    assert [(addr, len(data)) for addr, data in chunks] == [
+        (0x2F0, 0x100), (0x3F0, 0x100), (0x4F0, 0x100), (0x5F0, 0x100), (0x6F0, 0xF8)]
+    assert b''.join(data for _, data in chunks) == chip.mem[0x2F0:0x7E8]
+    # One fast read per window
+    assert len(commands) == 2 and all(cmd[0] == 0x0B for cmd in commands)
@@ -0,0 +1,32 @@
+import w25_sfdp
+import sim_spi
+
+
+def test_w25q128jv_table():
+    desc = w25_sfdp.parse_blob(sim_spi.SFDP_W25Q128JV)
+    assert desc['size'] == 16 * 1024 * 1024
+    assert desc['page_size'] == 256
+    assert desc['addr_bytes'] == 3
+    # Typical times as the table encodes them (coarser than the datasheet)
+    assert desc['erase'] == [(4096, 0x20, 64000), (32768, 0x52, 128000), (65536, 0xD8, 160000)]
+    assert desc['program_us'] == 704
+    assert desc['chip_erase_us'] == 40000000
+    assert desc['read'] == (0x0B, 1)
+    assert desc['dual'] and desc['quad']
+
+
+def test_rev_1_0_table_keeps_default_times():
+    desc = w25_sfdp.parse_blob(sim_spi.make_sfdp(8 * 1024 * 1024))
+    assert desc['size'] == 8 * 1024 * 1024
+    assert desc['erase'] == [(4096, 0x20, 45000), (65536, 0xD8, 150000)]
+    assert desc['program_us'] == w25_sfdp.DEFAULT['program_us']
+    assert not desc['dual'] and not desc['quad']
+
+
+def test_large_part_uses_4_byte_addresses():
+    assert w25_sfdp.parse_blob(sim_spi.make_sfdp(64 * 1024 * 1024, addr_mode=1))['addr_bytes'] == 4
+    assert w25_sfdp.parse_blob(sim_spi.make_sfdp(16 * 1024 * 1024, addr_mode=1))['addr_bytes'] == 3
+
+
+def test_missing_signature():
+    assert w25_sfdp.parse_blob(b'\xff' * 256) is None
@@ -0,0 +1,61 @@
+import pytest
+
+import flashWrite_w25
+import sim_spi
+import w25_writer
+
+
+@pytest.fixture
+def w25(spi, monkeypatch):
+    chip = spi.attach(sim_spi.SimW25(size=1 << 20))
+    monkeypatch.setattr(flashWrite_w25, 'KEEP_INIT', False)
+    flashWrite_w25.init_spi()
+    monkeypatch.setattr(flashWrite_w25, 'KEEP_INIT', True)
+    chip.mem[:0x1000] = bytes(((i * 7 + (i >> 8)) & 0xFF) | 0x80 for i in range(0x1000))
+    return chip
+
+
+def test_scattered_writes_take_one_program_per_page(w25):
+    before = bytes(w25.mem[:0x1000])
+    writes = {0x10: 0x01, 0x12: 0x02, 0x20: 0x03, 0x1FF: 0x04, 0x200: 0x05, 0x0F: 0x06}
+    with w25_writer.Writer(flashWrite_w25.write_page) as writer:
+        for addr, value in writes.items():
+            writer.write(addr, value)
+        writer.write_bytes(0x2F0, bytes(range(0x20)))  # across a page boundary
+        assert w25.counts['program'] == 0  # nothing until the flush
+    # Pages 0, 1, 2 and 3, once each
+    assert w25.counts['program'] == 4
+    assert writer.stats() == {'bytes': 38, 'programs': 4, 'pending': 0}
+    expected = bytearray(before)
+    for addr, value in writes.items():
+        expected[addr] &= value
+    for i in range(0x20):
+        expected[0x2F0 + i] &= i
+    # Gap bytes went out as 0xFF and kept their contents
+    assert w25.mem[:0x1000] == expected
+
+
+def test_buffer_flushes_when_full(w25):
+    writer = w25_writer.Writer(flashWrite_w25.write_page, max_pages=2)
+    for page in range(3):
+        writer.write(page * 256, 0)
+    assert w25.counts['program'] == 2  # the first two pages, before the third
+    writer.close()
+    assert w25.counts['program'] == 3
+    assert [w25.mem[p * 256] for p in range(3)] == [0, 0, 0]
+
+
+def test_error_drops_the_buffered_pages(w25):
+    with pytest.raises(ValueError):
+        with w25_writer.Writer(flashWrite_w25.write_page) as writer:
+            writer.write(0x10, 0)
+            raise ValueError
+    assert w25.counts['program'] == 0
+
+
+def test_write_command(w25):
+    before = bytes(w25.mem[:0x400])
+    flashWrite_w25.write('w 0x100 0x11 0x101 0x22 0x3FF 0x33')
+    assert w25.counts['program'] == 2
+    assert w25.mem[0x100:0x102] == bytes([before[0x100] & 0x11, before[0x101] & 0x22])
+    assert w25.mem[0x3FF] == before[0x3FF] & 0x33
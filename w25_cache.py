@@ -0,0 +1,139 @@
+# Write-back sector cache for byte-granular W25 updates. Up to `slots`
+# 4 KB sectors are held in RAM (least recently used evicted first); the
+# read/erase/program cycle only runs when a modified sector is evicted or
+# flush() is called, and the sector is only erased if some bit has to go
+# from 0 back to 1.
+#
+#   cache = w25_cache.SectorCache(flashWrite_w25, slots=4)
+#   cache.write(0x123456, b'\x01\x02')
+#   cache.read(0x123450, 16)
+#   cache.flush()
+#   cache.print_stats()
+
+SECTOR = 4096  # needs a 4K erase on the part
+SLOTS = 4  # 16 KB of RAM
+
+
+class SectorCache:
+    def __init__(self, flash, slots=SLOTS):
+        """flash provides read_into(addr, buf), write_page(addr, data),
+        erase_block(addr, size) and PAGE_SIZE (flashWrite_w25 after
+        init_spi(), which takes them from the part's SFDP table)"""
+        self.flash = flash
+        self.slots = slots
+        self.sectors = {}  # sector address -> [buffer, dirty]
+        self.lru = []  # sector addresses, least recently used first
+        self.page = flash.PAGE_SIZE
+        self._page = bytearray(self.page)
+        self._blank = bytearray(b'\xff' * self.page)
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'writebacks': 0,
+                         'erases': 0, 'programs': 0}
+
+    def _sector(self, addr):
+        base = addr - addr % SECTOR
+        entry = self.sectors.get(base)
+        if entry is not None:
+            self.counters['hits'] += 1
+            if self.lru[-1] != base:
+                self.lru.remove(base)
+                self.lru.append(base)
+            return base, entry
+        self.counters['misses'] += 1
+        if len(self.lru) >= self.slots:
+            buf = self._evict(self.lru[0])  # reuse the evicted buffer
+        else:
+            buf = bytearray(SECTOR)
+        self.flash.read_into(base, buf)
+        entry = [buf, False]
+        self.sectors[base] = entry
+        self.lru.append(base)
+        return base, entry
+
+    def _evict(self, base):
+        self.counters['evictions'] += 1
+        self._write_back(base)
+        buf = self.sectors.pop(base)[0]
+        self.lru.remove(base)
+        return buf
+
+    def _write_back(self, base):
+        buf, dirty = self.sectors[base]
+        if not dirty:
+            return
+        self.counters['writebacks'] += 1
+        mv = memoryview(buf)
+        page = self._page
+        size = self.page
+        # Pages that differ, and whether any of them needs a 0 -> 1 bit
+        # (buffer comparisons, so nothing is allocated per page)
+        changed = []
+        erase = False
+        for offset in range(0, SECTOR, size):
+            self.flash.read_into(base + offset, page)
+            new = mv[offset:offset + size]
+            if page == new:
+                continue
+            changed.append(offset)
+            if not erase:
+                for i in range(size):
+                    if new[i] & ~page[i] & 0xFF:
+                        erase = True
+                        break
+        if erase:
+            self.flash.erase_block(base, SECTOR)
+            self.counters['erases'] += 1
+            changed = [o for o in range(0, SECTOR, size)
+                       if self._blank != mv[o:o + size]]
+        for offset in changed:
+            self.flash.write_page(base + offset, mv[offset:offset + size])
+            self.counters['programs'] += 1
+        self.sectors[base][1] = False
+
+    def read(self, addr, n):
+        out = bytearray(n)
+        pos = 0
+        while pos < n:
+            base, entry = self._sector(addr + pos)
+            offset = addr + pos - base
+            k = min(SECTOR - offset, n - pos)
+            out[pos:pos + k] = entry[0][offset:offset + k]
+            pos += k
+        return bytes(out)
+
+    def read_byte(self, addr):
+        base, entry = self._sector(addr)
+        return entry[0][addr - base]
+
+    def write(self, addr, data):
+        pos = 0
+        n = len(data)
+        while pos < n:
+            base, entry = self._sector(addr + pos)
+            offset = addr + pos - base
+            k = min(SECTOR - offset, n - pos)
+            entry[0][offset:offset + k] = data[pos:pos + k]
+            entry[1] = True
+            pos += k
+
+    def write_byte(self, addr, value):
+        base, entry = self._sector(addr)
+        entry[0][addr - base] = value & 0xFF
+        entry[1] = True
+
+    def flush(self):
+        """Write back every modified sector (they stay cached)"""
+        for base in sorted(self.sectors):
+            self._write_back(base)
+
+    def stats(self):
+        stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0
+        stats['ram'] = self.slots * SECTOR
+        return stats
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"Cache ({self.slots} x 4K): {s['hits']} hits, {s['misses']} misses "
+              f"({s['hit_rate'] * 100:.0f}%), {s['evictions']} evictions, "
+              f"{s['writebacks']} writebacks, {s['erases']} erases, {s['programs']} page programs")
@@ -0,0 +1,154 @@
+# W25 erase planner: covers a set of dirty address ranges with the cheapest
+# mix of the part's erase sizes (64K block, 32K block and 4K sector erases
+# on a W25Q128; others come from SFDP, see w25_sfdp.py). Bytes that share an
+# erase unit with a dirty range but lie outside it are "kept": read before
+# the erase and programmed back afterwards (read-modify-write).
+#
+#   ops = w25_erase.plan([(0x1000, 0x1800), (0x20000, 0x30000)])
+#   w25_erase.print_plan(ops)
+#   flashWrite_w25.erase_ranges(...) executes a plan
+#
+# A plan is a list of (addr, size, keep) with keep a list of (start, end)
+# ranges inside [addr, addr + size).
+
+SECTOR = 0x1000
+BLOCK_32K = 0x8000
+BLOCK_64K = 0x10000
+PAGE = 256
+
+# Typical W25Q128JV times (tSE, tBE1, tBE2, tPP)
+ERASE_US = {SECTOR: 45000, BLOCK_32K: 120000, BLOCK_64K: 150000}
+PAGE_PROGRAM_US = 700
+
+# Largest amount of kept data one erase may need to hold in RAM
+RMW_BUDGET = 16384
+
+
+def normalize(ranges):
+    """Sorted, merged, non-empty (start, end) ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def keep_ranges(ranges, start, end):
+    """Parts of [start, end) not covered by the (normalized) dirty ranges"""
+    keep = []
+    pos = start
+    for r_start, r_end in ranges:
+        if r_end <= pos:
+            continue
+        if r_start >= end:
+            break
+        if r_start > pos:
+            keep.append((pos, r_start))
+        pos = max(pos, r_end)
+        if pos >= end:
+            break
+    if pos < end:
+        keep.append((pos, end))
+    return keep
+
+
+def _touches(ranges, start, end):
+    for r_start, r_end in ranges:
+        if r_start < end and r_end > start:
+            return True
+    return False
+
+
+def restore_us(keep, read_us_per_kb):
+    """Worst case for keeping bytes: read them all, program every page"""
+    us = 0
+    for start, end in keep:
+        pages = (end - 1) // PAGE - start // PAGE + 1
+        us += pages * PAGE_PROGRAM_US + (end - start) * read_us_per_kb // 1024
+    return us
+
+
+def _unit(ranges, addr, size, ctx):
+    preserve, budget, read_us_per_kb, erase_us = ctx
+    keep = keep_ranges(ranges, addr, addr + size) if preserve else []
+    kept = sum(end - start for start, end in keep)
+    if kept > budget:
+        return None, None
+    return erase_us[size] + restore_us(keep, read_us_per_kb), [(addr, size, keep)]
+
+
+def _best(options):
+    best_cost = None
+    best_ops = None
+    for cost, ops in options:
+        if cost is not None and (best_cost is None or cost < best_cost):
+            best_cost, best_ops = cost, ops
+    return best_cost, best_ops
+
+
+def _cover(ranges, addr, sizes, ctx):
+    # Cheapest way to cover the dirty part of the sizes[0] unit at addr:
+    # erase it whole, or cover each dirty unit of the next size down
+    size = sizes[0]
+    whole = _unit(ranges, addr, size, ctx)
+    if len(sizes) == 1:
+        return whole
+    cost = 0
+    ops = []
+    for sub in range(addr, addr + size, sizes[1]):
+        if _touches(ranges, sub, sub + sizes[1]):
+            c, o = _cover(ranges, sub, sizes[1:], ctx)
+            cost += c
+            ops += o
+    return _best([whole, (cost, ops)])
+
+
+def plan(ranges, preserve=True, budget=RMW_BUDGET, read_us_per_kb=330, erase_us=None):
+    """Erase operations covering ranges, cheapest by estimated time.
+
+    Per largest erase unit the planner compares erasing it whole with
+    covering its dirty parts by the next size down, recursively (64K vs
+    32K halves vs 4K sectors on a W25Q128), each including the time to keep
+    the bytes outside the ranges (unless preserve is False). Units whose
+    kept data exceeds budget bytes are not considered. read_us_per_kb is
+    the read cost of kept data (330 us/KB at 25 MHz); erase_us maps the
+    erase sizes of the part to their typical times (ERASE_US by default).
+    """
+    if erase_us is None:
+        erase_us = ERASE_US
+    sizes = sorted(erase_us, reverse=True)
+    ranges = normalize(ranges)
+    budget = max(budget, sizes[-1])  # the smallest erase must always be possible
+    ctx = (preserve, budget, read_us_per_kb, erase_us)
+    top = sizes[0]
+    blocks = []
+    for start, end in ranges:
+        for block in range(start - start % top, end, top):
+            if not blocks or blocks[-1] != block:
+                blocks.append(block)
+    ops = []
+    for block in blocks:
+        ops += _cover(ranges, block, sizes, ctx)[1]
+    return ops
+
+
+def estimate_us(ops, read_us_per_kb=330, erase_us=None):
+    """Estimated duration of a plan (kept data assumed to need programming)"""
+    if erase_us is None:
+        erase_us = ERASE_US
+    return sum(erase_us[size] + restore_us(keep, read_us_per_kb) for _, size, keep in ops)
+
+
+def print_plan(ops, read_us_per_kb=330, erase_us=None):
+    for addr, size, keep in ops:
+        kept = sum(end - start for start, end in keep)
+        line = f"E{size // 1024:>3}K {addr:06X}"
+        if kept:
+            line += f"  keep {kept} bytes in {len(keep)} range(s)"
+        print(line)
+    print(f"{len(ops)} erase(s), about {estimate_us(ops, read_us_per_kb, erase_us) // 1000} ms")
@@ -0,0 +1,88 @@
+import sys
+import time
+import flashWrite_w25
+
+try:
+    import micropython
+except ImportError:
+    micropython = None
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+# Pipelined W25 programming from the USB VCP: the image arrives as raw bytes
+# on stdin into two page buffers. While the flash programs page N, page N+1
+# is received into the other buffer, so transfer and program time overlap.
+#
+# Protocol (host/w25_program.py drives it through the raw REPL):
+#   board:  program_stream(start, length)  -> erases, prints "READY"
+#   host:   sends exactly `length` raw bytes
+#   board:  prints "DONE <length> <crc32>"
+
+
+def _receive(stream, mv):
+    """Fill mv from stream (USB reads may return short)"""
+    got = 0
+    n = len(mv)
+    while got < n:
+        k = stream.readinto(mv[got:])
+        if k == 0:
+            raise EOFError(f"Stream ended {n - got} bytes short")
+        if k:
+            got += k
+    return n
+
+
+def program_stream(start, length, erase=True, stream=None):
+    """Program length bytes received on stream (sys.stdin.buffer) at start.
+
+    The target range is erased first (data around it is kept) unless
+    erase is False. Returns the CRC32 of the received data.
+    """
+    if stream is None:
+        stream = sys.stdin.buffer
+    flashWrite_w25.init_spi()
+    if erase:
+        flashWrite_w25.erase_ranges([(start, start + length)])
+    page_size = flashWrite_w25.PAGE_SIZE
+    program_us = flashWrite_w25.flash['program_us']
+    bufs = (bytearray(page_size), bytearray(page_size))
+    mvs = (memoryview(bufs[0]), memoryview(bufs[1]))
+
+    # Ctrl-C (0x03) is data from here on
+    if micropython:
+        micropython.kbd_intr(-1)
+    crc = 0
+    try:
+        print("READY")
+        addr = start
+        end = start + length
+        n = min(page_size - addr % page_size, end - addr)
+        current = 0
+        _receive(stream, mvs[current][:n])
+        t0 = time.ticks_ms()
+        while n:
+            data = mvs[current][:n]
+            # Start programming page N, receive page N+1 while it runs
+            flashWrite_w25.write_page(addr, data, wait=False)
+            started = time.ticks_us()
+            if crc32:
+                crc = crc32(data, crc)
+            addr += n
+            n = min(page_size, end - addr)
+            current ^= 1
+            if n:
+                _receive(stream, mvs[current][:n])
+            # Only what is left of the program time after the receive
+            flashWrite_w25.wait_busy(program_us, started)
+        elapsed = time.ticks_diff(time.ticks_ms(), t0)
+    finally:
+        if micropython:
+            micropython.kbd_intr(3)
+    print(f"DONE {length} {crc}")
+    if elapsed:
+        print(f"{length} bytes in {elapsed} ms ({length * 1000 // elapsed // 1024} KB/s)")
+    flashWrite_w25.print_poll_stats()
+    return crc
@@ -0,0 +1,133 @@
+# SFDP (JESD216) discovery for SPI-NOR flash: reads the Basic Flash
+# Parameter Table and turns it into a chip descriptor used by the W25
+# read/write/erase paths instead of hardcoded W25Q128 values:
+#
+#   {'size': 16777216, 'page_size': 256, 'addr_bytes': 3,
+#    'erase': [(4096, 0x20, 45000), (32768, 0x52, 120000), ...],  # size, opcode, typ us
+#    'program_us': 700, 'chip_erase_us': 40000000,
+#    'read': (0x0B, 1),  # opcode, dummy bytes
+#    'dual': True, 'quad': True}
+#
+# Parts without SFDP get DEFAULT (W25Q128JV).
+
+CMD_READ_SFDP = 0x5A
+SIGNATURE = b'SFDP'
+BFPT_ID = 0xFF00
+
+DEFAULT = {
+    'size': 16 * 1024 * 1024,
+    'page_size': 256,
+    'addr_bytes': 3,
+    'erase': [(4096, 0x20, 45000), (32768, 0x52, 120000), (65536, 0xD8, 150000)],
+    'program_us': 700,
+    'chip_erase_us': 40000000,
+    'read': (0x0B, 1),
+    'dual': False,
+    'quad': False,
+}
+
+# Typical times for BFPTs too old to carry them (JESD216 before rev A)
+TYPICAL_ERASE_US = {4096: 45000, 32768: 120000, 65536: 150000}
+
+# Units of the typical-time fields in DWORDs 10 and 11
+_ERASE_UNITS_MS = (1, 16, 128, 1000)
+_CHIP_ERASE_UNITS_MS = (16, 256, 4000, 64000)
+
+
+def read(spi, cs, addr, n):
+    """n bytes of the SFDP area at addr (READ_SFDP: 3 address bytes, 1 dummy)"""
+    cs.value(0)
+    spi.write(bytes([CMD_READ_SFDP, (addr >> 16) & 0xFF, (addr >> 8) & 0xFF, addr & 0xFF, 0]))
+    data = spi.read(n)
+    cs.value(1)
+    return data
+
+
+def _dwords(data):
+    return [data[i] | (data[i + 1] << 8) | (data[i + 2] << 16) | (data[i + 3] << 24)
+            for i in range(0, len(data) - 3, 4)]
+
+
+def parse_bfpt(dw):
+    """Descriptor from the Basic Flash Parameter Table DWORDs (dw[0] is
+    DWORD 1 of the standard)"""
+    desc = dict(DEFAULT)
+
+    density = dw[1]
+    if density & 0x80000000:
+        bits = 1 << (density & 0x7FFFFFFF)
+    else:
+        bits = density + 1
+    desc['size'] = bits // 8
+
+    # 3-byte only / 3 or 4 / 4-byte only; 4 bytes are needed above 16 MB
+    mode = (dw[0] >> 17) & 0x03
+    desc['addr_bytes'] = 4 if mode == 2 or (mode == 1 and desc['size'] > 1 << 24) else 3
+    desc['dual'] = bool(dw[0] & (1 << 16))
+    desc['quad'] = bool(dw[0] & (1 << 22))
+
+    erase = []
+    for i, word in enumerate((dw[7], dw[7] >> 16, dw[8], dw[8] >> 16)):
+        size_exp = word & 0xFF
+        opcode = (word >> 8) & 0xFF
+        if size_exp == 0:
+            continue  # erase type not supported
+        size = 1 << size_exp
+        typ_us = TYPICAL_ERASE_US.get(size, 0)
+        if len(dw) >= 10:
+            field = (dw[9] >> (4 + 7 * i)) & 0x7F
+            typ_us = ((field & 0x1F) + 1) * _ERASE_UNITS_MS[field >> 5] * 1000
+        erase.append((size, opcode, typ_us))
+    if not erase and dw[0] & 0x03 == 0x01:
+        erase.append((4096, (dw[0] >> 8) & 0xFF, TYPICAL_ERASE_US[4096]))
+    if erase:
+        erase.sort()
+        desc['erase'] = erase
+
+    if len(dw) >= 11:
+        desc['page_size'] = 1 << ((dw[10] >> 4) & 0x0F)
+        field = (dw[10] >> 8) & 0x3F
+        desc['program_us'] = ((field & 0x1F) + 1) * (64 if field & 0x20 else 8)
+        field = (dw[10] >> 24) & 0x7F
+        desc['chip_erase_us'] = ((field & 0x1F) + 1) * _CHIP_ERASE_UNITS_MS[field >> 5] * 1000
+    return desc
+
+
+def parse(read_at):
+    """Descriptor from an SFDP area read through read_at(addr, n), or None
+    when there is no valid SFDP signature or BFPT"""
+    header = read_at(0, 8)
+    if header[:4] != SIGNATURE:
+        return None
+    headers = header[6] + 1
+    table = read_at(8, 8 * headers)
+    for i in range(headers):
+        h = table[8 * i:8 * i + 8]
+        if (h[7] << 8) | h[0] != BFPT_ID:
+            continue
+        length = h[3]
+        pointer = h[4] | (h[5] << 8) | (h[6] << 16)
+        if length < 9:
+            return None
+        return parse_bfpt(_dwords(read_at(pointer, 4 * length)))
+    return None
+
+
+def parse_blob(blob):
+    """Descriptor from a captured SFDP dump (host side)"""
+    return parse(lambda addr, n: blob[addr:addr + n])
+
+
+def discover(spi, cs):
+    """Descriptor of the attached part, DEFAULT when it has no SFDP"""
+    desc = parse(lambda addr, n: read(spi, cs, addr, n))
+    if desc is None:
+        print("No SFDP table, assuming W25Q128 geometry")
+        return dict(DEFAULT)
+    return desc
+
+
+def describe(desc):
+    erase = ', '.join(f"{size // 1024}K/{opcode:02X}h {us // 1000} ms" for size, opcode, us in desc['erase'])
+    print(f"SPI-NOR: {desc['size'] // 1024} KB, {desc['page_size']}-byte page "
+          f"({desc['program_us']} us), {desc['addr_bytes']}-byte address, erase {erase}")
@@ -0,0 +1,67 @@
+# Coalescing writer for scattered W25 writes: bytes are buffered per
+# 256-byte page and flushed in address order as one page program per
+# touched page. Bytes between the written ones are sent as 0xFF, which
+# leaves the flash cell unchanged (programming can only clear bits).
+#
+#   with w25_writer.Writer(flashWrite_w25.write_page) as writer:
+#       writer.write(0x1234, 0x56)
+#       writer.write_bytes(0x2000, b'...')
+#   (flushed on leaving the block, or with flush()/close())
+
+PAGE = 256
+MAX_PAGES = 64  # buffered pages (16 KB) before an automatic flush
+
+
+class Writer:
+    def __init__(self, program_page, max_pages=MAX_PAGES, page=PAGE):
+        """program_page(addr, data) programs data (within one page) at addr"""
+        self.program_page = program_page
+        self.max_pages = max_pages
+        self.page = page
+        self.pages = {}  # page address -> [buffer, lo, hi]
+        self.bytes = 0
+        self.programs = 0
+
+    def write(self, addr, value):
+        base = addr - addr % self.page
+        entry = self.pages.get(base)
+        if entry is None:
+            if len(self.pages) >= self.max_pages:
+                self.flush()
+            entry = [bytearray(b'\xff' * self.page), self.page, 0]
+            self.pages[base] = entry
+        offset = addr - base
+        entry[0][offset] = value & 0xFF
+        if offset < entry[1]:
+            entry[1] = offset
+        if offset + 1 > entry[2]:
+            entry[2] = offset + 1
+        self.bytes += 1
+
+    def write_bytes(self, addr, data):
+        for i in range(len(data)):
+            self.write(addr + i, data[i])
+
+    def flush(self):
+        """Program every buffered page, lowest address first"""
+        for base in sorted(self.pages):
+            buf, lo, hi = self.pages[base]
+            self.program_page(base + lo, memoryview(buf)[lo:hi])
+            self.programs += 1
+        self.pages.clear()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # After an error the buffered pages are dropped, not programmed
+        if exc_type is None:
+            self.close()
+        else:
+            self.pages.clear()
+
+    def stats(self):
+        return {'bytes': self.bytes, 'programs': self.programs, 'pending': len(self.pages)}